@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The repository root, home of the labtools package the projects share
+sys.path.append(str(BASE_DIR.parent))
+
+from labtools.sqlite import TUNED_OPTIONS  # noqa: E402
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -39,9 +46,16 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'api',
+    # shared management commands (sync_replicas, check_query_plans), see labtools/
+    'labtools',
 ]
 
 MIDDLEWARE = [
+    # outermost, so its total covers every other middleware; inactive unless
+    # PROFILING['ENABLED'] (see labtools/profiling.py)
+    'labtools.profiling.ProfilingMiddleware',
+    # routes a safe request's reads to a replica until it writes
+    'labtools.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +65,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request profiling: Server-Timing headers, sampled query logs and cProfile dumps
+PROFILING = {
+    'ENABLED': False,
+}
+
 ROOT_URLCONF = 'advanced_api_project.urls'
 
 TEMPLATES = [
@@ -74,10 +93,44 @@ WSGI_APPLICATION = 'advanced_api_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# CONN_MAX_AGE keeps each worker's connection open between requests; health
+# checks replace connections that went away. SQLite has no server-side pool;
+# on PostgreSQL add OPTIONS={'pool': True} and set CONN_MAX_AGE to 0.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # WAL, busy_timeout and BEGIN IMMEDIATE; see labtools/sqlite.py
+        'OPTIONS': TUNED_OPTIONS,
+    }
+}
+
+# Read replicas, e.g. DJANGO_DB_REPLICAS=replica1,replica2: SQLite files
+# refreshed from the primary with `manage.py sync_replicas`. GET requests such
+# as the book list read from them (see labtools/db_router.py).
+for _alias in filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')):
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db.{_alias}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['labtools.db_router.ReplicaRouter']
+
+DATABASE_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+}
+
+
+# Cache used for API responses (see api/caching.py). Local memory is per
+# process; use a shared backend such as Redis when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'advanced-api-project',
     }
 }
 
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
 
 
+def hot_queries():
+    """The busiest query shapes, checked by ``manage.py check_query_plans``."""
+    from .models import Book
+
+    return {
+        'books.by_author': Book.objects.filter(author_id=1).order_by('publication_year'),
+        'books.detail': Book.objects.filter(pk=1),
+    }
+
+
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from labtools import query_plans
+        from .caching import register
+        from .models import Author, Book
+
+        register(Author, Book)
+        query_plans.register(hot_queries)
@@ -0,0 +1,76 @@
+"""
+Response caching for the read-only Book views.
+
+Each model keeps a version stamp in the cache that is replaced whenever a row
+is saved or deleted. Cached responses are keyed by the URL plus the current
+stamps, so any write makes stale entries unreachable. The same key doubles as
+the ETag, letting clients revalidate with If-None-Match and get a 304.
+Stamps are replaced when the write commits, so a read in between cannot
+cache the old rows under the new stamp.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+CACHE_TIMEOUT = 300
+
+
+def _version_key(model):
+    return f"rc:v:{model._meta.label_lower}"
+
+
+def versions(models):
+    names = [_version_key(model) for model in models]
+    found = cache.get_many(names)
+    for name in names:
+        if name not in found:
+            # add() so a first reader never overwrites a concurrent bump
+            cache.add(name, uuid.uuid4().hex, None)
+            found[name] = cache.get(name)
+    return [found[name] for name in names]
+
+
+def bump(sender, **kwargs):
+    key = _version_key(sender)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None), robust=True)
+
+
+def register(*models):
+    for model in models:
+        uid = f"api.caching:{model._meta.label_lower}"
+        post_save.connect(bump, sender=model, dispatch_uid=uid)
+        post_delete.connect(bump, sender=model, dispatch_uid=uid)
+
+
+class CachedResponseMixin:
+    """
+    Wraps list()/retrieve() of a generic view.
+    cache_dependencies lists every model the response is built from.
+    """
+    cache_dependencies = ()
+
+    def get(self, request, *args, **kwargs):
+        parts = [request.build_absolute_uri(), request.accepted_renderer.format or ""]
+        parts.extend(versions(self.cache_dependencies))
+        key = "rc:r:" + hashlib.md5("|".join(parts).encode()).hexdigest()
+        etag = f'W/"{key[5:]}"'
+
+        if etag in request.headers.get("If-None-Match", ""):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(key)
+            if data is None:
+                response = super().get(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
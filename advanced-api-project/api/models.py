@@ -27,6 +27,12 @@ class Book(models.Model):
         related_name="books"     # enables nested serialization
     )
 
+    class Meta:
+        indexes = [
+            # an author's books by year (nested AuthorSerializer listings)
+            models.Index(fields=['author', 'publication_year'], name='book_author_year_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
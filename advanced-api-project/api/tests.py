@@ -1,3 +1,46 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import Author, Book
+
+
+class CachedBookViewsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(name='Ursula K. Le Guin')
+        self.book = Book.objects.create(title='The Dispossessed', publication_year=1974, author=self.author)
+        self.url = reverse('book-detail', args=[self.book.pk])
+
+    def test_repeat_read_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_gets_304(self):
+        etag = self.client.get(reverse('book-list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('book-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_after_commit(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book.title = 'The Dispossessed: An Ambiguous Utopia'
+            self.book.save()
+            # not committed yet: the old stamp still holds
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_author_change_invalidates_books(self):
+        list_etag = self.client.get(reverse('book-list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.name = 'U. K. Le Guin'
+            self.author.save()
+        response = self.client.get(reverse('book-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
@@ -1,29 +1,34 @@
 from django.shortcuts import render
 from rest_framework import generics, permissions
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
-from .models import Book
+from .caching import CachedResponseMixin
+from .models import Author, Book
 from .serializers import BookSerializer
 
 # List all books
-class BookListView(generics.ListAPIView):
+class BookListView(CachedResponseMixin, generics.ListAPIView):
     """
     Retrieves all Book instances.
     Accessible to all users (read-only).
+    Responses are cached until a Book or Author changes.
     """
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [permissions.AllowAny]
+    cache_dependencies = [Book, Author]
 
 
 # Retrieve a single book by ID
-class BookDetailView(generics.RetrieveAPIView):
+class BookDetailView(CachedResponseMixin, generics.RetrieveAPIView):
     """
     Retrieves a single Book instance by primary key.
     Accessible to all users (read-only).
+    Responses are cached until a Book or Author changes.
     """
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [permissions.AllowAny]
+    cache_dependencies = [Book, Author]
 
 
 # Create a new book
@@ -10,11 +10,17 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The repository root, home of the labtools package the projects share
+sys.path.append(str(BASE_DIR.parent))
+
+from labtools.sqlite import TUNED_OPTIONS  # noqa: E402
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / "blog" / "static",
@@ -45,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so its total covers every other middleware; inactive unless
+    # PROFILING['ENABLED'] (see labtools/profiling.py)
+    'labtools.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +63,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request profiling: Server-Timing headers, sampled query logs and cProfile dumps
+PROFILING = {
+    'ENABLED': False,
+}
+
 ROOT_URLCONF = 'django_blog.urls'
 
 TEMPLATES = [
@@ -87,6 +101,11 @@ DATABASES = {
         'PASSWORD': '',
         'HOST': '',
         'PORT': '',
+        # reuse connections between requests; replace ones that went away
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        # WAL, busy_timeout and BEGIN IMMEDIATE; see labtools/sqlite.py
+        'OPTIONS': TUNED_OPTIONS,
     }
 }
 
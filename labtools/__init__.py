@@ -0,0 +1,15 @@
+"""
+Pieces shared by every project in this repository.
+
+Each project's settings put the repository root on ``sys.path``, so they all
+run this one copy instead of keeping their own:
+
+* ``labtools.profiling``: the opt-in ``ProfilingMiddleware``.
+* ``labtools.db_router``: primary/replica read routing, with ``manage.py
+  sync_replicas`` for local SQLite replicas.
+* ``labtools.query_plans``: the hot-query registry behind ``manage.py
+  check_query_plans``.
+* ``labtools.sqlite``: SQLite connection ``OPTIONS`` (WAL and friends).
+
+The management commands need ``'labtools'`` in ``INSTALLED_APPS``.
+"""
@@ -0,0 +1,146 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to one of the aliases in
+``DATABASE_REPLICAS['ALIASES']`` only inside a GET/HEAD/OPTIONS request, and
+only until that request writes anything (or opens a transaction on the
+primary); from then on the request reads from the primary so it sees its own
+writes. One replica is picked per request, so a response never mixes rows
+from replicas at different replication positions.
+
+Everything outside a request (management commands, the notification worker,
+tests that call the ORM directly) reads from the primary.
+
+Replication lag can also bite the *next* request: after an unsafe request
+the middleware sets a short-lived cookie that keeps the client's reads on the
+primary for ``PIN_SECONDS``. Clients that drop cookies (most token-auth API
+clients) only get the per-request guarantee.
+
+Models in ``PRIMARY_MODELS`` are always read from the primary; by default
+that is sessions, so a fresh login is not lost to a lagging replica.
+
+Settings (all optional; no aliases means no routing):
+
+    DATABASE_REPLICAS = {
+        'ALIASES': ['replica1'],
+        'PIN_SECONDS': 5,
+        'PIN_COOKIE': 'primary_pin',
+        'PRIMARY_MODELS': ['sessions.session'],
+    }
+
+Locally, extra SQLite files can stand in for replicas; ``manage.py
+sync_replicas`` copies the primary into them, which also makes lag easy to
+reproduce: writes are invisible on the replicas until the next sync.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULTS = {
+    'ALIASES': [],
+    'PIN_SECONDS': 5,
+    'PIN_COOKIE': 'primary_pin',
+    'PRIMARY_MODELS': ['sessions.session'],
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# per-request routing state; None outside requests
+_state = ContextVar('db_routing_state', default=None)
+
+
+def replica_settings():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICAS', {})}
+
+
+def replica_aliases():
+    return list(replica_settings()['ALIASES'])
+
+
+class RoutingState:
+    def __init__(self, replicas_allowed):
+        self.replicas_allowed = replicas_allowed
+        self.wrote = False
+        self.replica = None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replicas_allowed or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label_lower in replica_settings()['PRIMARY_MODELS']:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            aliases = replica_aliases()
+            if not aliases:
+                return DEFAULT_DB_ALIAS
+            state.replica = random.choice(aliases)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Opens replica reads for safe requests; pins the client after writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.open(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, state, response)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so ORM calls in worker threads see the state
+        state, token = self.open(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, state, response)
+
+    def open(self, request):
+        pinned = replica_settings()['PIN_COOKIE'] in request.COOKIES
+        state = RoutingState(request.method in SAFE_METHODS and not pinned)
+        return state, _state.set(state)
+
+    def pin(self, request, state, response):
+        options = replica_settings()
+        if state.wrote and options['PIN_SECONDS'] and replica_aliases():
+            response.set_cookie(
+                options['PIN_COOKIE'], '1', max_age=options['PIN_SECONDS'],
+                secure=request.is_secure(), httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from labtools import query_plans
+
+
+class Command(BaseCommand):
+    help = ("EXPLAIN the registered hot queries and fail if any plan scans a whole table "
+            "or sorts its whole result instead of using an index.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Only check these queries (default: all).")
+        parser.add_argument('--list', action='store_true', help="List the registered query names and exit.")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in query_plans.hot_queries():
+                self.stdout.write(name)
+            return
+
+        unknown = set(options['names']) - set(query_plans.hot_queries())
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}.")
+
+        failed = 0
+        for result in query_plans.check(options['names']):
+            if not result.problems:
+                self.stdout.write(f"ok    {result.name}")
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"      {result.plan}")
+                continue
+            failed += 1
+            self.stdout.write(self.style.ERROR(f"FAIL  {result.name}"))
+            for problem in result.problems:
+                self.stdout.write(f"      {problem}")
+        if failed:
+            raise CommandError(f"{failed} hot queries do not use an index.")
+        self.stdout.write(self.style.SUCCESS("All hot queries use indexes."))
@@ -0,0 +1,41 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from labtools.db_router import replica_aliases
+
+
+class Command(BaseCommand):
+    help = ("Copy the primary SQLite database into the replica databases, standing in "
+            "for replication in local development.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help="Replica aliases to refresh (default: DATABASE_REPLICAS['ALIASES']).")
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replica_aliases()
+        if not aliases:
+            raise CommandError("No replicas configured; set DATABASE_REPLICAS['ALIASES'].")
+        databases = settings.DATABASES
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if alias not in databases:
+                raise CommandError(f"Unknown database alias {alias!r}.")
+            if databases[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f"{alias!r} is not SQLite; use the database's own replication.")
+
+        source = sqlite3.connect(databases[DEFAULT_DB_ALIAS]['NAME'])
+        try:
+            for alias in aliases:
+                target = sqlite3.connect(databases[alias]['NAME'])
+                try:
+                    # online backup: consistent even while the primary is being written
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{alias}: synced.")
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS("Replicas up to date."))
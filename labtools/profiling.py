@@ -0,0 +1,230 @@
+"""
+Opt-in per-request profiling.
+
+``ProfilingMiddleware`` records, for every request:
+
+* SQL query count and time across all database connections,
+* repeated query shapes (the N+1 signature: the same parameterized SQL,
+  with ``IN (...)`` lists collapsed, run ``DUPLICATE_THRESHOLD`` or more times),
+* time spent in the view, in DRF serializers (``serializer.data``), in
+  rendering the response (DRF renderers, templates) and in total.
+
+The numbers are sent back in a ``Server-Timing`` header, which browser dev
+tools display per request, and a sample of requests (plus every slow one) is
+logged as one JSON line on the ``profiling`` logger.
+
+Requests whose path matches ``PROFILE_PATHS``, or that carry the
+``PROFILE_HEADER`` (honoured only with ``DEBUG`` or a matching
+``PROFILE_TOKEN``), are also run under cProfile and the stats are dumped to
+``PROFILE_DIR`` for ``python -m pstats`` or snakeviz.
+
+When ``PROFILING['ENABLED']`` is false the middleware removes itself at
+startup, so it costs nothing.
+
+Settings (all optional):
+
+    PROFILING = {
+        'ENABLED': False,
+        'LOG_SAMPLE_RATE': 0.01,     # fraction of requests logged
+        'SLOW_MS': 500,              # requests slower than this are always logged
+        'DUPLICATE_THRESHOLD': 3,
+        'PROFILE_PATHS': [],         # regexes, e.g. [r'^/api/feed/']
+        'PROFILE_HEADER': 'X-Profile',
+        'PROFILE_TOKEN': None,
+        'PROFILE_DIR': None,         # default: the system temp directory
+    }
+"""
+import cProfile
+import json
+import logging
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('profiling')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'LOG_SAMPLE_RATE': 0.01,
+    'SLOW_MS': 500,
+    'DUPLICATE_THRESHOLD': 3,
+    'PROFILE_PATHS': [],
+    'PROFILE_HEADER': 'X-Profile',
+    'PROFILE_TOKEN': None,
+    'PROFILE_DIR': None,
+}
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+# the profile of the request being handled, for the serializer timer
+_current = ContextVar('request_profile', default=None)
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def fingerprint(sql):
+    """``sql`` with ``IN (%s, %s, ...)`` collapsed, so batches of any size match."""
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes = Counter()
+        self.view_started = None
+        self.view_returned = None
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+
+def _instrument_serializers():
+    """Time ``serializer.data``, where a DRF serializer does its work, into the current profile."""
+    try:
+        from rest_framework.serializers import BaseSerializer
+    except ImportError:
+        # a project without DRF has no serializers to time
+        return
+    fget = BaseSerializer.data.fget
+    if getattr(fget, 'profiled', False):
+        return
+
+    # Serializer.data and ListSerializer.data both end up here through super()
+    def data(self):
+        profile = _current.get()
+        if profile is None or profile.serializing:
+            return fget(self)
+        profile.serializing = True
+        started = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            profile.serializer_seconds += time.perf_counter() - started
+            profile.serializing = False
+
+    data.profiled = True
+    BaseSerializer.data = property(data)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.options = profiling_settings()
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed
+        _instrument_serializers()
+        self.get_response = get_response
+        self.profile_paths = [re.compile(pattern) for pattern in self.options['PROFILE_PATHS']]
+
+    def wants_cprofile(self, request):
+        if any(pattern.search(request.path) for pattern in self.profile_paths):
+            return True
+        value = request.headers.get(self.options['PROFILE_HEADER'])
+        if not value:
+            return False
+        token = self.options['PROFILE_TOKEN']
+        return settings.DEBUG or (token is not None and value == token)
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        request._profile = profile
+        token = _current.set(profile)
+        profiler = cProfile.Profile() if self.wants_cprofile(request) else None
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+                _current.reset(token)
+        total = time.perf_counter() - profile.started
+
+        metrics = self.metrics(profile, total)
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}' + (f';desc="{desc}"' if desc else '')
+            for name, duration, desc in metrics
+        )
+        if profiler:
+            response['X-Profile-File'] = self.dump(profiler, request).name
+        self.log(request, response, profile, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF and template responses render after this hook returns
+        request._profile.view_returned = time.perf_counter()
+        return response
+
+    def metrics(self, profile, total):
+        duplicates = profile.duplicates(self.options['DUPLICATE_THRESHOLD'])
+        metrics = [
+            ('db', profile.db_seconds, f'{profile.queries} queries'),
+            ('app', total - profile.db_seconds, 'outside the database'),
+        ]
+        if profile.view_started is not None and profile.view_returned is not None:
+            view = profile.view_returned - profile.view_started
+            metrics.append(('view', max(view - profile.serializer_seconds, 0.0), 'view without serializers'))
+            metrics.append(('render', profile.started + total - profile.view_returned, 'response rendering'))
+        if profile.serializer_seconds:
+            metrics.append(('serialize', profile.serializer_seconds, 'serializer .data'))
+        if duplicates:
+            metrics.append(('dup', 0, f'{len(duplicates)} repeated query shapes'))
+        metrics.append(('total', total, ''))
+        return metrics
+
+    def dump(self, profiler, request):
+        directory = Path(self.options['PROFILE_DIR'] or tempfile.gettempdir())
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        path = directory / f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{slug}-{random.getrandbits(24):06x}.prof'
+        profiler.dump_stats(path)
+        return path
+
+    def log(self, request, response, profile, total):
+        slow = total * 1000 >= self.options['SLOW_MS']
+        if not slow and random.random() >= self.options['LOG_SAMPLE_RATE']:
+            return
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(profile.db_seconds * 1000, 2),
+            'serialize_ms': round(profile.serializer_seconds * 1000, 2),
+            'queries': profile.queries,
+            'duplicates': [
+                {'sql': sql[:500], 'count': count}
+                for sql, count in profile.duplicates(self.options['DUPLICATE_THRESHOLD'])[:5]
+            ],
+            'slow': slow,
+        }
+        logger.info(json.dumps(record))
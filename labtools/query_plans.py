@@ -0,0 +1,71 @@
+"""
+Hot query shapes and a plan check that keeps them on their indexes.
+
+Apps register a function returning the querysets behind their busiest
+endpoints, built with representative parameters, in ``ready()``::
+
+    def hot_queries():
+        return {'posts.by_author': Post.objects.filter(author_id=1)[:20]}
+
+    query_plans.register(hot_queries)
+
+``manage.py check_query_plans`` runs ``EXPLAIN`` on each of them and fails
+when a plan reads a whole table (SQLite ``SCAN <table>`` without an index,
+PostgreSQL ``Seq Scan``) or sorts the whole result (SQLite ``USE TEMP
+B-TREE FOR ORDER BY``, PostgreSQL ``Sort``) instead of walking an index in
+order. Scanning an *index* in order is fine: under a ``LIMIT`` it stops after
+one page.
+
+Plans depend on table statistics; run the check against the test database
+(as the test suite does) or a copy of production data after ``ANALYZE``.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connections
+
+Result = namedtuple('Result', 'name plan problems')
+
+# (vendor, pattern, description)
+PROBLEMS = [
+    ('sqlite', re.compile(r'\bSCAN (\w+)$'), 'full table scan'),
+    # also matches "RIGHT PART OF ORDER BY": the index covers only a prefix of the ordering
+    ('sqlite', re.compile(r'USE TEMP B-TREE FOR'), 'sort of the whole result'),
+    ('postgresql', re.compile(r'Seq Scan on (\w+)'), 'full table scan'),
+    ('postgresql', re.compile(r'^\s*(?:->\s*)?Sort\b'), 'sort of the whole result'),
+]
+
+_sources = []
+
+
+def register(source):
+    """``source()`` returns ``{name: queryset}`` of hot queries to check."""
+    if source not in _sources:
+        _sources.append(source)
+
+
+def hot_queries():
+    queries = {}
+    for source in _sources:
+        queries.update(source())
+    return dict(sorted(queries.items()))
+
+
+def plan_problems(plan, vendor):
+    found = []
+    for line in plan.splitlines():
+        for pattern_vendor, pattern, description in PROBLEMS:
+            if pattern_vendor == vendor and pattern.search(line):
+                found.append(f'{description}: {line.strip()}')
+    return found
+
+
+def check(names=None):
+    """Explain the registered queries (or ``names``); returns a ``Result`` per query."""
+    results = []
+    for name, queryset in hot_queries().items():
+        if names and name not in names:
+            continue
+        plan = queryset.explain()
+        results.append(Result(name, plan, plan_problems(plan, connections[queryset.db].vendor)))
+    return results
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from social_media_api import response_cache
+        from .models import CustomUser
+        # connects the token cache's eviction signals
+        from . import authentication  # noqa: F401
+
+        response_cache.register(CustomUser)
+        response_cache.register(
+            CustomUser.followers.through,
+            parents=lambda row: [(CustomUser, row.from_customuser_id), (CustomUser, row.to_customuser_id)],
+        )
@@ -0,0 +1,203 @@
+"""
+Token authentication with cached token lookups, plus token expiry and rotation.
+
+DRF's ``TokenAuthentication`` joins the token and user tables on every
+request. ``CachingTokenAuthentication`` remembers the result per token for
+``TTL`` seconds in a bounded LRU in process memory, or in a shared Django
+cache with ``STORE = 'cache'``, so authenticated requests usually cost no
+query at all. Entries hold the user's column values (not the password hash),
+and every hit builds a fresh user instance from them, so requests never share
+a mutable object.
+
+Deleting a token and saving or deleting a user (deactivation included)
+evicts the affected entries. With the memory store that only reaches the
+current process; other workers notice within ``TTL``. Use the cache store to
+evict everywhere at once. Counters updated with ``UPDATE`` (see
+social_media_api/counters.py) don't evict, so views that show or save the
+user's own row re-read it instead of using ``request.user``.
+
+With ``EXPIRY`` set, tokens stop authenticating that many seconds after they
+were issued. Logging in returns the current token, or a new one when it has
+expired or is older than ``ROTATE_AFTER``. ``POST /api/accounts/token/rotate/``
+replaces a token on demand.
+
+Settings (all optional):
+
+    TOKEN_AUTH = {
+        'STORE': 'memory',        # or 'cache'
+        'CACHE_ALIAS': 'default',
+        'MAX_ENTRIES': 10000,     # memory store: least recently used entries go first
+        'TTL': 300,               # seconds an entry is trusted
+        'EXPIRY': None,           # seconds a token is valid after it is issued
+        'ROTATE_AFTER': None,     # seconds after which login issues a new token
+    }
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'STORE': 'memory',
+    'CACHE_ALIAS': 'default',
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,
+    'EXPIRY': None,
+    'ROTATE_AFTER': None,
+}
+
+User = get_user_model()
+
+
+def token_settings():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH', {})}
+
+
+class MemoryStore:
+    """Per-process LRU of ``key -> (expires, value)``."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CacheStore:
+    """Entries in a Django cache, shared by every process using it."""
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+
+    @staticmethod
+    def cache_key(key):
+        # keep raw tokens out of the cache's key space
+        return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        return caches[self.alias].get(self.cache_key(key))
+
+    def set(self, key, value):
+        caches[self.alias].set(self.cache_key(key), value, self.ttl)
+
+    def delete(self, key):
+        caches[self.alias].delete(self.cache_key(key))
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    options = token_settings()
+    if options['STORE'] == 'cache':
+        return CacheStore(options['CACHE_ALIAS'], options['TTL'])
+    return MemoryStore(options['MAX_ENTRIES'], options['TTL'])
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    if setting == 'TOKEN_AUTH':
+        get_store.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _user_fields():
+    return tuple(field.attname for field in User._meta.concrete_fields if field.attname != 'password')
+
+
+def _age_over(created, seconds):
+    return seconds is not None and timezone.now() - created >= timedelta(seconds=seconds)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        store = get_store()
+        entry = store.get(key)
+        if entry is None:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed('User inactive or deleted.')
+            entry = (token.created, tuple(getattr(token.user, name) for name in _user_fields()))
+            store.set(key, entry)
+
+        created, values = entry
+        if _age_over(created, token_settings()['EXPIRY']):
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        user = User.from_db(DEFAULT_DB_ALIAS, _user_fields(), values)
+        return user, Token.from_db(DEFAULT_DB_ALIAS, ('key', 'user_id', 'created'), (key, user.pk, created))
+
+
+def issue_token(user):
+    """``user``'s token, replaced by a new one when it has expired or is due for rotation."""
+    options = token_settings()
+    token = Token.objects.filter(user=user).first()
+    if token is not None:
+        if not _age_over(token.created, options['EXPIRY']) and not _age_over(token.created, options['ROTATE_AFTER']):
+            return token
+        token.delete()
+    # a concurrent login may have created one meanwhile
+    token, _ = Token.objects.get_or_create(user=user)
+    return token
+
+
+def rotate_token(user):
+    """Replace ``user``'s token; the old one stops working immediately."""
+    Token.objects.filter(user=user).delete()
+    token, _ = Token.objects.get_or_create(user=user)
+    return token
+
+
+@receiver(post_delete, sender=Token)
+def _evict_token(sender, instance, **kwargs):
+    get_store().delete(instance.key)
+
+
+# deleting a user deletes its token, which evicts through _evict_token
+@receiver(post_save, sender=User)
+def _evict_user(sender, instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        get_store().delete(key)
@@ -0,0 +1,191 @@
+"""
+Follow-graph service.
+
+All follow reads and writes go through here instead of ad hoc queries on the
+``CustomUser.followers`` M2M. Each user's adjacency lists are cached as
+sorted ``array('q')`` id arrays, so membership tests are a binary search and
+set operations (mutuals, friends-of-friends) never join the through table.
+Writes invalidate the two lists they touch once they commit.
+
+Settings (optional):
+
+    FOLLOW_GRAPH = {
+        'CACHE_TIMEOUT': 600,    # seconds an adjacency list stays cached
+        'MAX_CACHED': 50000,     # longer lists are read from the DB each time
+    }
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from social_media_api.counters import adjust_counters, adjust_counters_many
+
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+
+DEFAULTS = {
+    'CACHE_TIMEOUT': 600,
+    'MAX_CACHED': 50000,
+}
+
+
+def graph_settings():
+    return {**DEFAULTS, **getattr(settings, 'FOLLOW_GRAPH', {})}
+
+
+def _follow_model():
+    return get_user_model().followers.through
+
+
+def _key(kind, user_id):
+    return f'graph:{kind}:{user_id}'
+
+
+def _pk(user):
+    return getattr(user, 'pk', user)
+
+
+# A through row (from_customuser=A, to_customuser=B) means B follows A.
+_COLUMNS = {
+    FOLLOWERS: ('from_customuser_id', 'to_customuser_id'),
+    FOLLOWING: ('to_customuser_id', 'from_customuser_id'),
+}
+
+
+def _adjacency(kind, user_ids):
+    """``{user_id: sorted array of neighbour ids}`` for ``user_ids``, cache first."""
+    user_ids = list(dict.fromkeys(user_ids))
+    cached = cache.get_many([_key(kind, user_id) for user_id in user_ids])
+    result = {user_id: cached[_key(kind, user_id)] for user_id in user_ids if _key(kind, user_id) in cached}
+
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    if missing:
+        owner, neighbour = _COLUMNS[kind]
+        loaded = {user_id: [] for user_id in missing}
+        rows = (
+            _follow_model().objects.filter(**{f'{owner}__in': missing})
+            .order_by(owner, neighbour)
+            .values_list(owner, neighbour)
+        )
+        for user_id, neighbour_id in rows.iterator(chunk_size=5000):
+            loaded[user_id].append(neighbour_id)
+
+        options = graph_settings()
+        to_cache = {}
+        for user_id, ids in loaded.items():
+            result[user_id] = array('q', ids)
+            if len(ids) <= options['MAX_CACHED']:
+                to_cache[_key(kind, user_id)] = result[user_id]
+        cache.set_many(to_cache, options['CACHE_TIMEOUT'])
+    return result
+
+
+def invalidate(*user_ids):
+    keys = [_key(kind, user_id) for user_id in user_ids for kind in (FOLLOWERS, FOLLOWING)]
+    # after the commit: a reader before it would cache the old lists again
+    transaction.on_commit(lambda: cache.delete_many(keys), robust=True)
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+# reads ------------------------------------------------------------------
+
+def followers_of(user):
+    """Sorted ids of the users following ``user``."""
+    return _adjacency(FOLLOWERS, [_pk(user)])[_pk(user)]
+
+
+def following_of(user):
+    """Sorted ids of the users ``user`` follows."""
+    return _adjacency(FOLLOWING, [_pk(user)])[_pk(user)]
+
+
+def is_following(user, other):
+    return _contains(following_of(user), _pk(other))
+
+
+def mutuals(user):
+    """Ids of users who follow ``user`` and are followed back."""
+    followers = followers_of(user)
+    return [user_id for user_id in following_of(user) if _contains(followers, user_id)]
+
+
+def suggested_users(user, limit=10, sample=200):
+    """Friends-of-friends ranked by how many of ``user``'s followees follow them.
+
+    Only the first ``sample`` followees are expanded, which bounds the cost
+    for users who follow a very large number of accounts.
+    """
+    user_id = _pk(user)
+    following = following_of(user_id)
+    scores = Counter()
+    for neighbours in _adjacency(FOLLOWING, following[:sample]).values():
+        scores.update(neighbours)
+    return [
+        candidate for candidate, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if candidate != user_id and not _contains(following, candidate)
+    ][:limit]
+
+
+# writes -----------------------------------------------------------------
+
+def follow(user, other):
+    """``user`` starts following ``other``; returns False if already following."""
+    User = get_user_model()
+    try:
+        # the through table's unique constraint decides who wins a race
+        with transaction.atomic():
+            _follow_model().objects.create(from_customuser_id=_pk(other), to_customuser_id=_pk(user))
+            adjust_counters(User, _pk(other), followers_count=1)
+            adjust_counters(User, _pk(user), following_count=1)
+    except IntegrityError:
+        return False
+    invalidate(_pk(user), _pk(other))
+    return True
+
+
+def unfollow(user, other):
+    """``user`` stops following ``other``; returns False if not following."""
+    User = get_user_model()
+    with transaction.atomic():
+        deleted, _ = _follow_model().objects.filter(
+            from_customuser_id=_pk(other), to_customuser_id=_pk(user),
+        ).delete()
+        adjust_counters(User, _pk(other), followers_count=-deleted)
+        adjust_counters(User, _pk(user), following_count=-deleted)
+    if deleted:
+        invalidate(_pk(user), _pk(other))
+    return bool(deleted)
+
+
+def follow_many(user, others):
+    """Follow every user in ``others`` at once; returns the ids newly followed."""
+    User = get_user_model()
+    user_id = _pk(user)
+    Follow = _follow_model()
+    requested = [other_id for other_id in dict.fromkeys(_pk(other) for other in others) if other_id != user_id]
+    known = set(User.objects.filter(pk__in=requested).values_list('pk', flat=True))
+    candidates = [other_id for other_id in requested if other_id in known]
+    with transaction.atomic():
+        existing = set(
+            Follow.objects.filter(to_customuser_id=user_id, from_customuser_id__in=candidates)
+            .values_list('from_customuser_id', flat=True)
+        )
+        new_ids = [other_id for other_id in candidates if other_id not in existing]
+        Follow.objects.bulk_create(
+            [Follow(from_customuser_id=other_id, to_customuser_id=user_id) for other_id in new_ids],
+            ignore_conflicts=True,
+        )
+        if new_ids:
+            adjust_counters_many(User, new_ids, followers_count=1)
+            adjust_counters(User, user_id, following_count=len(new_ids))
+    invalidate(user_id, *new_ids)
+    return new_ids
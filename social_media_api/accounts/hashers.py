@@ -0,0 +1,86 @@
+"""
+Password hashers whose cost is set in settings.
+
+Hashing is most of the CPU time of login and registration, so the cost
+decides how many logins a worker can serve. ``PASSWORD_HASHERS`` picks the
+algorithm: the first entry hashes new passwords and the others only verify
+existing hashes. ``PASSWORD_HASHING`` sets each algorithm's cost; anything
+left out keeps Django's default.
+
+A password hashed with another algorithm or cost is rehashed with the
+current ones the next time its user logs in. Django does this when it checks
+the password, so changing either setting upgrades (or downgrades) users
+gradually, with no migration.
+
+argon2 needs ``argon2-cffi`` and bcrypt needs ``bcrypt``. Without the library
+the hasher still loads, but using it raises ``ValueError``.
+``manage.py benchmark_login`` compares algorithms and costs.
+
+Settings (all optional):
+
+    PASSWORD_HASHING = {
+        'pbkdf2_sha256': {'iterations': 1000000},
+        'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+        'bcrypt_sha256': {'rounds': 12},
+    }
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+def hashing_settings():
+    return getattr(settings, 'PASSWORD_HASHING', {})
+
+
+class TunedHasherMixin:
+    """Takes the ``tunables`` attributes from ``PASSWORD_HASHING[algorithm]``."""
+    tunables = ()
+
+    def __init__(self):
+        for name, value in hashing_settings().get(self.algorithm, {}).items():
+            if name not in self.tunables:
+                raise ImproperlyConfigured(
+                    f"PASSWORD_HASHING[{self.algorithm!r}] has unknown option {name!r}; "
+                    f"expected one of {', '.join(self.tunables)}."
+                )
+            setattr(self, name, value)
+
+
+class PBKDF2PasswordHasher(TunedHasherMixin, hashers.PBKDF2PasswordHasher):
+    tunables = ('iterations',)
+
+
+class Argon2PasswordHasher(TunedHasherMixin, hashers.Argon2PasswordHasher):
+    tunables = ('time_cost', 'memory_cost', 'parallelism')
+
+
+class BCryptSHA256PasswordHasher(TunedHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    tunables = ('rounds',)
+
+
+# the option ``manage.py benchmark --hash-cost`` varies per algorithm
+COST_OPTIONS = {
+    'pbkdf2_sha256': 'iterations',
+    'argon2': 'time_cost',
+    'bcrypt_sha256': 'rounds',
+}
+
+
+def hashers_preferring(algorithm):
+    """``PASSWORD_HASHERS`` reordered so that ``algorithm`` hashes new passwords."""
+    paths = {import_string(path).algorithm: path for path in settings.PASSWORD_HASHERS}
+    if algorithm not in paths:
+        raise ValueError(f'No hasher for {algorithm!r} in PASSWORD_HASHERS.')
+    return [paths[algorithm], *(path for name, path in paths.items() if name != algorithm)]
+
+
+@receiver(setting_changed)
+def _reset_hashers(setting, **kwargs):
+    # Django rebuilds its hasher instances only when PASSWORD_HASHERS changes
+    if setting == 'PASSWORD_HASHING':
+        hashers.get_hashers.cache_clear()
+        hashers.get_hashers_by_algorithm.cache_clear()
@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 
+from . import graph
+
+
 class CustomUser(AbstractUser):
     bio = models.TextField(blank=True, default='')
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
@@ -12,6 +17,26 @@ class CustomUser(AbstractUser):
         related_name='following',
         blank=True,
     )
+    # denormalized counters, see social_media_api/counters.py
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    def follow(self, other):
+        """Start following ``other``; returns False if already following."""
+        return graph.follow(self, other)
+
+    def unfollow(self, other):
+        """Stop following ``other``; returns False if not following."""
+        return graph.unfollow(self, other)
+
+
+@receiver(m2m_changed, sender=CustomUser.followers.through)
+def invalidate_follow_graph(sender, instance, action, pk_set, **kwargs):
+    # graph.follow()/unfollow() invalidate themselves; this covers direct
+    # M2M edits such as the admin or ``user.followers.add()``
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        graph.invalidate(instance.pk, *(pk_set or ()))
@@ -1,17 +1,89 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.contrib.auth import get_user_model, authenticate
+from django.db.models import Prefetch
 from rest_framework.authtoken.models import Token
+from social_media_api.fieldsets import SparseFieldsetMixin
+from .authentication import issue_token
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Minimal user representation for follower/following listings."""
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'followers_count']
+        read_only_fields = fields
+
+
+class RelationSummaryField(serializers.Field):
+    """Count, a capped preview and a link for a follow relation.
+
+    Cost is independent of the relation's size: the count comes from the
+    denormalized ``<relation>_count`` column and the preview from a sliced
+    prefetch, so a whole page of users needs a single extra query.
+    """
+
+    def __init__(self, relation, preview_size, **kwargs):
+        self.relation = relation
+        self.preview_size = preview_size
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    @property
+    def preview_attr(self):
+        return f'{self.relation}_preview'
+
+    def prefetch_lookups(self, prefix):
+        path = f'{prefix}__{self.relation}' if prefix else self.relation
+        preview = User.objects.only('id', 'username').order_by('id')[:self.preview_size]
+        return [Prefetch(path, queryset=preview, to_attr=self.preview_attr)]
+
+    def to_representation(self, user):
+        preview = getattr(user, self.preview_attr, None)
+        if preview is None:
+            preview = getattr(user, self.relation).only('id', 'username').order_by('id')[:self.preview_size]
+        return {
+            'count': getattr(user, f'{self.relation}_count'),
+            'preview': [{'id': u.pk, 'username': u.username} for u in preview],
+            'url': reverse(f'user-{self.relation}', args=[user.pk], request=self.context.get('request')),
+        }
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    ``followers``/``following`` are summarized (count + preview + link) by
+    default; pass ``?expand=followers`` (or ``?relations=full`` for both) to
+    get the complete id lists instead. Supports ``?fields=``.
+    """
+    relation_fields = ('followers', 'following')
+    preview_size = 5
+
+    def relations_mode(self):
+        request = self.context.get('request')
+        if request is None:
+            return 'summary'
+        return request.query_params.get('relations', 'summary')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.relations_mode() != 'full':
+            for name in self.relation_fields:
+                if name in fields and not self.is_expanded(name):
+                    fields[name] = RelationSummaryField(relation=name, preview_size=self.preview_size)
+        return fields
+
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'bio', 'profile_picture', 'followers', 'following'
+            'bio', 'profile_picture', 'followers', 'following',
+            'followers_count', 'following_count', 'posts_count'
         ]
-        read_only_fields = ['followers', 'following']
+        read_only_fields = ['followers', 'following', 'followers_count', 'following_count', 'posts_count']
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -46,5 +118,5 @@ class LoginSerializer(serializers.Serializer):
         if not user:
             raise serializers.ValidationError("Invalid credentials")
 
-        token, _ = Token.objects.get_or_create(user=user)
-        return {"token": token.key, "username": user.username}
+        # a new token when the current one has expired or is due for rotation
+        return {"token": issue_token(user).key, "username": user.username}
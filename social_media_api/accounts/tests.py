@@ -1,3 +1,246 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import global_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, get_hashers_by_algorithm
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+from social_media_api import settings as project_settings
+from social_media_api.testing import APITestCase
+
+from posts.models import Post, TimelineEntry
+from . import authentication, graph, hashers
+
+User = get_user_model()
+
+
+class UserRelationTests(APITestCase):
+    def setUp(self):
+        self.star = User.objects.create_user(username='star', password='pass')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(8)]
+        for fan in self.fans:
+            fan.follow(self.star)
+        self.star.refresh_from_db()
+        self.client.force_authenticate(self.fans[0])
+
+    def test_profile_summarizes_relations(self):
+        self.client.force_authenticate(self.star)
+        followers = self.client.get('/api/accounts/profile/').data['followers']
+        self.assertEqual(followers['count'], 8)
+        self.assertEqual(len(followers['preview']), 5)
+        self.assertTrue(followers['url'].endswith(f'/api/accounts/users/{self.star.id}/followers/'))
+
+    def test_full_mode_returns_id_lists(self):
+        self.client.force_authenticate(self.star)
+        data = self.client.get('/api/accounts/profile/?relations=full').data
+        self.assertEqual(sorted(data['followers']), sorted(fan.id for fan in self.fans))
+
+    def test_sparse_fields_and_expand(self):
+        results = self.client.get('/api/accounts/users/?fields=id,username').data['results']
+        self.assertEqual(set(results[0]), {'id', 'username'})
+
+        self.client.force_authenticate(self.star)
+        data = self.client.get('/api/accounts/profile/?expand=followers').data
+        self.assertEqual(sorted(data['followers']), sorted(fan.id for fan in self.fans))
+        self.assertEqual(data['following']['count'], 0)
+
+    def test_followers_endpoint_is_paginated(self):
+        url = f'/api/accounts/users/{self.star.id}/followers/?page_size=3'
+        seen = []
+        while url:
+            data = self.client.get(url).data
+            seen.extend(user['username'] for user in data['results'])
+            url = data['next']
+        self.assertEqual(sorted(seen), sorted(fan.username for fan in self.fans))
+
+        following = self.client.get(f'/api/accounts/users/{self.fans[0].id}/following/').data
+        self.assertEqual([user['id'] for user in following['results']], [self.star.id])
+
+    def test_user_list_query_count_is_constant(self):
+        def count(page_size):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(f'/api/accounts/users/?page_size={page_size}')
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(2), count(9))
+
+
+class FollowGraphTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.a, self.b, self.c, self.d = (
+            User.objects.create_user(username=name, password='pass') for name in 'abcd'
+        )
+        # a -> b, a -> c, b -> a, b -> d, c -> d
+        self.a.follow(self.b)
+        self.a.follow(self.c)
+        self.b.follow(self.a)
+        self.b.follow(self.d)
+        self.c.follow(self.d)
+
+    def test_adjacency_reads(self):
+        self.assertEqual(list(graph.following_of(self.a)), sorted([self.b.id, self.c.id]))
+        self.assertEqual(list(graph.followers_of(self.d)), sorted([self.b.id, self.c.id]))
+        self.assertTrue(graph.is_following(self.a, self.b))
+        self.assertFalse(graph.is_following(self.d, self.a))
+        self.assertEqual(graph.mutuals(self.a), [self.b.id])
+
+    def test_reads_are_cached_and_invalidated_on_write(self):
+        graph.following_of(self.a)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.a, self.b))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a.unfollow(self.b)
+        self.assertFalse(graph.is_following(self.a, self.b))
+        self.assertEqual(graph.mutuals(self.b), [])
+
+    def test_suggested_users_are_friends_of_friends(self):
+        self.assertEqual(graph.suggested_users(self.a), [self.d.id])
+        self.client.force_authenticate(self.a)
+        response = self.client.get('/api/accounts/users/suggested/')
+        self.assertEqual([user['username'] for user in response.data], ['d'])
+
+    def test_follow_many(self):
+        posts = [Post.objects.create(author=author, title='t', content='c') for author in (self.a, self.b, self.c)]
+        self.client.force_authenticate(self.d)
+        response = self.client.post('/api/accounts/follow/', {'user_ids': [self.a.id, self.b.id, self.d.id, 999]},
+                                    format='json')
+        self.assertEqual(response.data['followed'], [self.a.id, self.b.id])
+        self.assertEqual(graph.follow_many(self.d, [self.a.id]), [])
+        self.d.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.d.following_count, self.b.followers_count), (2, 2))
+        self.assertEqual(graph.mutuals(self.d), [self.b.id])
+        # both backfills land in the timeline
+        self.assertEqual(set(TimelineEntry.objects.filter(owner=self.d).values_list('post_id', flat=True)),
+                         {posts[0].id, posts[1].id})
+
+
+class TokenCacheTests(APITestCase):
+    def setUp(self):
+        authentication.get_store().clear()
+        self.user = User.objects.create_user(username='tok', password='pass')
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, key, path='/api/accounts/users/mutuals/'):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        return self.client.get(path)
+
+    def token_queries(self, key):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get(key)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'authtoken_token' in q['sql']]
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertEqual(len(self.token_queries(self.token.key)), 1)
+        self.assertEqual(self.token_queries(self.token.key), [])
+
+    def test_profile_is_read_fresh(self):
+        self.get(self.token.key)
+        User.objects.filter(pk=self.user.pk).update(posts_count=7)
+        self.assertEqual(self.get(self.token.key, '/api/accounts/profile/').data['posts_count'], 7)
+
+    def test_deactivation_and_rotation_evict(self):
+        self.get(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(self.token.key).status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        new_key = self.client.post('/api/accounts/token/rotate/').data['token']
+        self.assertNotEqual(new_key, self.token.key)
+        self.assertEqual(self.get(self.token.key).status_code, 401)
+        self.assertEqual(self.get(new_key).status_code, 200)
+
+    @override_settings(TOKEN_AUTH={'EXPIRY': 3600})
+    def test_expired_tokens_fail_and_login_replaces_them(self):
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(hours=2))
+        response = self.get(self.token.key)
+        self.assertEqual((response.status_code, response.data['detail']), (401, 'Token has expired.'))
+
+        self.client.credentials()
+        response = self.client.post('/api/accounts/login/', {'username': 'tok', 'password': 'pass'}, secure=True)
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertEqual(self.get(response.data['token']).status_code, 200)
+
+    @override_settings(TOKEN_AUTH={'ROTATE_AFTER': 60})
+    def test_login_rotates_old_tokens(self):
+        login = {'username': 'tok', 'password': 'pass'}
+        self.assertEqual(self.client.post('/api/accounts/login/', login, secure=True).data['token'], self.token.key)
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(minutes=5))
+        self.assertNotEqual(self.client.post('/api/accounts/login/', login, secure=True).data['token'],
+                            self.token.key)
+
+    @override_settings(TOKEN_AUTH={'STORE': 'cache'})
+    def test_shared_cache_store(self):
+        cache.clear()
+        self.assertEqual(len(self.token_queries(self.token.key)), 1)
+        self.assertEqual(self.token_queries(self.token.key), [])
+        self.token.delete()
+        self.assertEqual(self.get(self.token.key).status_code, 401)
+
+    def test_lru_bound(self):
+        store = authentication.MemoryStore(max_entries=2, ttl=60)
+        for key in 'abc':
+            store.set(key, key)
+        self.assertEqual([store.get(key) for key in 'abc'], [None, 'b', 'c'])
+
+
+PBKDF2 = 'accounts.hashers.PBKDF2PasswordHasher'
+MD5 = 'django.contrib.auth.hashers.MD5PasswordHasher'
+
+
+@override_settings(PASSWORD_HASHERS=[PBKDF2, MD5], PASSWORD_HASHING={'pbkdf2_sha256': {'iterations': 1000}})
+class PasswordHashingTests(APITestCase):
+    def login(self):
+        return self.client.post('/api/accounts/login/', {'username': 'hash', 'password': 'pass'}, secure=True)
+
+    def password(self):
+        return User.objects.get(username='hash').password
+
+    def test_configured_cost(self):
+        User.objects.create_user(username='hash', password='pass')
+        self.assertTrue(self.password().startswith('pbkdf2_sha256$1000$'))
+
+    def test_login_upgrades_cost_and_algorithm(self):
+        with self.settings(PASSWORD_HASHERS=[MD5, PBKDF2]):
+            User.objects.create_user(username='hash', password='pass')
+        self.assertTrue(self.password().startswith('md5$'))
+
+        self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(self.password().startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(PASSWORD_HASHING={'pbkdf2_sha256': {'iterations': 1500}}):
+            self.assertEqual(self.login().status_code, 200)
+            self.assertTrue(self.password().startswith('pbkdf2_sha256$1500$'))
+            self.assertTrue(check_password('pass', self.password()))
+
+    def test_django_default_hashes_still_verify(self):
+        default = {import_string(path).algorithm for path in global_settings.PASSWORD_HASHERS}
+        with self.settings(PASSWORD_HASHERS=project_settings.PASSWORD_HASHERS):
+            self.assertLessEqual(default, set(get_hashers_by_algorithm()))
+
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']):
+            User.objects.create_user(username='hash', password='pass')
+        with self.settings(PASSWORD_HASHERS=project_settings.PASSWORD_HASHERS):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(self.password().startswith('pbkdf2_sha256$1000$'))
+
+    def test_unknown_option(self):
+        with self.settings(PASSWORD_HASHING={'pbkdf2_sha256': {'rounds': 4}}):
+            with self.assertRaises(ImproperlyConfigured):
+                User.objects.create_user(username='hash', password='pass')
+
+    def test_hashers_preferring(self):
+        self.assertEqual(hashers.hashers_preferring('md5'), [MD5, PBKDF2])
+        with self.assertRaises(ValueError):
+            hashers.hashers_preferring('argon2')
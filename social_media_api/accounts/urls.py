@@ -3,16 +3,28 @@ from .views import (
     RegisterAPIView,
     LoginAPIView,
     ProfileAPIView,
+    rotate_auth_token,
     UserListView,
+    FollowersListView,
+    FollowingListView,
     follow_user,
     unfollow_user,
+    follow_many,
+    mutual_follows,
+    suggested_users,
 )
 
 urlpatterns = [
     path('register/', RegisterAPIView.as_view()),
     path('login/', LoginAPIView.as_view()),
     path('profile/', ProfileAPIView.as_view()),
+    path('token/rotate/', rotate_auth_token),
     path('users/', UserListView.as_view()),
+    path('users/mutuals/', mutual_follows),
+    path('users/suggested/', suggested_users),
+    path('users/<int:user_id>/followers/', FollowersListView.as_view(), name='user-followers'),
+    path('users/<int:user_id>/following/', FollowingListView.as_view(), name='user-following'),
+    path('follow/', follow_many),
     path('follow/<int:user_id>/', follow_user),
     path('unfollow/<int:user_id>/', unfollow_user),
 ]
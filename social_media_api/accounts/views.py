@@ -3,8 +3,17 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from rest_framework.authtoken.models import Token
+from notifications.pipeline import notify
+from posts import timeline
+from social_media_api.pagination import IdKeysetPagination
+from social_media_api.query_planner import PlannedQuerysetMixin
+from social_media_api.response_cache import CachedResponseMixin
+from social_media_api.throttling import throttle_scope
+from social_media_api.writer import write
+from . import graph
+from .authentication import rotate_token
 from .models import CustomUser
-from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, UserSummarySerializer
 
 
 # ============================
@@ -13,6 +22,7 @@ from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
 
 class RegisterAPIView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'register'
     serializer_class = RegisterSerializer
 
     def create(self, request, *args, **kwargs):
@@ -28,6 +38,8 @@ class RegisterAPIView(generics.CreateAPIView):
 
 class LoginAPIView(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
+    # password hashing is deliberately slow; cap attempts per address
+    throttle_scope = 'login'
     serializer_class = LoginSerializer
 
     def post(self, request, *args, **kwargs):
@@ -41,19 +53,51 @@ class ProfileAPIView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the token cache, with stale counters that
+        # a save would write back
+        return CustomUser.objects.get(pk=self.request.user.pk)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def rotate_auth_token(request):
+    """Replace the caller's token; the old one stops working immediately."""
+    return Response({'token': rotate_token(request.user).key})
 
 
 # ============================
 # FOLLOW / UNFOLLOW FEATURES
 # ============================
 
-class UserListView(generics.ListAPIView):
+class UserListView(CachedResponseMixin, PlannedQuerysetMixin, generics.ListAPIView):
     queryset = CustomUser.objects.all()  # ✔ REQUIRED STRING
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]  # ✔ REQUIRED STRING
+    pagination_class = IdKeysetPagination
+    cache_dependencies = [CustomUser.followers.through]
+
+
+class UserRelationListView(generics.ListAPIView):
+    """Paginated followers (or following) of one user."""
+    serializer_class = UserSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdKeysetPagination
+    relation = None
+
+    def get_queryset(self):
+        user = get_object_or_404(CustomUser, id=self.kwargs['user_id'])
+        return getattr(user, self.relation).only('id', 'username', 'followers_count')
 
 
+class FollowersListView(UserRelationListView):
+    relation = 'followers'
+
+
+class FollowingListView(UserRelationListView):
+    relation = 'following'
+
+
+@throttle_scope('follow')
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])  # ✔ REQUIRED STRING
 def follow_user(request, user_id):
@@ -65,20 +109,79 @@ def follow_user(request, user_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    request.user.following.add(user_to_follow)
+    write(_follow, request.user, user_to_follow)
     return Response(
         {"detail": f"You are now following {user_to_follow.username}."},
         status=status.HTTP_200_OK
     )
 
 
+@throttle_scope('follow')
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])  # ✔ REQUIRED STRING
 def unfollow_user(request, user_id):
     user_to_unfollow = get_object_or_404(CustomUser, id=user_id)
 
-    request.user.following.remove(user_to_unfollow)
+    write(_unfollow, request.user, user_to_unfollow)
     return Response(
         {"detail": f"You have unfollowed {user_to_unfollow.username}."},
         status=status.HTTP_200_OK
     )
+
+
+# run on the serialized writer (see social_media_api/writer.py)
+def _follow(user, other):
+    if user.follow(other):
+        timeline.follow_author(user, other)
+        notify(other, user, 'started following you', user)
+
+
+def _unfollow(user, other):
+    if user.unfollow(other):
+        timeline.unfollow_author(user, other)
+
+
+def _follow_many(user, user_ids):
+    followed = graph.follow_many(user, user_ids)
+    others = _users_in_order(followed)
+    timeline.follow_authors(user, others)
+    for other in others:
+        notify(other, user, 'started following you', user)
+    return followed
+
+
+MAX_FOLLOW_MANY = 100
+
+
+def _users_in_order(user_ids):
+    users = CustomUser.objects.only('id', 'username', 'followers_count').in_bulk(user_ids)
+    return [users[pk] for pk in user_ids if pk in users]
+
+
+@throttle_scope('follow')
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def follow_many(request):
+    user_ids = request.data.get('user_ids')
+    if not isinstance(user_ids, list) or not all(isinstance(pk, int) for pk in user_ids):
+        return Response({"detail": "user_ids must be a list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(user_ids) > MAX_FOLLOW_MANY:
+        return Response({"detail": f"At most {MAX_FOLLOW_MANY} users per request."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    followed = write(_follow_many, request.user, user_ids)
+    return Response({"followed": followed}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def mutual_follows(request):
+    users = _users_in_order(graph.mutuals(request.user))
+    return Response(UserSummarySerializer(users, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def suggested_users(request):
+    users = _users_in_order(graph.suggested_users(request.user))
+    return Response(UserSummarySerializer(users, many=True).data)
@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.utils import timezone
+
+
+def hot_queries():
+    """The busiest query shapes, checked by ``manage.py check_query_plans``."""
+    from .models import Notification, NotificationOutbox
+
+    now = timezone.now()
+    return {
+        'notifications.inbox': Notification.objects.filter(recipient_id=1).order_by('-timestamp', '-id')[:20],
+        'notifications.unread': Notification.objects.filter(recipient_id=1, is_read=False)
+                                                    .order_by('-timestamp')[:20],
+        'notifications.prune': Notification.objects.filter(timestamp__lt=now).order_by('timestamp')
+                                                   .values_list('pk', 'recipient_id', 'is_read')[:1000],
+        'notifications.outbox_redelivery': NotificationOutbox.objects.filter(created_at__lt=now)
+                                                                     .order_by('created_at', 'id')[:500],
+    }
 
 
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
+
+    def ready(self):
+        from labtools import query_plans
+
+        query_plans.register(hot_queries)
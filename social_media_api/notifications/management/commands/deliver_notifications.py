@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notifications.pipeline import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver notification events left in the outbox (e.g. after a worker crash)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=60,
+                            help="Only deliver events older than this many seconds, "
+                                 "so rows still owned by live workers are left alone.")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(seconds=options['min_age'])
+        delivered = deliver_outbox(older_than=older_than, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} notification events."))
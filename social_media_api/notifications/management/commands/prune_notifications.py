@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications.pipeline import pipeline_settings
+from notifications.unread import recompute_unread
+
+
+class Command(BaseCommand):
+    help = "Delete notifications older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Retention in days (default: NOTIFICATIONS['RETENTION_DAYS']).")
+        parser.add_argument('--read-only', action='store_true',
+                            help="Only delete notifications that have been read.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        days = options['days'] or pipeline_settings()['RETENTION_DAYS']
+        expired = Notification.objects.filter(timestamp__lt=timezone.now() - timedelta(days=days))
+        if options['read_only']:
+            expired = expired.filter(is_read=True)
+
+        deleted = 0
+        while True:
+            # small batches keep each delete's lock short
+            batch = list(expired.order_by('timestamp').values_list('pk', 'recipient_id', 'is_read')[:options['batch_size']])
+            if not batch:
+                break
+            Notification.objects.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+            unread_recipients = {recipient_id for _, recipient_id, is_read in batch if not is_read}
+            if unread_recipients:
+                recompute_unread(unread_recipients)
+            deleted += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} notifications older than {days} days."))
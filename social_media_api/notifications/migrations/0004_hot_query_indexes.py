@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_inbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(fields=['created_at', 'id'], name='outbox_created_idx'),
+        ),
+    ]
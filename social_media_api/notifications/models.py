@@ -16,3 +16,44 @@ class Notification(models.Model):
 
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # repeated unread events on the same target are coalesced into one row
+    actor_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            # inbox listing and unread filtering for one recipient
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_inbox_idx'),
+            models.Index(fields=['recipient', 'is_read', '-timestamp'], name='notif_unread_idx'),
+            # retention pruning
+            models.Index(fields=['timestamp'], name='notif_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        others = self.actor_count - 1
+        if others > 0:
+            return f"{self.actor} and {others} other{'s' if others > 1 else ''} {self.verb}"
+        return f"{self.actor} {self.verb}"
+
+
+class UnreadCounter(models.Model):
+    """Maintained number of unread notifications per user, see notifications/unread.py."""
+    user = models.OneToOneField(User, primary_key=True, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+
+class NotificationOutbox(models.Model):
+    """Durable record of a notification event not yet delivered by the pipeline."""
+    recipient_id = models.BigIntegerField()
+    actor_id = models.BigIntegerField()
+    verb = models.CharField(max_length=255)
+    content_type_id = models.IntegerField()
+    object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # redelivery of rows older than a cutoff, see deliver_outbox()
+            models.Index(fields=['created_at', 'id'], name='outbox_created_idx'),
+        ]
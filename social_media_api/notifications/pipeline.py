@@ -0,0 +1,237 @@
+"""
+Background notification delivery.
+
+Views call ``notify(...)`` instead of creating ``Notification`` rows. After
+the surrounding transaction commits, the event is handed to an in-process
+queue drained by a small pool of worker threads, which coalesce events for
+the same recipient/verb/target ("alice and 41 others liked your post") and
+write them with ``bulk_create`` / ``bulk_update``.
+
+With ``OUTBOX`` enabled each event is also stored in ``NotificationOutbox``
+as part of the request's transaction; workers delete the rows they deliver,
+and ``manage.py deliver_notifications`` re-delivers anything left behind by
+a crashed process.
+
+Once a batch commits, the created and coalesced rows are published as
+``notification`` events to their recipients' event streams
+(social_media_api/events.py).
+
+Settings (all optional):
+
+    NOTIFICATIONS = {
+        'WORKERS': 1,            # 0 delivers synchronously on commit
+        'BATCH_SIZE': 500,       # max events coalesced per flush
+        'FLUSH_INTERVAL': 0.5,   # seconds a worker waits to fill a batch
+        'OUTBOX': True,
+        'RETENTION_DAYS': 90,    # used by manage.py prune_notifications
+    }
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from social_media_api.events import publish as publish_event, user_channel
+from social_media_api.query_planner import plan_queryset
+from .models import Notification, NotificationOutbox
+from .serializers import NotificationSerializer
+from .unread import adjust_unread
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WORKERS': 1,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'OUTBOX': True,
+    'RETENTION_DAYS': 90,
+}
+
+Event = namedtuple('Event', 'recipient_id actor_id verb content_type_id object_id outbox_id')
+
+
+def pipeline_settings():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def notify(recipient, actor, verb, target):
+    """Queue a notification for ``recipient``; never notifies users about themselves."""
+    if recipient.pk == actor.pk:
+        return
+    # get_for_model() is served from ContentType's per-process cache
+    content_type_id = ContentType.objects.get_for_model(target).pk
+    event = Event(recipient.pk, actor.pk, verb, content_type_id, target.pk, None)
+    if pipeline_settings()['OUTBOX']:
+        row = NotificationOutbox.objects.create(
+            recipient_id=event.recipient_id,
+            actor_id=event.actor_id,
+            verb=verb,
+            content_type_id=content_type_id,
+            object_id=event.object_id,
+        )
+        event = event._replace(outbox_id=row.pk)
+    transaction.on_commit(lambda: get_dispatcher().enqueue(event))
+
+
+def _key(event):
+    return (event.recipient_id, event.verb, event.content_type_id, event.object_id)
+
+
+def deliver(events):
+    """Coalesce ``events`` and write them; returns the number of rows touched."""
+    groups = {}
+    for event in events:
+        groups.setdefault(_key(event), []).append(event)
+    if not groups:
+        return 0
+
+    # unread notifications on the same target absorb the new events
+    match = Q()
+    for recipient_id, verb, content_type_id, object_id in groups:
+        match |= Q(recipient_id=recipient_id, verb=verb, content_type_id=content_type_id, object_id=object_id)
+
+    with transaction.atomic():
+        existing = {}
+        for notification in Notification.objects.filter(match, is_read=False).order_by('timestamp'):
+            existing[(notification.recipient_id, notification.verb,
+                      notification.content_type_id, notification.object_id)] = notification
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for key, group in groups.items():
+            latest = group[-1]
+            notification = existing.get(key)
+            if notification is None:
+                to_create.append(Notification(
+                    recipient_id=latest.recipient_id,
+                    actor_id=latest.actor_id,
+                    verb=latest.verb,
+                    content_type_id=latest.content_type_id,
+                    object_id=latest.object_id,
+                    actor_count=len(group),
+                ))
+            else:
+                notification.actor_id = latest.actor_id
+                notification.actor_count = F('actor_count') + len(group)
+                notification.timestamp = now
+                to_update.append(notification)
+
+        Notification.objects.bulk_create(to_create)
+        # coalesced events land on already-unread rows, so only new rows count
+        adjust_unread(Counter(notification.recipient_id for notification in to_create))
+        if to_update:
+            Notification.objects.bulk_update(to_update, ['actor_id', 'actor_count', 'timestamp'])
+        outbox_ids = [event.outbox_id for event in events if event.outbox_id is not None]
+        if outbox_ids:
+            NotificationOutbox.objects.filter(pk__in=outbox_ids).delete()
+        touched = [notification.pk for notification in to_create + to_update if notification.pk is not None]
+        transaction.on_commit(lambda: publish(touched))
+    return len(to_create) + len(to_update)
+
+
+def publish(notification_ids):
+    """Send the current state of these notifications to their recipients' event streams."""
+    if not notification_ids:
+        return
+    rows = plan_queryset(Notification.objects.filter(pk__in=notification_ids), NotificationSerializer)
+    for notification in rows:
+        publish_event([user_channel(notification.recipient_id)], 'notification',
+                      NotificationSerializer(notification).data)
+
+
+def deliver_outbox(older_than=None, batch_size=None):
+    """Deliver every outbox row (optionally only rows older than ``older_than``)."""
+    batch_size = batch_size or pipeline_settings()['BATCH_SIZE']
+    delivered = 0
+    while True:
+        rows = NotificationOutbox.objects.order_by('created_at', 'id')
+        if older_than is not None:
+            rows = rows.filter(created_at__lt=older_than)
+        batch = [
+            Event(r.recipient_id, r.actor_id, r.verb, r.content_type_id, r.object_id, r.pk)
+            for r in rows[:batch_size]
+        ]
+        if not batch:
+            return delivered
+        deliver(batch)
+        delivered += len(batch)
+
+
+class Dispatcher:
+    """In-process queue plus a pool of worker threads that call ``deliver``."""
+
+    def __init__(self, workers, batch_size, flush_interval):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, event):
+        if self.workers <= 0:
+            deliver([event])
+            return
+        self._ensure_started()
+        self.queue.put(event)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'notifications-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            try:
+                deliver(batch)
+            except Exception:
+                # rows stay in the outbox for deliver_notifications to retry
+                logger.exception("Failed to deliver %d notification events", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def join(self):
+        """Block until every queued event has been processed."""
+        self.queue.join()
+
+
+@lru_cache(maxsize=None)
+def get_dispatcher():
+    options = pipeline_settings()
+    return Dispatcher(options['WORKERS'], options['BATCH_SIZE'], options['FLUSH_INTERVAL'])
+
+
+@receiver(setting_changed)
+def _reset_dispatcher(setting, **kwargs):
+    if setting == 'NOTIFICATIONS':
+        get_dispatcher.cache_clear()
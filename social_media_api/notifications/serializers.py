@@ -0,0 +1,16 @@
+from rest_framework import serializers
+from .models import Notification
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    actor_username = serializers.ReadOnlyField(source='actor.username')
+    target_type = serializers.ReadOnlyField(source='content_type.model')
+    summary = serializers.CharField(source='__str__', read_only=True)
+
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'actor', 'actor_username', 'actor_count', 'verb',
+            'target_type', 'object_id', 'summary', 'timestamp', 'is_read'
+        ]
+        read_only_fields = fields
@@ -1,3 +1,124 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from social_media_api.testing import APITestCase
+
+from posts.models import Post
+from .models import Notification, NotificationOutbox, UnreadCounter
+from .pipeline import Event, deliver
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATIONS={'WORKERS': 0})
+class NotificationPipelineTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(3)]
+
+    def like(self, user):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+
+    def test_like_is_delivered_after_commit(self):
+        self.like(self.fans[0])
+        notification = Notification.objects.get()
+        self.assertEqual((notification.recipient, notification.actor), (self.author, self.fans[0]))
+        self.assertEqual(notification.target, self.post)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_repeated_events_are_coalesced(self):
+        for fan in self.fans:
+            self.like(fan)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(str(notification), 'fan2 and 2 others liked your post')
+
+    def test_own_post_is_not_notified(self):
+        self.like(self.author)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_outbox_is_redelivered_by_command(self):
+        # without running on-commit hooks the event only reaches the outbox
+        self.client.force_authenticate(self.fans[0])
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+        call_command('deliver_notifications', min_age=0, stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+
+class InboxTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='inbox', password='pass')
+        self.others = [User.objects.create_user(username=f'other{i}', password='pass') for i in range(3)]
+        self.posts = [Post.objects.create(author=self.user, title=f'p{i}', content='c') for i in range(3)]
+        content_type_id = ContentType.objects.get_for_model(Post).pk
+        deliver([
+            Event(self.user.pk, other.pk, 'liked your post', content_type_id, post.pk, None)
+            for other, post in zip(self.others, self.posts)
+        ])
+        self.client.force_authenticate(self.user)
+
+    def unread(self):
+        return self.client.get('/api/notifications/unread-count/').data['unread']
+
+    def test_listing_is_paginated_newest_first(self):
+        data = self.client.get('/api/notifications/?page_size=2').data
+        self.assertEqual(len(data['results']), 2)
+        rest = self.client.get(data['next']).data['results']
+        ids = [n['id'] for n in data['results'] + rest]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_unread_count_is_maintained(self):
+        self.assertEqual(self.unread(), 3)
+        first = Notification.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{first.pk}/read/')
+            self.client.post(f'/api/notifications/{first.pk}/read/')
+        self.assertEqual(self.unread(), 2)
+        self.assertEqual(len(self.client.get('/api/notifications/?unread=1').data['results']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(response.data['marked_read'], 2)
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_mark_all_read_subtracts_what_it_marked(self):
+        # the extra one stands in for a notification delivered after the UPDATE
+        UnreadCounter.objects.filter(user=self.user).update(count=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/notifications/mark-all-read/').data['marked_read'], 3)
+        self.assertEqual(self.unread(), 1)
+
+    def test_unread_count_is_cached(self):
+        self.unread()
+        with self.assertNumQueries(0):
+            self.client.get('/api/notifications/unread-count/')
+
+    def test_other_users_notifications_are_hidden(self):
+        self.client.force_authenticate(self.others[0])
+        self.assertEqual(self.client.get('/api/notifications/').data['results'], [])
+        notification = Notification.objects.first()
+        self.assertEqual(self.client.post(f'/api/notifications/{notification.pk}/read/').status_code, 404)
+
+    def test_prune_removes_expired_and_fixes_counter(self):
+        Notification.objects.filter(pk=Notification.objects.first().pk).update(
+            timestamp=timezone.now() - timedelta(days=365),
+        )
+        call_command('prune_notifications', days=30, stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).count, 2)
+        self.assertEqual(self.unread(), 2)
@@ -0,0 +1,71 @@
+"""
+Unread notification counters.
+
+``UnreadCounter`` rows are kept in step with ``Notification.is_read`` by the
+delivery pipeline and the inbox views, and the current value is cached so a
+polling client's unread badge is a cache hit or a primary-key lookup. The
+cached values are dropped when the change commits, so a reader in between
+can't cache the old count again.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+from .models import Notification, UnreadCounter
+
+CACHE_TIMEOUT = 300
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    key = cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = UnreadCounter.objects.filter(user_id=user_id).values_list('count', flat=True).first() or 0
+        cache.set(key, count, CACHE_TIMEOUT)
+    return count
+
+
+def _invalidate(user_ids):
+    keys = [cache_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys), robust=True)
+
+
+def adjust_unread(deltas):
+    """Apply ``{user_id: delta}`` to the counters, one UPDATE per distinct delta."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=user_id) for user_id in deltas], ignore_conflicts=True,
+    )
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        UnreadCounter.objects.filter(user_id__in=user_ids).update(
+            count=Greatest(F('count') + Value(delta), Value(0)),
+        )
+    _invalidate(deltas)
+
+
+def recompute_unread(user_ids):
+    """Recount from the ``Notification`` table for ``user_ids``."""
+    user_ids = list(user_ids)
+    actual = dict(
+        Notification.objects.filter(recipient_id__in=user_ids, is_read=False)
+        .order_by()
+        .values_list('recipient_id')
+        .annotate(n=Count('*'))
+    )
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=user_id, count=actual.get(user_id, 0)) for user_id in user_ids],
+        update_conflicts=True, unique_fields=['user'], update_fields=['count'],
+    )
+    _invalidate(user_ids)
@@ -0,0 +1,14 @@
+from django.urls import path
+from .views import (
+    NotificationListView,
+    unread_notifications_count,
+    mark_notification_read,
+    mark_all_notifications_read,
+)
+
+urlpatterns = [
+    path('', NotificationListView.as_view(), name='notification-list'),
+    path('unread-count/', unread_notifications_count, name='notification-unread-count'),
+    path('mark-all-read/', mark_all_notifications_read, name='notification-mark-all-read'),
+    path('<int:pk>/read/', mark_notification_read, name='notification-read'),
+]
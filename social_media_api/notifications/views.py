@@ -1,3 +1,55 @@
-from django.shortcuts import render
+from django.db import transaction
+from rest_framework import generics, permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
 
-# Create your views here.
+from social_media_api.pagination import KeysetPagination
+from social_media_api.query_planner import plan_queryset
+from .models import Notification
+from .serializers import NotificationSerializer
+from .unread import adjust_unread, unread_count
+
+
+class InboxPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+
+
+class NotificationListView(generics.ListAPIView):
+    """The authenticated user's notifications, newest first. ``?unread=1`` filters."""
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = InboxPagination
+
+    def get_queryset(self):
+        queryset = Notification.objects.filter(recipient=self.request.user)
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            queryset = queryset.filter(is_read=False)
+        return plan_queryset(queryset, self.get_serializer())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def unread_notifications_count(request):
+    return Response({'unread': unread_count(request.user.pk)})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_notification_read(request, pk):
+    with transaction.atomic():
+        updated = Notification.objects.filter(pk=pk, recipient=request.user, is_read=False).update(is_read=True)
+        adjust_unread({request.user.pk: -updated})
+    if not updated and not Notification.objects.filter(pk=pk, recipient=request.user).exists():
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'unread': unread_count(request.user.pk)})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_all_notifications_read(request):
+    # a single UPDATE over the (recipient, is_read) index; the counter drops by
+    # what it marked, so a notification delivered meanwhile stays counted
+    with transaction.atomic():
+        updated = Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        adjust_unread({request.user.pk: -updated})
+    return Response({'marked_read': updated, 'unread': unread_count(request.user.pk)})
@@ -1,6 +1,40 @@
 from django.apps import AppConfig
+from django.db.models import Q
+from django.utils import timezone
+
+
+def hot_queries():
+    """The busiest query shapes, checked by ``manage.py check_query_plans``."""
+    from .models import Comment, Like, Post, TimelineEntry, TrendingScore
+
+    now = timezone.now()
+    return {
+        'posts.recent': Post.objects.order_by('-created_at', '-id')[:20],
+        'posts.recent_next_page': Post.objects.filter(
+            Q(created_at__lt=now) | Q(created_at=now, id__lt=100),
+        ).order_by('-created_at', '-id')[:20],
+        'posts.by_author': Post.objects.filter(author_id=1).order_by('-created_at', '-id')[:20],
+        'posts.updated_since': Post.objects.filter(updated_at__gte=now).order_by('updated_at', 'id')[:2000],
+        'comments.for_post': Comment.objects.filter(post_id=1).order_by('created_at', 'id')[:20],
+        'likes.liked_by_user': Like.objects.filter(user_id=1, post_id__in=[1, 2, 3]).values_list('post_id'),
+        'timeline.read': TimelineEntry.objects.filter(owner_id=1).order_by('-created_at', '-post_id')[:20],
+        'trending.reload': TrendingScore.objects.filter(window='day', score__gt=0).order_by('-score')[:5000],
+    }
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from labtools import query_plans
+        from social_media_api import response_cache
+        from . import search  # noqa: F401 connects the index signals
+        from . import trending  # noqa: F401 connects the scoring signals
+        from .models import Comment, Like, Post
+
+        response_cache.register(Post)
+        # comments and likes are embedded in (or counted on) their post's payload
+        response_cache.register(Comment, parents=lambda comment: [(Post, comment.post_id)])
+        response_cache.register(Like, parents=lambda like: [(Post, like.post_id)])
+        query_plans.register(hot_queries)
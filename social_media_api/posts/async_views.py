@@ -0,0 +1,88 @@
+"""
+Async variants of the feed and post endpoints, mounted under ``/api/async/``.
+
+Payloads, pagination, sparse fieldsets and rate limits match the DRF views in
+posts/views.py; what differs is that a request waiting on the database does
+not hold a worker thread. Lookups that don't depend on each other are awaited
+together with ``asyncio.gather``: a post and whether the reader liked it, a
+feed page's posts and their like state, a post list page's comment previews
+and like state.
+
+Django's async ORM still runs each query through ``sync_to_async`` in the
+request's own thread, so the gathered lookups of *one* request reach the
+database back to back for now; the concurrency gained is across requests. The
+response cache in front of ``PostViewSet`` is not used here.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db.models import aprefetch_related_objects
+from django.shortcuts import aget_object_or_404
+from rest_framework.response import Response
+
+from social_media_api.async_api import async_api_view
+from social_media_api.pagination import CreatedAtKeysetPagination, TimelinePagination
+from social_media_api.query_planner import plan_queryset
+from social_media_api.writer import write
+from . import likes, timeline
+from .models import Post
+from .serializers import PostSerializer
+from .views import _like_and_notify
+
+liked_post_ids = sync_to_async(likes.liked_post_ids)
+
+
+def _planned_posts(context, many=True):
+    return plan_queryset(Post.objects.all(), PostSerializer(many=many, context=context))
+
+
+@async_api_view()
+async def feed(request):
+    paginator = TimelinePagination()
+    entries = await sync_to_async(paginator.paginate_entries)(
+        lambda limit, before: timeline.read_timeline(request.user, limit, before),
+        request,
+        Post,
+    )
+    post_ids = [post_id for _, post_id, _ in entries]
+    context = {'request': request}
+    posts, context['liked_post_ids'] = await asyncio.gather(
+        _planned_posts(context).ain_bulk(post_ids),
+        liked_post_ids(request.user, post_ids),
+    )
+    serializer = PostSerializer([posts[pk] for pk in post_ids if pk in posts], many=True, context=context)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@async_api_view()
+async def post_list(request):
+    context = {'request': request}
+    queryset = _planned_posts(context)
+    # the page is needed first; its prefetches and like state are independent
+    prefetches = queryset._prefetch_related_lookups
+    paginator = CreatedAtKeysetPagination()
+    posts = await paginator.apaginate_queryset(queryset.prefetch_related(None), request)
+    _, context['liked_post_ids'] = await asyncio.gather(
+        aprefetch_related_objects(posts, *prefetches),
+        liked_post_ids(request.user, [post.pk for post in posts]),
+    )
+    return paginator.get_paginated_response(PostSerializer(posts, many=True, context=context).data)
+
+
+@async_api_view()
+async def post_detail(request, pk):
+    context = {'request': request}
+    post, context['liked_post_ids'] = await asyncio.gather(
+        aget_object_or_404(_planned_posts(context, many=False), pk=pk),
+        liked_post_ids(request.user, [pk]),
+    )
+    return Response(PostSerializer(post, context=context).data)
+
+
+@async_api_view(throttle_scope='like')
+async def like_post(request, pk):
+    post = await aget_object_or_404(Post, pk=pk)
+    # idempotent: repeating the request is a no-op that still reports success
+    if await sync_to_async(write)(_like_and_notify, request.user, post):
+        return Response({'detail': 'Post liked', 'liked': True})
+    return Response({'detail': 'Already liked', 'liked': True})
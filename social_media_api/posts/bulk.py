@@ -0,0 +1,142 @@
+"""
+Bulk creation of posts and comments for importers.
+
+Items are validated one by one with the regular serializers in list mode and
+written with ``bulk_create`` in chunks, all inside one transaction. Invalid
+items are reported by index and skipped; the valid ones are still created.
+Foreign keys given by primary key (a comment's ``post``) are looked up with one
+``in_bulk`` per chunk instead of one query per item.
+
+``bulk_create`` sends no ``post_save``, so everything the single-item paths
+get from signals or ``perform_create`` is done here once per chunk: counters,
+timeline fan-out, the search index and response-cache stamps. Imported
+comments do not notify the post author.
+
+Settings (all optional):
+
+    BULK_CREATE = {
+        'CHUNK_SIZE': 500,     # rows per INSERT
+        'MAX_ITEMS': 10000,    # items accepted per request
+        'MAX_BYTES': 16 * 1024 * 1024,  # request body size
+    }
+"""
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from social_media_api import response_cache
+from social_media_api.counters import adjust_counters, adjust_counters_many
+from social_media_api.parsers import NDJSONParser
+from . import search, timeline, trending
+from .models import Comment, Post
+from .serializers import CommentSerializer, PostSerializer
+
+DEFAULTS = {
+    'CHUNK_SIZE': 500,
+    'MAX_ITEMS': 10000,
+    'MAX_BYTES': 16 * 1024 * 1024,
+}
+
+BulkResult = namedtuple('BulkResult', 'ids errors')
+
+
+def bulk_settings():
+    return {**DEFAULTS, **getattr(settings, 'BULK_CREATE', {})}
+
+
+class BulkNDJSONParser(NDJSONParser):
+    """Stops reading an NDJSON body past ``MAX_ITEMS`` items or ``MAX_BYTES``."""
+
+    def get_limits(self, parser_context):
+        config = bulk_settings()
+        return config['MAX_ITEMS'], config['MAX_BYTES']
+
+
+def _resolve_related(serializer, chunk):
+    """Points the writable primary-key fields of ``serializer`` at the chunk's rows.
+
+    ``PrimaryKeyRelatedField`` runs one SELECT per item; this fetches every
+    row the chunk refers to with one ``in_bulk`` and resolves the items from
+    it, failing with the field's own errors.
+    """
+    for field in serializer.fields.values():
+        if not isinstance(field, PrimaryKeyRelatedField) or field.read_only or field.pk_field:
+            continue
+        to_python = field.get_queryset().model._meta.pk.to_python
+        pks = {}
+        for item in chunk:
+            value = item.get(field.field_name) if isinstance(item, dict) else None
+            if isinstance(value, (int, str)) and not isinstance(value, bool):
+                try:
+                    pks[value] = to_python(value)
+                except DjangoValidationError:
+                    pass
+        rows = field.get_queryset().in_bulk(set(pks.values()))
+
+        def to_internal_value(data, field=field, pks=pks, rows=rows):
+            # pks holds every well-formed key of the chunk
+            if isinstance(data, bool) or not isinstance(data, (int, str)) or data not in pks:
+                field.fail('incorrect_type', data_type=type(data).__name__)
+            if pks[data] not in rows:
+                field.fail('does_not_exist', pk_value=data)
+            return rows[pks[data]]
+
+        field.to_internal_value = to_internal_value
+
+
+def _bulk_create(model, serializer_class, items, author, context, after_insert):
+    chunk_size = bulk_settings()['CHUNK_SIZE']
+    child = serializer_class(many=True, context=context).child
+    ids, errors = [], []
+    with transaction.atomic():
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            _resolve_related(child, chunk)
+            objs = []
+            for index, item in enumerate(chunk, start):
+                try:
+                    attrs = child.run_validation(item)
+                except ValidationError as exc:
+                    errors.append({'index': index, 'errors': exc.detail})
+                    continue
+                objs.append(model(author=author, **attrs))
+            if objs:
+                model.objects.bulk_create(objs)
+                after_insert(objs)
+                ids.extend(obj.pk for obj in objs)
+    return BulkResult(ids, errors)
+
+
+def _posts_inserted(posts):
+    adjust_counters(get_user_model(), posts[0].author_id, posts_count=len(posts))
+    timeline.fan_out_posts(posts)
+    search.index_posts(posts)
+    response_cache.bump(Post)
+
+
+def _comments_inserted(comments):
+    # one UPDATE per distinct increment rather than one per post
+    by_increment = {}
+    for post_id, count in Counter(comment.post_id for comment in comments).items():
+        by_increment.setdefault(count, []).append(post_id)
+    for count, post_ids in by_increment.items():
+        adjust_counters_many(Post, post_ids, comments_count=count)
+    search.index_comments(comments)
+    # bulk_create sends no post_save for the trending signals
+    trending.record_comments(comments)
+    response_cache.bump(Comment)
+
+
+def bulk_create_posts(author, items, context=None):
+    """Create a post by ``author`` for every valid item; returns a ``BulkResult``."""
+    return _bulk_create(Post, PostSerializer, items, author, context or {}, _posts_inserted)
+
+
+def bulk_create_comments(author, items, context=None):
+    """Create a comment by ``author`` for every valid item; returns a ``BulkResult``."""
+    return _bulk_create(Comment, CommentSerializer, items, author, context or {}, _comments_inserted)
@@ -0,0 +1,95 @@
+"""
+Like writes and "liked by me" lookups.
+
+``like``/``unlike`` are idempotent: the ``(user, post)`` unique constraint
+decides which of several concurrent requests actually inserts, so counters
+and notifications fire exactly once however often a client retries.
+
+``liked_post_ids`` answers likedness for a whole page of posts with a single
+``post_id IN (...)`` query. With ``LIKES_CACHE_TIMEOUT`` set, the answer for
+each page is cached under a per-user version stamp, so an entry is as small as
+the page however many posts the user has liked, and a like or unlike retires
+all of the user's entries by replacing the stamp.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from social_media_api.counters import adjust_counters
+from .models import Like, Post
+
+
+def _cache_timeout():
+    return getattr(settings, 'LIKES_CACHE_TIMEOUT', None)
+
+
+def _version_key(user_id):
+    return f'posts:liked:v:{user_id}'
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = uuid.uuid4().hex
+        # add() so a concurrent first reader doesn't overwrite a fresh bump
+        if not cache.add(key, stamp, None):
+            stamp = cache.get(key, stamp)
+    return stamp
+
+
+def _page_key(user_id, post_ids):
+    digest = hashlib.md5(','.join(map(str, sorted(post_ids))).encode()).hexdigest()
+    return f'posts:liked:{user_id}:{_version(user_id)}:{digest}'
+
+
+def _invalidate(user_id):
+    # after the commit (the writer commits a whole batch at once), or a reader
+    # in between would cache the old answer under the new stamp
+    transaction.on_commit(lambda: cache.set(_version_key(user_id), uuid.uuid4().hex, None), robust=True)
+
+
+def like(user, post):
+    """Like ``post``; returns False if ``user`` already liked it."""
+    try:
+        with transaction.atomic():
+            Like.objects.create(user=user, post=post)
+            adjust_counters(Post, post.pk, likes_count=1)
+    except IntegrityError:
+        return False
+    _invalidate(user.pk)
+    return True
+
+
+def unlike(user, post):
+    """Remove the like; returns False if there was none."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post=post).delete()
+        adjust_counters(Post, post.pk, likes_count=-deleted)
+    if deleted:
+        _invalidate(user.pk)
+    return bool(deleted)
+
+
+def liked_post_ids(user, post_ids):
+    """The subset of ``post_ids`` that ``user`` has liked."""
+    post_ids = set(post_ids)
+    if not post_ids or not user.is_authenticated:
+        return set()
+
+    timeout = _cache_timeout()
+    if not timeout:
+        return _query(user, post_ids)
+    key = _page_key(user.pk, post_ids)
+    liked = cache.get(key)
+    if liked is None:
+        liked = _query(user, post_ids)
+        cache.set(key, liked, timeout)
+    return set(liked)
+
+
+def _query(user, post_ids):
+    return set(Like.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', flat=True))
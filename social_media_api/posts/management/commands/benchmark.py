@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from accounts.hashers import COST_OPTIONS, hashers_preferring
+from notifications.pipeline import get_dispatcher
+from social_media_api import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Generate a synthetic dataset and measure endpoint latency, throughput and query counts, "
+            "writing a JSON report that can be diffed across commits.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(benchmark.SCENARIOS),
+                            help="Scenario to run; repeat for several (default: all).")
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Client threads sending requests at once (needs --current-db above 1).")
+        parser.add_argument('--interface', choices=benchmark.INTERFACES, default='wsgi',
+                            help="Send requests through the WSGI handler from threads, or through the ASGI "
+                                 "handler from coroutines on one event loop.")
+        parser.add_argument('--hasher', choices=sorted(COST_OPTIONS),
+                            help="Password hashing algorithm for new hashes (default: the configured one).")
+        parser.add_argument('--hash-cost', type=int,
+                            help="Cost of that algorithm: PBKDF2 iterations, argon2 time cost or bcrypt rounds.")
+        parser.add_argument('--output', default='benchmark.json', help="Where to write the JSON report.")
+        parser.add_argument('--current-db', action='store_true',
+                            help="Use the configured database instead of a throwaway test database.")
+        parser.add_argument('--generate', action='store_true',
+                            help="With --current-db, generate data first (always done on a test database).")
+
+        dataset = parser.add_argument_group('dataset')
+        dataset.add_argument('--users', type=int)
+        dataset.add_argument('--avg-following', type=int, help="Mean follows per user (exponentially distributed).")
+        dataset.add_argument('--distribution', choices=['zipf', 'uniform'],
+                             help="How follows and likes spread over users.")
+        dataset.add_argument('--zipf-exponent', type=float)
+        dataset.add_argument('--posts-per-user', type=int)
+        dataset.add_argument('--comments-per-post', type=int)
+        dataset.add_argument('--likes-per-post', type=int)
+        dataset.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        if options['concurrency'] > 1 and not options['current_db']:
+            # other threads cannot see the in-memory test database's data
+            raise CommandError("--concurrency above 1 needs --current-db.")
+        dataset_options = {
+            name: options[name] for name in benchmark.DATASET_DEFAULTS if name in options
+        }
+        runner = old_config = None
+        # a few generated users send every request, so rate limits would turn
+        # the measurement into one of 429s
+        overrides = {'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}}
+        if options['hasher']:
+            try:
+                overrides['PASSWORD_HASHERS'] = hashers_preferring(options['hasher'])
+            except ValueError as exc:
+                raise CommandError(exc)
+        if options['hash_cost'] is not None:
+            algorithm = options['hasher'] or get_hasher().algorithm
+            configured = getattr(settings, 'PASSWORD_HASHING', {})
+            overrides['PASSWORD_HASHING'] = {
+                **configured,
+                algorithm: {**configured.get(algorithm, {}), COST_OPTIONS[algorithm]: options['hash_cost']},
+            }
+        scenarios = options['scenario'] or list(benchmark.SCENARIOS)
+        hashing = None
+        if not options['current_db']:
+            setup_test_environment()
+            runner = DiscoverRunner(verbosity=0, interactive=False)
+            old_config = runner.setup_databases()
+            # worker threads would contend for SQLite's shared in-memory test
+            # database, so deliver notifications inside the request instead
+            overrides['NOTIFICATIONS'] = {**getattr(settings, 'NOTIFICATIONS', {}), 'WORKERS': 0}
+        overrides = override_settings(**overrides)
+        overrides.enable()
+        try:
+            dataset = None
+            if runner or options['generate']:
+                self.stdout.write("Generating data...")
+                dataset = benchmark.generate(stdout=self.stdout, **dataset_options)
+            try:
+                if set(scenarios) & set(benchmark.HASHING_SCENARIOS):
+                    hashing = {'hasher': get_hasher().algorithm,
+                               'hashes_per_sec': benchmark.hash_rate(options['concurrency'])}
+                    self.stdout.write(f"{hashing['hasher']}: {hashing['hashes_per_sec']:.1f} hashes/s "
+                                      f"with {options['concurrency']} thread(s)")
+                results = {}
+                for name in scenarios:
+                    results[name] = benchmark.run(
+                        [name], options['requests'], options['warmup'], options['seed'], options['concurrency'],
+                        options['interface'],
+                    )[name]
+                    queries = results[name]['queries_mean']
+                    self.stdout.write(
+                        f"{name:12} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                        f"p99 {results[name]['p99_ms']:8.2f} ms  {results[name]['throughput_rps']:8.1f} req/s  "
+                        + (f"{queries:5.1f} queries" if queries is not None else "")
+                    )
+            except ValueError as exc:
+                raise CommandError(exc)
+            finally:
+                get_dispatcher().join()
+        finally:
+            overrides.disable()
+            if runner:
+                runner.teardown_databases(old_config)
+                teardown_test_environment()
+
+        data = benchmark.report(results, dataset, requests=options['requests'], warmup=options['warmup'],
+                                concurrency=options['concurrency'], interface=options['interface'],
+                                seed=options['seed'], hash_cost=options['hash_cost'], hashing=hashing,
+                                test_database=runner is not None)
+        benchmark.write_report(data, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from social_media_api import benchmark
+
+# sync (DRF) scenario -> its async counterpart
+PAIRS = {
+    'feed': 'async_feed',
+    'post_list': 'async_post_list',
+    'post_detail': 'async_post_detail',
+    'like': 'async_like',
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare the DRF views served over WSGI by client threads with their async variants served "
+            "over ASGI by coroutines on one event loop, against a fresh database file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(PAIRS),
+                            help="Scenario to compare; repeat for several (default: all).")
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help="Client threads (WSGI) or coroutines (ASGI) per scenario.")
+        parser.add_argument('--requests', type=int, default=400, help="Measured requests per scenario.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark-asgi.json', help="Where to write the comparison.")
+
+    def run_manage(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), *args],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"manage.py {args[0]} failed:\n{result.stderr}")
+
+    def handle(self, *args, **options):
+        names = options['scenario'] or list(PAIRS)
+        runs = {
+            'wsgi': names,
+            'asgi': [PAIRS[name] for name in names],
+        }
+        reports = {}
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                'DJANGO_DB_PATH': os.path.join(directory, 'db.sqlite3'),
+                'DJANGO_DB_REPLICAS': '',
+                # each ASGI request's sync work runs in a thread of its own, so
+                # persistent connections would never be reused
+                'DJANGO_CONN_MAX_AGE': '0',
+            }
+            self.run_manage(env, 'migrate', '--verbosity', '0')
+            generate = ['--generate', '--users', str(options['users'])]
+            for interface, scenarios in runs.items():
+                self.stdout.write(f"{interface}...")
+                output = os.path.join(directory, f'{interface}.json')
+                self.run_manage(
+                    env, 'benchmark', '--current-db', *generate, '--interface', interface,
+                    '--seed', str(options['seed']), '--concurrency', str(options['concurrency']),
+                    '--requests', str(options['requests']), '--output', output,
+                    *[arg for name in scenarios for arg in ('--scenario', name)],
+                )
+                # both interfaces read the same data
+                generate = []
+                with open(output, encoding='utf-8') as report:
+                    reports[interface] = json.load(report)
+
+        for name in names:
+            wsgi = reports['wsgi']['scenarios'][name]
+            asgi = reports['asgi']['scenarios'][PAIRS[name]]
+            self.stdout.write(
+                f"{name:12} {wsgi['throughput_rps']:8.1f} -> {asgi['throughput_rps']:8.1f} req/s  "
+                f"p99 {wsgi['p99_ms']:8.2f} -> {asgi['p99_ms']:8.2f} ms"
+            )
+        benchmark.write_report(
+            {'concurrency': options['concurrency'], 'requests': options['requests'], **reports},
+            options['output'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Comparison written to {options['output']}."))
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.hashers import COST_OPTIONS
+from social_media_api import benchmark
+
+# small: the login scenarios only need users, and hashing dominates anyway
+DATASET = ['--users', '50', '--avg-following', '5', '--posts-per-user', '1',
+           '--comments-per-post', '0', '--likes-per-post', '0']
+
+
+class Command(BaseCommand):
+    help = ("Measure password hashes per second and login/registration throughput and p99 for each hasher, "
+            "cost and worker count, against a fresh database file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasher', action='append', choices=sorted(COST_OPTIONS),
+                            help="Algorithm to measure; repeat for several (default: the configured one).")
+        parser.add_argument('--hash-cost', action='append', type=int,
+                            help="PBKDF2 iterations, argon2 time cost or bcrypt rounds; repeat for several "
+                                 "(default: the configured cost).")
+        parser.add_argument('--workers', action='append', type=int,
+                            help="Concurrent client threads; repeat for several (default: 1, 2, 4 and 8).")
+        parser.add_argument('--requests', type=int, default=50, help="Measured requests per scenario.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark-login.json', help="Where to write the comparison.")
+
+    def run_manage(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), *args],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"manage.py {args[0]} failed:\n{result.stderr}")
+
+    def handle(self, *args, **options):
+        hashers = options['hasher'] or [get_hasher().algorithm]
+        costs = options['hash_cost'] or [None]
+        workers = options['workers'] or [1, 2, 4, 8]
+        if min(workers) < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        runs = []
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'DJANGO_DB_PATH': os.path.join(directory, 'db.sqlite3'), 'DJANGO_DB_REPLICAS': ''}
+            self.run_manage(env, 'migrate', '--verbosity', '0')
+            generate = ['--generate', *DATASET]
+            for hasher in hashers:
+                for cost in costs:
+                    for count in workers:
+                        output = os.path.join(directory, 'run.json')
+                        self.run_manage(
+                            env, 'benchmark', '--current-db', *generate, '--hasher', hasher,
+                            *(['--hash-cost', str(cost)] if cost is not None else []),
+                            '--scenario', 'login', '--scenario', 'register', '--concurrency', str(count),
+                            '--requests', str(options['requests']), '--warmup', str(count),
+                            '--seed', str(options['seed']), '--output', output,
+                        )
+                        generate = []
+                        with open(output, encoding='utf-8') as report:
+                            data = json.load(report)
+                        run = {
+                            'hasher': hasher,
+                            'hash_cost': cost,
+                            'workers': count,
+                            'hashes_per_sec': data['meta']['hashing']['hashes_per_sec'],
+                            **{name: data['scenarios'][name] for name in benchmark.HASHING_SCENARIOS},
+                        }
+                        runs.append(run)
+                        self.stdout.write(
+                            f"{hasher:14} cost {cost or 'default':>8} workers {count:3}  "
+                            f"{run['hashes_per_sec']:8.1f} hashes/s  "
+                            f"login {run['login']['throughput_rps']:7.1f} req/s p99 {run['login']['p99_ms']:8.1f} ms  "
+                            f"register {run['register']['throughput_rps']:7.1f} req/s "
+                            f"p99 {run['register']['p99_ms']:8.1f} ms"
+                        )
+
+        benchmark.write_report({'requests': options['requests'], 'runs': runs}, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Comparison written to {options['output']}."))
@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from social_media_api import benchmark
+
+MODES = {
+    # rollback journal, a sync per commit, no busy wait, one writer per request
+    'baseline': '0',
+    # WAL, synchronous=NORMAL, busy_timeout, BEGIN IMMEDIATE, serialized writer
+    'tuned': '1',
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare write throughput with and without the SQLite tuning (DJANGO_SQLITE_TUNING), "
+            "running the benchmark with concurrent clients against a fresh database file per mode.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(benchmark.SCENARIOS),
+                            help="Scenario to run; repeat for several (default: like, unlike, follow, unfollow, feed).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Client threads per scenario.")
+        parser.add_argument('--requests', type=int, default=400, help="Measured requests per scenario.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark-sqlite.json', help="Where to write the comparison.")
+
+    def run_manage(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), *args],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"manage.py {args[0]} failed:\n{result.stderr}")
+
+    def handle(self, *args, **options):
+        scenarios = options['scenario'] or ['like', 'unlike', 'follow', 'unfollow', 'feed']
+        reports = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, tuning in MODES.items():
+                self.stdout.write(f"{mode}...")
+                env = {
+                    **os.environ,
+                    'DJANGO_DB_PATH': os.path.join(directory, f'{mode}.sqlite3'),
+                    'DJANGO_SQLITE_TUNING': tuning,
+                    'DJANGO_DB_REPLICAS': '',
+                }
+                output = os.path.join(directory, f'{mode}.json')
+                self.run_manage(env, 'migrate', '--verbosity', '0')
+                self.run_manage(
+                    env, 'benchmark', '--current-db', '--generate',
+                    '--users', str(options['users']), '--seed', str(options['seed']),
+                    '--concurrency', str(options['concurrency']), '--requests', str(options['requests']),
+                    '--output', output, *[arg for name in scenarios for arg in ('--scenario', name)],
+                )
+                with open(output, encoding='utf-8') as report:
+                    reports[mode] = json.load(report)
+
+        for name in scenarios:
+            baseline, tuned = (reports[mode]['scenarios'][name] for mode in MODES)
+            self.stdout.write(
+                f"{name:10} {baseline['throughput_rps']:8.1f} -> {tuned['throughput_rps']:8.1f} req/s  "
+                f"p99 {baseline['p99_ms']:8.2f} -> {tuned['p99_ms']:8.2f} ms  "
+                f"errors {self.errors(baseline)} -> {self.errors(tuned)}"
+            )
+        benchmark.write_report(
+            {'concurrency': options['concurrency'], 'requests': options['requests'], **reports},
+            options['output'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Comparison written to {options['output']}."))
+
+    @staticmethod
+    def errors(result):
+        return sum(count for status, count in result['statuses'].items() if status.startswith('5'))
@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from social_media_api.renderers import CSVRenderer, NDJSONRenderer
+
+RENDERERS = {'ndjson': NDJSONRenderer, 'csv': CSVRenderer}
+
+
+class Command(BaseCommand):
+    help = "Stream posts, comments, likes or follows as NDJSON or CSV, optionally only rows since a watermark."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.datasets()))
+        parser.add_argument('--format', choices=sorted(RENDERERS), default='ndjson')
+        parser.add_argument('--output', help="File to write (default stdout).")
+        parser.add_argument('--since', help="Only rows at or after this watermark (updated_at, created_at or id).")
+        parser.add_argument('--state', help="JSON file holding the last watermark per dataset; read as --since "
+                                            "when present and updated after a successful export.")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE,
+                            help="Rows fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        name = options['dataset']
+        dataset = export.datasets()[name]
+        state_path = Path(options['state']) if options['state'] else None
+        state = json.loads(state_path.read_text()) if state_path and state_path.exists() else {}
+
+        since = options['since'] or state.get(name)
+        if since is not None:
+            try:
+                since = export.parse_watermark(dataset, str(since))
+            except ValueError:
+                raise CommandError(f"--since must be a {dataset.watermark} value.")
+
+        last = {}
+
+        def tracked(rows):
+            for row in rows:
+                last['row'] = row
+                yield row
+
+        rows = tracked(export.rows(dataset, since, options['chunk_size']))
+        chunks = RENDERERS[options['format']]().stream(rows, dataset.fields)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+
+        if 'row' in last:
+            watermark = last['row'][dataset.watermark]
+            watermark = watermark.isoformat() if hasattr(watermark, 'isoformat') else watermark
+            if state_path:
+                state[name] = watermark
+                state_path.write_text(json.dumps(state, indent=2))
+            self.stderr.write(f"Exported {name} up to watermark {watermark}.")
+        else:
+            self.stderr.write(f"No {name} rows to export.")
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from the follow graph and existing posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild the timeline of this user id (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Users fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        backend = timeline.get_backend()
+        rebuilt = entries = 0
+        for user in users.only('id').iterator(chunk_size=options['chunk_size']):
+            entries += timeline.rebuild_timeline(user)
+            backend.trim(user.pk)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines ({entries} entries)."))
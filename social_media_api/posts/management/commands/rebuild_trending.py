@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ("Recompute trending scores from the likes and comments of the longest window, "
+            "e.g. after bulk loads that bypassed the signals.")
+
+    def handle(self, *args, **options):
+        rows = trending.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt trending scores ({rows} rows across {', '.join(trending.windows())})."
+        ))
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Like, Post
+from social_media_api import response_cache
+from social_media_api.counters import count_subquery
+
+User = get_user_model()
+Follow = User.followers.through
+
+
+def counter_specs():
+    """(model, {counter field: expression computing its true value})"""
+    return [
+        (Post, {
+            'likes_count': count_subquery(Like, 'post'),
+            'comments_count': count_subquery(Comment, 'post'),
+        }),
+        (User, {
+            # a Follow row (from_customuser=A, to_customuser=B) means B follows A
+            'followers_count': count_subquery(Follow, 'from_customuser'),
+            'following_count': count_subquery(Follow, 'to_customuser'),
+            'posts_count': count_subquery(Post, 'author'),
+        }),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment/follow/post counters that have drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows recomputed per query.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drifted rows without fixing them.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, expressions in counter_specs():
+            fields = list(expressions)
+            annotations = {f'true_{field}': expr for field, expr in expressions.items()}
+            fixed = 0
+            last_pk = 0
+            while True:
+                # walk the primary key so each batch is an index range scan
+                batch = list(
+                    model._default_manager.filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .only('pk', *fields)
+                    .annotate(**annotations)[:batch_size]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                drifted = []
+                for obj in batch:
+                    changed = False
+                    for field in fields:
+                        true_value = getattr(obj, f'true_{field}')
+                        if getattr(obj, field) != true_value:
+                            setattr(obj, field, true_value)
+                            changed = True
+                    if changed:
+                        drifted.append(obj)
+                if drifted and not options['dry_run']:
+                    model._default_manager.bulk_update(drifted, fields)
+                    response_cache.bump(model, *(obj.pk for obj in drifted))
+                fixed += len(drifted)
+
+            verb = "drifted" if options['dry_run'] else "reconciled"
+            self.stdout.write(f"{model._meta.label}: {fixed} rows {verb}.")
+        self.stdout.write(self.style.SUCCESS("Counters checked."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from posts and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows indexed per batch (default SEARCH['BATCH_SIZE']).")
+        parser.add_argument('--type', choices=search.KINDS,
+                            help="Only reindex posts or comments.")
+        parser.add_argument('--clear', action='store_true',
+                            help="Empty the index first, dropping entries for deleted rows.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or search.search_settings()['BATCH_SIZE']
+        backend = search.get_backend()
+        if options['clear']:
+            backend.clear()
+
+        sources = [
+            (search.POST, Post.objects.only('id', 'author_id', 'created_at', 'title', 'content'),
+             search.post_document),
+            (search.COMMENT, Comment.objects.only('id', 'post_id', 'author_id', 'created_at', 'content'),
+             search.comment_document),
+        ]
+        for kind, queryset, to_document in sources:
+            if options['type'] and options['type'] != kind:
+                continue
+            indexed = 0
+            last_pk = 0
+            while True:
+                # walk the primary key so each batch is an index range scan
+                batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                backend.index(to_document(obj) for obj in batch)
+                indexed += len(batch)
+            self.stdout.write(f"{kind}: {indexed} documents indexed.")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
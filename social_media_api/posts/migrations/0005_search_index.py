@@ -0,0 +1,30 @@
+from django.db import migrations
+
+TABLE = 'posts_search_index'
+
+
+def create_index(apps, schema_editor):
+    # FTS5 is SQLite only; other databases use a different SEARCH backend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        f"post_id UNINDEXED, author_id UNINDEXED, created_at UNINDEXED, title, body, "
+        f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=16)),
+                ('score', models.FloatField()),
+                ('epoch', models.BigIntegerField()),
+                ('last_event_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', '-score'], name='trending_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('window', 'post'), name='unique_trending_score')],
+            },
+        ),
+    ]
@@ -9,9 +9,19 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # denormalized counters, see social_media_api/counters.py
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            # one author's posts, newest first (profile pages, timeline backfill)
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_recent_idx'),
+            # incremental exports, see posts/export.py
+            models.Index(fields=['updated_at', 'id'], name='post_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author}"
@@ -25,15 +35,67 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['created_at']
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_oldest_idx'),
+            # a post's comments in thread order
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_oldest_idx'),
+            models.Index(fields=['updated_at', 'id'], name='comment_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author} on {self.post_id}"
-    
-    class Like(models.Model):
-     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-     post = models.ForeignKey(Post, related_name='likes', on_delete=models.CASCADE)
-     created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Like(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='likes', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='like_created_idx'),
+        ]
+
+
+class TrendingScore(models.Model):
+    """A post's time-decayed engagement score in one trending window, see posts/trending.py."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    window = models.CharField(max_length=16)
+    # relative to ``epoch``: sum of weight * 2 ** ((event time - epoch) / half-life)
+    score = models.FloatField()
+    epoch = models.BigIntegerField()
+    last_event_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'post'], name='unique_trending_score'),
+        ]
+        indexes = [
+            models.Index(fields=['window', '-score'], name='trending_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} trending ({self.window})"
+
+
+class TimelineEntry(models.Model):
+    """A post materialized into one follower's home timeline (fan-out-on-write)."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # copied from the post so a feed page is a range scan over a single index
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-post']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of {self.owner_id}"
@@ -0,0 +1,352 @@
+"""
+Full-text search over posts and comments.
+
+Post titles/bodies and comment bodies are kept in an inverted index that is
+updated incrementally from ``post_save``/``post_delete``, so a query never
+scans the ``Post`` or ``Comment`` tables. Results are ranked with BM25
+(titles weigh more than bodies), and a term ending in ``*`` matches as a
+prefix (``pyth*``).
+
+Every document has an integer key, ``pk * 2 + kind``, which lets the index
+update and page through hits by key alone. Hits come back ordered by
+``(rank, key)``; lower ranks are better.
+
+Settings (all optional):
+
+    SEARCH = {
+        'BACKEND': 'posts.search.SQLiteSearchBackend',
+        'BATCH_SIZE': 1000,     # rows per batch while reindexing
+        'TITLE_WEIGHT': 2.0,    # relative to the body
+        'MAX_TERMS': 16,        # extra query terms are ignored
+    }
+
+``SQLiteSearchBackend`` uses the FTS5 table created by migration
+``posts.0005_search_index``; ``LocMemSearchBackend`` is a per-process index
+for other databases, tests and single-worker deployments.
+"""
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, namedtuple
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, router
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post
+
+DEFAULTS = {
+    'BACKEND': 'posts.search.SQLiteSearchBackend',
+    'BATCH_SIZE': 1000,
+    'TITLE_WEIGHT': 2.0,
+    'MAX_TERMS': 16,
+}
+
+POST = 'post'
+COMMENT = 'comment'
+KINDS = (POST, COMMENT)
+
+Document = namedtuple('Document', 'key post_id author_id created_at title body')
+Hit = namedtuple('Hit', 'key rank post_id author_id created_at snippet')
+
+TERM_RE = re.compile(r'\w+\*?')
+
+
+def search_settings():
+    return {**DEFAULTS, **getattr(settings, 'SEARCH', {})}
+
+
+def document_key(kind, pk):
+    return pk * 2 + KINDS.index(kind)
+
+
+def split_key(key):
+    """``(kind, pk)`` for a document key."""
+    return KINDS[key % 2], key // 2
+
+
+def timestamp(value):
+    """Fixed-width UTC string, so stored timestamps compare lexically."""
+    if value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc)
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+def fold(text):
+    """Case- and accent-insensitive form of ``text`` (like FTS5 ``remove_diacritics``)."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def parse_query(text):
+    """``[(term, is_prefix), ...]`` from free text; other characters are ignored."""
+    terms = []
+    for match in TERM_RE.findall(fold(text)):
+        term = (match.rstrip('*'), match.endswith('*'))
+        if term not in terms:
+            terms.append(term)
+    return terms[:search_settings()['MAX_TERMS']]
+
+
+class BaseSearchBackend:
+    def __init__(self, options):
+        self.title_weight = options['TITLE_WEIGHT']
+
+    def index(self, documents):
+        """Add or replace ``documents``."""
+        raise NotImplementedError
+
+    def remove(self, keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, terms, limit, after=None, kind=None, author_id=None, since=None, until=None):
+        """Up to ``limit`` hits matching every term, best first.
+
+        ``after`` is the ``(rank, key)`` of the last hit of the previous page;
+        ``since``/``until`` are ``timestamp()`` strings.
+        """
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 virtual table; the ``rowid`` is the document key."""
+    table = 'posts_search_index'
+
+    def _cursor(self, write=False):
+        alias = router.db_for_write(Post) if write else router.db_for_read(Post)
+        return connections[alias].cursor()
+
+    def index(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        with self._cursor(write=True) as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(d.key,) for d in documents])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, post_id, author_id, created_at, title, body) '
+                f'VALUES (%s, %s, %s, %s, %s, %s)',
+                [(d.key, d.post_id, d.author_id, timestamp(d.created_at), d.title, d.body) for d in documents],
+            )
+
+    def remove(self, keys):
+        with self._cursor(write=True) as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(key,) for key in keys])
+
+    def clear(self):
+        with self._cursor(write=True) as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    @staticmethod
+    def match_expression(terms):
+        # terms are \w+ so quoting them is enough to escape FTS5 syntax
+        return '{title body} : ' + ' '.join(f'"{term}"' + (' *' if prefix else '') for term, prefix in terms)
+
+    def search(self, terms, limit, after=None, kind=None, author_id=None, since=None, until=None):
+        rank = f'bm25({self.table}, 0, 0, 0, {float(self.title_weight)}, 1.0)'
+        where = [f'{self.table} MATCH %s']
+        params = [self.match_expression(terms)]
+        if kind is not None:
+            where.append('rowid % 2 = %s')
+            params.append(KINDS.index(kind))
+        if author_id is not None:
+            where.append('author_id = %s')
+            params.append(author_id)
+        if since is not None:
+            where.append('created_at >= %s')
+            params.append(since)
+        if until is not None:
+            where.append('created_at < %s')
+            params.append(until)
+        if after is not None:
+            where.append(f'({rank}, rowid) > (%s, %s)')
+            params.extend(after)
+        sql = (
+            f"SELECT rowid, {rank} AS score, post_id, author_id, created_at, "
+            f"snippet({self.table}, -1, '[', ']', '…', 16) "
+            f"FROM {self.table} WHERE {' AND '.join(where)} ORDER BY score, rowid LIMIT %s"
+        )
+        with self._cursor() as cursor:
+            cursor.execute(sql, [*params, limit])
+            return [Hit(*row) for row in cursor.fetchall()]
+
+
+class LocMemSearchBackend(BaseSearchBackend):
+    """Pure-Python inverted index with BM25 scoring, held in process memory."""
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = {}     # term -> {key: weighted term frequency}
+        self._documents = {}    # key -> (Document, weighted length)
+        self._terms = []        # sorted vocabulary, for prefix lookups
+        self._total_length = 0.0
+
+    def _frequencies(self, document):
+        frequencies = Counter()
+        for term in TERM_RE.findall(fold(document.title)):
+            frequencies[term.rstrip('*')] += self.title_weight
+        for term in TERM_RE.findall(fold(document.body)):
+            frequencies[term.rstrip('*')] += 1
+        return frequencies
+
+    def _remove(self, key):
+        entry = self._documents.pop(key, None)
+        if entry is None:
+            return
+        document, length = entry
+        self._total_length -= length
+        for term in self._frequencies(document):
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def index(self, documents):
+        with self._lock:
+            for document in documents:
+                self._remove(document.key)
+                frequencies = self._frequencies(document)
+                length = sum(frequencies.values())
+                self._documents[document.key] = (document._replace(created_at=timestamp(document.created_at)), length)
+                self._total_length += length
+                for term, frequency in frequencies.items():
+                    if term not in self._postings:
+                        self._postings[term] = {}
+                        bisect.insort(self._terms, term)
+                    self._postings[term][document.key] = frequency
+
+    def remove(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self._postings else []
+        start = bisect.bisect_left(self._terms, term)
+        end = bisect.bisect_left(self._terms, term + '\U0010ffff')
+        return self._terms[start:end]
+
+    def search(self, terms, limit, after=None, kind=None, author_id=None, since=None, until=None):
+        with self._lock:
+            count = len(self._documents)
+            if not count or not terms:
+                return []
+            average = self._total_length / count
+            scores = None
+            for term, prefix in terms:
+                term_scores = Counter()
+                for word in self._expand(term, prefix):
+                    postings = self._postings[word]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key, frequency in postings.items():
+                        norm = frequency + self.k1 * (1 - self.b + self.b * self._documents[key][1] / average)
+                        term_scores[key] += idf * frequency * (self.k1 + 1) / norm
+                # every term must match
+                scores = term_scores if scores is None else Counter(
+                    {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+                )
+                if not scores:
+                    return []
+
+            hits = []
+            for key, score in scores.items():
+                document = self._documents[key][0]
+                if kind is not None and split_key(key)[0] != kind:
+                    continue
+                if author_id is not None and document.author_id != author_id:
+                    continue
+                if since is not None and document.created_at < since:
+                    continue
+                if until is not None and document.created_at >= until:
+                    continue
+                if after is not None and (-score, key) <= tuple(after):
+                    continue
+                text = document.body or document.title
+                snippet = text if len(text) <= 120 else text[:120].rsplit(' ', 1)[0] + '…'
+                hits.append(Hit(key, -score, document.post_id, document.author_id, document.created_at, snippet))
+        hits.sort(key=lambda hit: (hit.rank, hit.key))
+        return hits[:limit]
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    options = search_settings()
+    return import_string(options['BACKEND'])(options)
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    if setting == 'SEARCH':
+        get_backend.cache_clear()
+
+
+# documents --------------------------------------------------------------
+
+def post_document(post):
+    return Document(document_key(POST, post.pk), post.pk, post.author_id, post.created_at, post.title, post.content)
+
+
+def comment_document(comment):
+    return Document(document_key(COMMENT, comment.pk), comment.post_id, comment.author_id,
+                    comment.created_at, '', comment.content)
+
+
+def index_posts(posts):
+    get_backend().index(post_document(post) for post in posts)
+
+
+def index_comments(comments):
+    get_backend().index(comment_document(comment) for comment in comments)
+
+
+def _text_changed(update_fields, *fields):
+    return not update_fields or bool(set(update_fields) & set(fields))
+
+
+@receiver(post_save, sender=Post, dispatch_uid='search:post_saved')
+def _post_saved(sender, instance, update_fields=None, **kwargs):
+    if _text_changed(update_fields, 'title', 'content'):
+        index_posts([instance])
+
+
+@receiver(post_save, sender=Comment, dispatch_uid='search:comment_saved')
+def _comment_saved(sender, instance, update_fields=None, **kwargs):
+    if _text_changed(update_fields, 'content'):
+        index_comments([instance])
+
+
+# a deleted post's comments are cascaded with their own post_delete signals
+@receiver(post_delete, sender=Post, dispatch_uid='search:post_deleted')
+@receiver(post_delete, sender=Comment, dispatch_uid='search:comment_deleted')
+def _document_deleted(sender, instance, **kwargs):
+    kind = POST if sender is Post else COMMENT
+    get_backend().remove([document_key(kind, instance.pk)])
+
+
+def search(text, limit, after=None, **filters):
+    """Ranked hits for free-text ``text``; see ``BaseSearchBackend.search``."""
+    terms = parse_query(text)
+    if not terms:
+        return []
+    return get_backend().search(terms, limit, after=after, **filters)
@@ -1,10 +1,15 @@
+from django.db import models
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Post, Comment
+from . import likes, search
 from django.contrib.auth import get_user_model
+from social_media_api.fieldsets import SparseFieldsetMixin
+from social_media_api.query_planner import plan_queryset
 
 User = get_user_model()
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
 
     class Meta:
@@ -19,21 +24,108 @@ class CommentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PostSerializer(serializers.ModelSerializer):
+class CommentPreviewField(serializers.Field):
+    """The first ``preview_size`` comments of a post, in ``CommentSerializer`` form.
+
+    Fetched for a whole page with one sliced prefetch, so a post with
+    thousands of comments costs the same as one with three.
+    """
+    preview_attr = 'comments_preview'
+
+    def __init__(self, preview_size, **kwargs):
+        self.preview_size = preview_size
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def preview_queryset(self):
+        comments = plan_queryset(Comment.objects.all(), CommentSerializer)
+        return comments.order_by('created_at', 'id')
+
+    def prefetch_lookups(self, prefix):
+        path = f'{prefix}__comments' if prefix else 'comments'
+        preview = self.preview_queryset()[:self.preview_size]
+        return [Prefetch(path, queryset=preview, to_attr=self.preview_attr)]
+
+    def to_representation(self, post):
+        preview = getattr(post, self.preview_attr, None)
+        if preview is None:
+            preview = self.preview_queryset().filter(post=post)[:self.preview_size]
+        return CommentSerializer(preview, many=True, context=self.context).data
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """Resolves ``liked_by_me`` for the whole page with one query."""
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        request = self.context.get('request')
+        # async views look it up alongside the page and pass it in
+        if request is not None and 'liked_post_ids' not in self.context:
+            self.context['liked_post_ids'] = likes.liked_post_ids(request.user, [post.pk for post in posts])
+        return super().to_representation(posts)
+
+
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    In lists ``comments`` holds only the first ``comment_preview_size``
+    comments (``comments_count`` has the total); ``?expand=comments`` embeds
+    them all. Supports ``?fields=`` (see social_media_api/fieldsets.py).
+    """
     author_username = serializers.ReadOnlyField(source='author.username')
     comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.IntegerField(source='comments.count', read_only=True)
+    liked_by_me = serializers.SerializerMethodField()
+    comment_preview_size = 3
 
     class Meta:
         model = Post
         fields = [
             'id', 'author', 'author_username', 'title', 'content',
-            'created_at', 'updated_at', 'comments', 'comments_count'
+            'created_at', 'updated_at', 'comments', 'comments_count', 'likes_count', 'liked_by_me'
+        ]
+        read_only_fields = [
+            'id', 'author', 'author_username', 'created_at', 'updated_at',
+            'comments', 'comments_count', 'likes_count'
         ]
-        read_only_fields = ['id', 'author', 'author_username', 'created_at', 'updated_at', 'comments', 'comments_count']
+        list_serializer_class = PostListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'comments' in fields and self.is_list_item and not self.is_expanded('comments'):
+            fields['comments'] = CommentPreviewField(preview_size=self.comment_preview_size)
+        return fields
+
+    def get_liked_by_me(self, obj):
+        liked = self.context.get('liked_post_ids')
+        if liked is None:
+            request = self.context.get('request')
+            if request is None:
+                return False
+            liked = likes.liked_post_ids(request.user, [obj.pk])
+        return obj.pk in liked
 
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             validated_data['author'] = request.user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+class SearchHitSerializer(serializers.Serializer):
+    """Serializes a ``posts.search.Hit``; ``score`` is higher for better matches."""
+    type = serializers.SerializerMethodField()
+    id = serializers.SerializerMethodField()
+    post = serializers.IntegerField(source='post_id')
+    author = serializers.IntegerField(source='author_id')
+    created_at = serializers.CharField()
+    score = serializers.SerializerMethodField()
+    snippet = serializers.CharField()
+
+    def get_type(self, hit):
+        return search.split_key(hit.key)[0]
+
+    def get_id(self, hit):
+        return search.split_key(hit.key)[1]
+
+    def get_score(self, hit):
+        return round(-hit.rank, 4)
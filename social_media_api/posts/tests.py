@@ -1,7 +1,33 @@
-from rest_framework.test import APITestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from io import BytesIO, StringIO
+from urllib.parse import quote
+from unittest import mock
+
+from rest_framework.authtoken.models import Token
+from social_media_api.testing import APITestCase, APITransactionTestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import Post
+from django.contrib.sessions.models import Session
+from notifications.models import NotificationOutbox
+from labtools import db_router, profiling, query_plans
+from social_media_api import benchmark, events, throttling, writer
+from social_media_api.parsers import RequestTooLarge
+from . import bulk, likes, search, timeline, trending
+from .models import Post, Comment, Like, TimelineEntry, TrendingScore
 
 User = get_user_model()
 
@@ -16,4 +42,1120 @@ class PostTests(APITestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 201)
         self.assertEqual(Post.objects.count(), 1)
-        self.assertEqual(Post.objects.first().author, self.user)
\ No newline at end of file
+        self.assertEqual(Post.objects.first().author, self.user)
+
+class FeedTimelineTests(APITestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.stranger = User.objects.create_user(username='stranger', password='pass')
+        self.reader.follow(self.author)
+        self.author.refresh_from_db()
+
+    def create_post(self, user, title):
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('post-list'), {'title': title, 'content': '...'})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def feed_ids(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']]
+
+    def test_new_posts_are_fanned_out_to_followers(self):
+        first = self.create_post(self.author, 'first')
+        self.create_post(self.stranger, 'unrelated')
+        second = self.create_post(self.author, 'second')
+        self.assertEqual(self.feed_ids(), [second, first])
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 2)
+
+    def test_deleted_post_leaves_timeline(self):
+        post_id = self.create_post(self.author, 'gone soon')
+        self.client.delete(reverse('post-detail', args=[post_id]))
+        self.assertEqual(self.feed_ids(), [])
+
+    @override_settings(TIMELINE={'FANOUT_THRESHOLD': 0})
+    def test_high_fanout_authors_are_pulled_at_read_time(self):
+        post_id = self.create_post(self.author, 'celebrity post')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_ids(), [post_id])
+
+    @override_settings(TIMELINE={'BACKEND': 'posts.timeline.LocMemTimelineBackend'})
+    def test_locmem_backend_and_follow_backfill(self):
+        post_id = self.create_post(self.stranger, 'before follow')
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/accounts/follow/{self.stranger.id}/')
+        self.assertEqual(self.feed_ids(), [post_id])
+        self.client.post(f'/api/accounts/unfollow/{self.stranger.id}/')
+        self.assertEqual(self.feed_ids(), [])
+
+    @override_settings(TIMELINE={'MAX_LENGTH': 3})
+    def test_timelines_stay_within_max_length(self):
+        post_ids = [self.create_post(self.author, f'p{i}') for i in range(6)]
+        self.assertEqual(self.feed_ids(), post_ids[:2:-1])
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 3)
+
+        # backfilling on follow is trimmed too
+        for i in range(4):
+            Post.objects.create(author=self.stranger, title=f's{i}', content='...')
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/accounts/follow/{self.stranger.id}/')
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 3)
+
+        # owners under the limit are only counted, not trimmed
+        backend = timeline.get_backend()
+        with CaptureQueriesContext(connection) as queries:
+            backend.trim_many([self.stranger.id])
+        self.assertFalse(any(query['sql'].startswith('DELETE') for query in queries))
+
+    def test_rebuild_command(self):
+        post = Post.objects.create(author=self.author, title='imported', content='...')
+        self.assertEqual(self.feed_ids(), [])
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_ids(), [post.id])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='pass')
+        self.client.force_authenticate(self.user)
+        self.posts = [Post.objects.create(author=self.user, title=f'p{i}', content='...') for i in range(5)]
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_pages_follow_created_at_ordering(self):
+        expected = [post.id for post in sorted(self.posts, key=lambda p: (p.created_at, p.id), reverse=True)]
+        self.assertEqual(self.walk(reverse('post-list') + '?page_size=2'), expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get(reverse('post-list') + '?page_size=2').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_feed_pages_through_timeline(self):
+        follower = User.objects.create_user(username='follower', password='pass')
+        self.user.followers.add(follower)
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.client.force_authenticate(follower)
+        self.assertEqual(len(self.walk('/api/feed/?page_size=2')), 5)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('post-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryCountTests(APITestCase):
+    """Listing cost must not grow with the number of rows on the page."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter', password='pass')
+        self.client.force_authenticate(self.user)
+        authors = [User.objects.create_user(username=f'author{i}', password='pass') for i in range(3)]
+        for i in range(12):
+            post = Post.objects.create(author=authors[i % 3], title=f'p{i}', content='...')
+            for author in authors:
+                Comment.objects.create(post=post, author=author, content='hi')
+            post.author.followers.add(self.user)
+        call_command('rebuild_timelines', stdout=StringIO())
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        small = self.count_queries(f'{url}?page_size=2')
+        large = self.count_queries(f'{url}?page_size=10')
+        self.assertEqual(small, large)
+
+    def test_post_list(self):
+        self.assertConstantQueries(reverse('post-list'))
+
+    def test_comment_list(self):
+        self.assertConstantQueries(reverse('comment-list'))
+
+    def test_feed(self):
+        self.assertConstantQueries('/api/feed/')
+
+    def test_user_list(self):
+        self.assertConstantQueries('/api/accounts/users/')
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='sparse', password='pass')
+        self.post = Post.objects.create(author=self.user, title='t', content='long body')
+        for i in range(5):
+            Comment.objects.create(post=self.post, author=self.user, content=f'c{i}')
+        call_command('reconcile_counters', stdout=StringIO())
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [query['sql'] for query in ctx.captured_queries]
+
+    def test_fields_trim_output_and_query(self):
+        data, queries = self.get(f"{reverse('post-list')}?fields=id,title")
+        self.assertEqual(data['results'], [{'id': self.post.id, 'title': 't'}])
+        post_query = next(sql for sql in queries if 'FROM "posts_post"' in sql)
+        self.assertNotIn('"content"', post_query)
+        self.assertFalse(any('FROM "posts_comment"' in sql for sql in queries))
+
+    def test_list_previews_comments_unless_expanded(self):
+        data, _ = self.get(reverse('post-list'))
+        post = data['results'][0]
+        self.assertEqual([c['content'] for c in post['comments']], ['c0', 'c1', 'c2'])
+        self.assertEqual(post['comments_count'], 5)
+
+        data, _ = self.get(f"{reverse('post-list')}?expand=comments")
+        self.assertEqual(len(data['results'][0]['comments']), 5)
+        data, _ = self.get(reverse('post-detail', args=[self.post.id]))
+        self.assertEqual(len(data['comments']), 5)
+
+    def test_comment_fields_and_writes_ignore_fieldsets(self):
+        data, _ = self.get(f"{reverse('comment-list')}?fields=id,content")
+        self.assertEqual(set(data['results'][0]), {'id', 'content'})
+        response = self.client.post(f"{reverse('post-list')}?fields=id", {'title': 'n', 'content': 'b'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['title'], 'n')
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.client.force_authenticate(self.alice)
+
+    def test_post_like_and_comment_counters(self):
+        post_id = self.client.post(reverse('post-list'), {'title': 't', 'content': 'c'}).data['id']
+        self.client.post(f'/api/posts/{post_id}/like/')
+        self.client.post(f'/api/posts/{post_id}/like/')
+        comment_id = self.client.post(reverse('comment-list'), {'post': post_id, 'content': 'hi'}).data['id']
+
+        post = Post.objects.get(pk=post_id)
+        self.assertEqual((post.likes_count, post.comments_count), (1, 1))
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.posts_count, 1)
+
+        self.client.post(f'/api/posts/{post_id}/unlike/')
+        self.client.post(f'/api/posts/{post_id}/unlike/')
+        self.client.delete(reverse('comment-detail', args=[comment_id]))
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count), (0, 0))
+
+    def test_follow_counters_ignore_repeats(self):
+        for _ in range(2):
+            self.client.post(f'/api/accounts/follow/{self.bob.id}/')
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.followers_count), (1, 1))
+
+        for _ in range(2):
+            self.client.post(f'/api/accounts/unfollow/{self.bob.id}/')
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.followers_count), (0, 0))
+
+    def test_reconcile_counters_fixes_drift(self):
+        post = Post.objects.create(author=self.bob, title='t', content='c')
+        Comment.objects.create(post=post, author=self.alice, content='hi')
+        self.bob.followers.add(self.alice)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+
+        post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual((self.bob.followers_count, self.bob.posts_count), (1, 1))
+        self.assertEqual(self.alice.following_count, 1)
+
+
+class LikeTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer', password='pass')
+        self.fan = User.objects.create_user(username='fan', password='pass')
+        self.posts = [Post.objects.create(author=self.author, title=f'p{i}', content='c') for i in range(3)]
+        self.client.force_authenticate(self.fan)
+
+    def test_like_is_idempotent(self):
+        url = f'/api/posts/{self.posts[0].id}/like/'
+        responses = [self.client.post(url) for _ in range(3)]
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+        self.assertTrue(all(r.data['liked'] for r in responses))
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].likes_count, 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+    def test_liked_by_me_field_and_batch_lookup(self):
+        self.client.post(f'/api/posts/{self.posts[1].id}/like/')
+        results = self.client.get(reverse('post-list')).data['results']
+        self.assertEqual({p['id']: p['liked_by_me'] for p in results},
+                         {p.id: p == self.posts[1] for p in self.posts})
+        detail = self.client.get(reverse('post-detail', args=[self.posts[1].id])).data
+        self.assertTrue(detail['liked_by_me'])
+
+        ids = ','.join(str(p.id) for p in self.posts)
+        self.assertEqual(self.client.get(f'/api/posts/liked/?ids={ids}').data['liked'], [self.posts[1].id])
+        self.assertEqual(self.client.get('/api/posts/liked/?ids=x').status_code, 400)
+
+    @override_settings(LIKES_CACHE_TIMEOUT=60)
+    def test_cached_liked_set_is_invalidated_on_write(self):
+        ids = ','.join(str(p.id) for p in self.posts)
+        self.assertEqual(self.client.get(f'/api/posts/liked/?ids={ids}').data['liked'], [])
+        # the page's answer is cached, not every post the user ever liked
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(likes.liked_post_ids(self.fan, [p.id for p in self.posts]), set())
+        self.assertFalse(any('posts_like' in query['sql'] for query in queries))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.posts[2].id}/like/')
+        self.assertEqual(self.client.get(f'/api/posts/liked/?ids={ids}').data['liked'], [self.posts[2].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.posts[2].id}/unlike/')
+        self.assertEqual(self.client.get(f'/api/posts/liked/?ids={ids}').data['liked'], [])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='cached', password='pass')
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.post = Post.objects.create(author=self.author, title='t', content='c')
+        self.url = reverse('post-detail', args=[self.post.id])
+        self.client.force_authenticate(self.reader)
+
+    def test_repeat_read_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_cached_responses(self):
+        etag = self.client.get(self.url)['ETag']
+        list_etag = self.client.get(reverse('post-list'))['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['likes_count'], response.data['liked_by_me']), (1, True))
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.author, content='hi')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_author_change_invalidates_list(self):
+        list_etag = self.client.get(reverse('post-list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['author_username'], 'renamed')
+
+    def test_invalidation_waits_for_commit(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            Comment.objects.create(post=self.post, author=self.author, content='hi')
+            # a read before the commit must not store the new stamp with the old rows
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cache_varies_per_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertTrue(self.client.get(self.url).data['liked_by_me'])
+        self.client.force_authenticate(self.author)
+        self.assertFalse(self.client.get(self.url).data['liked_by_me'])
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.django = Post.objects.create(author=self.alice, title='Django tips', content='Use select_related.')
+        self.python = Post.objects.create(author=self.bob, title='Weekend', content='Café and python packaging.')
+        self.comment = Comment.objects.create(post=self.django, author=self.bob, content='Django is great')
+        self.client.force_authenticate(self.alice)
+
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(hit['type'], hit['id']) for hit in response.data['results']]
+
+    def check_backend(self):
+        self.assertEqual(self.search(q='django'), [('post', self.django.id), ('comment', self.comment.id)])
+        self.assertEqual(self.search(q='pack*'), [('post', self.python.id)])
+        self.assertEqual(self.search(q='cafe'), [('post', self.python.id)])
+        self.assertEqual(self.search(q='django', type='comment'), [('comment', self.comment.id)])
+        self.assertEqual(self.search(q='django', author=self.alice.id), [('post', self.django.id)])
+        self.assertEqual(self.search(q='django', since='2999-01-01'), [])
+
+        self.django.title = 'Flask tips'
+        self.django.save()
+        self.comment.delete()
+        self.assertEqual(self.search(q='django'), [])
+
+    def test_sqlite_backend(self):
+        self.check_backend()
+
+    @override_settings(SEARCH={'BACKEND': 'posts.search.LocMemSearchBackend'})
+    def test_locmem_backend(self):
+        call_command('reindex_search', stdout=StringIO())
+        self.check_backend()
+
+    def test_results_are_paginated(self):
+        for i in range(3):
+            Post.objects.create(author=self.bob, title=f'django {i}', content='more')
+        data = self.client.get('/api/search/?q=django&page_size=3').data
+        rest = self.client.get(data['next']).data
+        keys = [(hit['type'], hit['id']) for hit in data['results'] + rest['results']]
+        self.assertEqual(len(keys), 5)
+        self.assertEqual(len(set(keys)), 5)
+        self.assertIsNone(rest['next'])
+
+    def test_invalid_queries(self):
+        self.assertEqual(self.client.get('/api/search/?q=%20%21').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=x&type=user').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=x&since=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=x&cursor=zzz').status_code, 404)
+
+    def test_reindex_command_restores_missing_rows(self):
+        search.get_backend().clear()
+        self.assertEqual(self.search(q='django'), [])
+        out = StringIO()
+        call_command('reindex_search', batch_size=1, stdout=out)
+        self.assertIn('post: 2 documents indexed.', out.getvalue())
+        self.assertEqual(len(self.search(q='django')), 2)
+
+
+class BulkCreateTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='importer', password='pass')
+        self.follower = User.objects.create_user(username='follower', password='pass')
+        self.follower.follow(self.author)
+        self.client.force_authenticate(self.author)
+
+    def test_bulk_posts_from_json_array(self):
+        items = [{'title': f'imported {i}', 'content': 'body'} for i in range(5)]
+        with override_settings(BULK_CREATE={'CHUNK_SIZE': 2}):
+            response = self.client.post('/api/posts/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(set(response.data['ids']), set(Post.objects.values_list('id', flat=True)))
+
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.posts_count, 5)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.follower).count(), 5)
+        self.assertEqual(len(search.search('imported', 10)), 5)
+
+    def test_bulk_comments_from_ndjson_with_item_errors(self):
+        post = Post.objects.create(author=self.author, title='t', content='c')
+        lines = [
+            {'post': post.id, 'content': 'first'},
+            {'post': 999999, 'content': 'missing post'},
+            {'post': post.id},
+            {'post': post.id, 'content': 'second'},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines) + '\n'
+        response = self.client.post('/api/comments/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('post', response.data['errors'][0]['errors'])
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(list(post.comments.values_list('content', flat=True)), ['first', 'second'])
+
+    def test_bulk_rejects_bad_bodies(self):
+        self.assertEqual(self.client.post('/api/posts/bulk/', {'title': 'x'}, format='json').status_code, 400)
+        response = self.client.post('/api/posts/bulk/', '{"title": "x"}\n{oops\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 2', response.data['detail'])
+        with override_settings(BULK_CREATE={'MAX_ITEMS': 1}):
+            response = self.client.post('/api/posts/bulk/', [{'title': 'a', 'content': 'b'}] * 2, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+    def test_ndjson_limits_apply_while_parsing(self):
+        body = '{"title": "a", "content": "b"}\n' * 3
+        with override_settings(BULK_CREATE={'MAX_ITEMS': 2}):
+            response = self.client.post('/api/posts/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 2 items', response.data['detail'])
+
+        with override_settings(BULK_CREATE={'MAX_BYTES': len(body) - 1}):
+            response = self.client.post('/api/posts/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Post.objects.exists())
+
+        # a body without a usable Content-Length is cut off by the parser itself
+        stream = BytesIO(body.encode())
+        with override_settings(BULK_CREATE={'MAX_BYTES': len(body) - 1}):
+            with self.assertRaises(RequestTooLarge):
+                bulk.BulkNDJSONParser().parse(stream)
+        self.assertLessEqual(stream.tell(), len(body))
+        with override_settings(BULK_CREATE={'MAX_BYTES': len(body)}):
+            self.assertEqual(len(bulk.BulkNDJSONParser().parse(BytesIO(body.encode()))), 3)
+
+    def test_bulk_comments_look_up_posts_once_per_chunk(self):
+        posts = [Post.objects.create(author=self.author, title=f't{i}', content='c') for i in range(3)]
+        items = [{'post': post.id, 'content': 'hi'} for post in posts] * 2 + [{'post': 'nope', 'content': 'x'}]
+        with override_settings(BULK_CREATE={'CHUNK_SIZE': 4}):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/comments/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 6)
+        self.assertEqual([error['index'] for error in response.data['errors']], [6])
+        post_selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "posts_post"' in q['sql']]
+        self.assertEqual(len(post_selects), 2)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='analyst', password='pass', is_staff=True)
+        self.author = User.objects.create_user(username='exported', password='pass')
+        self.author.follow(self.admin)
+        self.posts = [Post.objects.create(author=self.author, title=f'p{i}', content='c') for i in range(3)]
+        self.client.force_authenticate(self.admin)
+
+    def stream(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_and_csv_exports(self):
+        lines = self.stream('/api/export/posts/').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [post.id for post in self.posts])
+
+        rows = self.stream('/api/export/follows/?format=csv').splitlines()
+        self.assertEqual(rows, ['id,follower_id,followed_id', f'{rows[1].split(",")[0]},{self.author.id},{self.admin.id}'])
+
+    def test_incremental_export_since_watermark(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(updated_at=timezone.now() - timedelta(days=1))
+        since = (timezone.now() - timedelta(hours=1)).isoformat()
+        lines = self.stream(f'/api/export/posts/?since={quote(since)}').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(self.client.get('/api/export/posts/?since=yesterday').status_code, 400)
+
+    def test_export_requires_staff(self):
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get('/api/export/posts/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/export/users/').status_code, 404)
+
+    def test_command_tracks_watermark_in_state_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state = os.path.join(directory, 'state.json')
+            out = StringIO()
+            call_command('export_data', 'likes', state=state, stdout=out, stderr=StringIO())
+            self.assertEqual(out.getvalue(), '')
+
+            Like.objects.create(user=self.admin, post=self.posts[0])
+            call_command('export_data', 'posts', format='csv', state=state, stdout=out, stderr=StringIO())
+            self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+            out = StringIO()
+            call_command('export_data', 'posts', state=state, stdout=out, stderr=StringIO())
+            # the boundary row is exported again, nothing older
+            self.assertEqual([json.loads(line)['id'] for line in out.getvalue().splitlines()], [self.posts[-1].id])
+
+
+class BenchmarkTests(APITestCase):
+    def test_generate_and_run_scenarios(self):
+        dataset = benchmark.generate(users=12, avg_following=4, posts_per_user=2, seed=3)
+        self.assertEqual(Post.objects.count(), 24)
+        self.assertEqual(User.objects.get(username='bench_0').posts_count, 2)
+
+        results = benchmark.run(['feed', 'like', 'follow'], requests=4, warmup=1, seed=3)
+        self.assertEqual(results['feed']['statuses'], {'200': 4})
+        self.assertEqual(results['like']['statuses'], {'200': 4})
+        self.assertGreater(results['feed']['queries_mean'], 0)
+
+        results.update(benchmark.run(['async_feed', 'async_like'], requests=4, warmup=1, seed=3, interface='asgi'))
+        self.assertEqual(results['async_feed']['statuses'], {'200': 4})
+        self.assertEqual(results['async_like']['statuses'], {'200': 4})
+        self.assertIsNone(results['async_feed']['queries_mean'])
+
+        report = benchmark.report(results, dataset, requests=4)
+        self.assertEqual(report['dataset']['users'], 12)
+        self.assertLessEqual(results['feed']['p50_ms'], results['feed']['p99_ms'])
+
+    def test_login_scenarios(self):
+        benchmark.generate(users=4, avg_following=1, posts_per_user=1, seed=3)
+        # the scenarios log in and register far faster than the rate limits allow
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}):
+            results = benchmark.run(['login', 'register'], requests=3, warmup=1, seed=3)
+        self.assertEqual(results['login']['statuses'], {'200': 3})
+        self.assertEqual(results['register']['statuses'], {'201': 3})
+        self.assertGreater(benchmark.hash_rate(threads=2, duration=0.05), 0)
+
+
+@override_settings(PROFILING={'ENABLED': True, 'LOG_SAMPLE_RATE': 1.0})
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='profiled', password='pass')
+        self.client.force_authenticate(self.user)
+        Post.objects.create(author=self.user, title='t', content='c')
+
+    def timings(self, response):
+        return {
+            part.split(';')[0].strip(): part for part in response['Server-Timing'].split(',')
+        }
+
+    def test_server_timing_and_log(self):
+        with self.assertLogs('profiling', 'INFO') as logs:
+            response = self.client.get(reverse('post-list'), secure=True)
+        self.assertEqual(response.status_code, 200)
+        timings = self.timings(response)
+        self.assertLessEqual({'db', 'app', 'view', 'serialize', 'render', 'total'}, set(timings))
+        self.assertIn('queries"', timings['db'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('post-list'))
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['serialize_ms'], 0)
+
+    def test_duplicate_shapes(self):
+        profile = profiling.RequestProfile()
+        execute = lambda sql, params, many, context: None
+        for ids in ([1], [1, 2], [1, 2, 3]):
+            placeholders = ', '.join(['%s'] * len(ids))
+            profile(execute, f'SELECT * FROM t WHERE id IN ({placeholders})', ids, False, {})
+        profile(execute, 'SELECT 1', (), False, {})
+        self.assertEqual(profile.duplicates(3), [('SELECT * FROM t WHERE id IN (...)', 3)])
+
+    def test_cprofile_dump(self):
+        with tempfile.TemporaryDirectory() as directory:
+            options = {'ENABLED': True, 'PROFILE_PATHS': [r'^/api/posts/'], 'PROFILE_DIR': directory}
+            with override_settings(PROFILING=options):
+                response = self.client.get(reverse('post-list'), secure=True)
+                self.assertTrue(os.path.exists(os.path.join(directory, response['X-Profile-File'])))
+                # the header alone needs DEBUG or the token
+                response = self.client.get('/api/feed/', secure=True, HTTP_X_PROFILE='1')
+                self.assertFalse(response.has_header('X-Profile-File'))
+
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': ['replica_a', 'replica_b'], 'PIN_SECONDS': 5})
+class ReplicaRoutingTests(SimpleTestCase):
+    """Only the routing decisions; no database (or transaction) is involved."""
+
+    def route(self, method, cookies=None, write=False):
+        router = db_router.ReplicaRouter()
+        seen = {}
+
+        def view(request):
+            seen['before'] = [router.db_for_read(Post) for _ in range(3)]
+            if write:
+                router.db_for_write(Post)
+                seen['after'] = router.db_for_read(Post)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/posts/')
+        request.COOKIES.update(cookies or {})
+        response = db_router.ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_safe_request_reads_from_one_replica(self):
+        seen, response = self.route('get')
+        self.assertIn(seen['before'][0], ['replica_a', 'replica_b'])
+        self.assertEqual(len(set(seen['before'])), 1)
+        self.assertNotIn('primary_pin', response.cookies)
+
+    def test_reads_stick_to_primary_after_write(self):
+        seen, response = self.route('get', write=True)
+        self.assertEqual(seen['after'], 'default')
+        self.assertEqual(response.cookies['primary_pin']['max-age'], 5)
+
+    def test_unsafe_and_pinned_requests_use_primary(self):
+        seen, _ = self.route('post', write=True)
+        self.assertEqual(seen['before'], ['default'] * 3)
+        seen, _ = self.route('get', cookies={'primary_pin': '1'})
+        self.assertEqual(seen['before'], ['default'] * 3)
+
+    def test_primary_models(self):
+        request = RequestFactory().get('/')
+        seen = {}
+
+        def view(request):
+            seen['alias'] = db_router.ReplicaRouter().db_for_read(Session)
+            return HttpResponse()
+
+        db_router.ReplicaRoutingMiddleware(view)(request)
+        self.assertEqual(seen['alias'], 'default')
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(Post), 'default')
+        self.assertFalse(db_router.ReplicaRouter().allow_migrate('replica_a', 'posts'))
+
+
+class SQLiteWriterTests(APITestCase):
+    def test_batch_commits_once_and_isolates_failures(self):
+        batch_writer = writer.Writer(batch_size=10)
+        user = User.objects.create_user(username='w', password='pass')
+        post = Post.objects.create(author=user, title='t', content='c')
+
+        def fail():
+            Like.objects.create(user=user, post=post)
+            raise ValueError('boom')
+
+        jobs = [lambda: 'first', fail, lambda: 'third']
+        futures = [Future() for _ in jobs]
+        batch_writer.write_batch([(future, fn, (), {}) for future, fn in zip(futures, jobs)])
+
+        self.assertEqual(batch_writer.batches, 1)
+        self.assertEqual(futures[0].result(), 'first')
+        self.assertRaises(ValueError, futures[1].result)
+        self.assertEqual(futures[2].result(), 'third')
+        # the failed job's savepoint was rolled back
+        self.assertFalse(Like.objects.exists())
+
+    def test_inline_inside_transactions(self):
+        with override_settings(SQLITE_WRITER={'ENABLED': True}):
+            # TestCase runs inside a transaction, so this must not leave the thread
+            self.assertEqual(writer.write(threading.get_ident), threading.get_ident())
+
+
+@override_settings(SQLITE_WRITER={'ENABLED': True}, NOTIFICATIONS={'WORKERS': 0})
+class SQLiteWriterThreadTests(APITransactionTestCase):
+    def test_likes_go_through_the_writer_thread(self):
+        users = [User.objects.create_user(username=f'liker{i}', password='pass') for i in range(4)]
+        post = Post.objects.create(author=users[0], title='t', content='c')
+        results = []
+
+        def like(user):
+            try:
+                results.append(writer.write(likes.like, user, post))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=like, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [True] * 4)
+        self.assertEqual(Like.objects.filter(post=post).count(), 4)
+        self.assertGreaterEqual(writer.get_writer().batches, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 4)
+
+
+class QueryPlanTests(APITestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('ok    posts.by_author', out.getvalue())
+        self.assertIn('ok    notifications.outbox_redelivery', out.getvalue())
+
+    def test_problems(self):
+        plan = '5 0 0 SCAN posts_post\n9 0 0 USE TEMP B-TREE FOR ORDER BY'
+        self.assertEqual(len(query_plans.plan_problems(plan, 'sqlite')), 2)
+        self.assertEqual(query_plans.plan_problems('5 0 0 SCAN posts_post USING INDEX post_recent_idx', 'sqlite'), [])
+        self.assertEqual(len(query_plans.plan_problems('Seq Scan on posts_post  (cost=0.00..1.01)', 'postgresql')), 1)
+
+
+RATES = {'like_user': '2/min', 'login_ip': '2/min'}
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': RATES})
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        cache.clear()
+        self.user = User.objects.create_user(username='hammer', password='pass')
+        self.other = User.objects.create_user(username='calm', password='pass')
+        self.post = Post.objects.create(author=self.other, title='t', content='c')
+
+    def like(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/posts/{self.post.pk}/like/', secure=True)
+
+    def test_per_user_scope(self):
+        self.assertEqual([self.like(self.user).status_code for _ in range(2)], [200, 200])
+        response = self.like(self.user)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # other users and unscoped endpoints are unaffected
+        self.assertEqual(self.like(self.other).status_code, 200)
+        self.assertEqual(self.client.get(reverse('post-list'), secure=True).status_code, 200)
+
+    def test_per_ip_scope(self):
+        statuses = [
+            self.client.post('/api/accounts/login/', {'username': 'hammer', 'password': 'wrong'},
+                             secure=True, REMOTE_ADDR='10.0.0.1').status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [400, 400, 429])
+        response = self.client.post('/api/accounts/login/', {'username': 'hammer', 'password': 'pass'},
+                                    secure=True, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rejected_without_queries(self):
+        self.like(self.user)
+        self.like(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.like(self.user).status_code, 429)
+        self.assertEqual(ctx.captured_queries, [])
+
+    @override_settings(THROTTLING={'STORE': 'cache'})
+    def test_shared_cache_store(self):
+        self.assertIsInstance(throttling.get_store(), throttling.CacheStore)
+        self.assertEqual([self.like(self.user).status_code for _ in range(3)], [200, 200, 429])
+
+    def test_sliding_window(self):
+        store = throttling.MemoryStore(max_keys=10)
+        for _ in range(4):
+            store.hit('k', 100, 60)
+        # the previous window's count carries over, then expires
+        self.assertEqual(store.hit('k', 101, 60), (4, 1))
+        self.assertEqual(store.hit('k', 103, 60), (0, 1))
+        # a quarter into the window, 3 of the previous 4 hits still count
+        wait = throttling.SlidingWindowThrottle.retry_after(4, 60, 15, previous=4, current=2)
+        self.assertAlmostEqual(wait, 15)
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.get_store().clear()
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.reader.follow(self.author)
+        self.client.force_authenticate(self.author)
+        self.post_ids = [
+            self.client.post(reverse('post-list'), {'title': f'post {n}', 'content': '...'}, secure=True).data['id']
+            for n in range(3)
+        ]
+        for n in range(4):
+            self.client.post(reverse('comment-list'), {'post': self.post_ids[0], 'content': f'c{n}'}, secure=True)
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/posts/{self.post_ids[1]}/like/', secure=True)
+
+    def get_json(self, path):
+        response = self.client.get(path, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode().replace('/api/async/', '/api/'))
+
+    def test_payloads_match_sync_views(self):
+        detail = f'/api/posts/{self.post_ids[0]}/'
+        for path in ['/api/feed/', '/api/posts/?page_size=2', detail, '/api/posts/?fields=id,liked_by_me',
+                     f'{detail}?expand=comments']:
+            with self.subTest(path=path):
+                self.assertEqual(self.get_json(path.replace('/api/', '/api/async/')), self.get_json(path))
+
+        page = self.get_json('/api/async/posts/?page_size=2')
+        self.assertEqual(self.get_json(page['next'].replace('/api/', '/api/async/')), self.get_json(page['next']))
+
+    def test_list_queries_stay_flat(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.get_json('/api/async/posts/')
+        self.assertEqual(len(data['results']), 3)
+        # page, comment previews, liked ids; auth is forced
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_like(self):
+        path = f'/api/async/posts/{self.post_ids[0]}/like/'
+        self.assertEqual(json.loads(self.client.post(path, secure=True).content),
+                         {'detail': 'Post liked', 'liked': True})
+        self.assertEqual(json.loads(self.client.post(path, secure=True).content)['detail'], 'Already liked')
+        self.assertEqual(Post.objects.get(pk=self.post_ids[0]).likes_count, 1)
+        self.assertEqual(self.client.post('/api/async/posts/999/like/', secure=True).status_code, 404)
+
+    def test_authentication_and_throttling(self):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/async/feed/', secure=True)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+        self.client.force_authenticate(self.reader)
+        # shares the 'like' scope with the sync view, which setUp already used once
+        rates = {'like_user': '2/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            statuses = [self.client.post(f'/api/async/posts/{pk}/like/', secure=True).status_code
+                        for pk in self.post_ids[:2]]
+        self.assertEqual(statuses, [200, 429])
+
+    async def test_served_over_asgi(self):
+        token = await Token.objects.acreate(user=self.reader)
+        response = await self.async_client.get(
+            f'/api/async/posts/{self.post_ids[1]}/', secure=True, headers={'Authorization': f'Token {token.key}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(json.loads(response.content)['liked_by_me'], True)
+
+
+@override_settings(EVENTS={'BUFFER_SIZE': 3, 'QUEUE_SIZE': 2, 'HEARTBEAT': 0.01})
+class EventBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = events.get_broker()
+
+    def test_replay_after_last_event_id(self):
+        subscription, replay = self.broker.subscribe('c')
+        self.assertEqual(replay, [])
+        self.broker.publish(['c', 'other'], 'ping', {'n': 1})
+        self.broker.publish(['c'], 'ping', {'n': 2})
+        first, second = subscription.get(0)
+        self.assertEqual((second.kind, json.loads(second.data)), ('ping', {'n': 2}))
+        self.broker.unsubscribe(subscription)
+
+        _, replay = self.broker.subscribe('c', last_event_id=first.id)
+        self.assertEqual(replay, [second])
+        # older than the buffer reaches back: the client has to reset
+        for n in range(4):
+            self.broker.publish(['c'], 'ping', {'n': n})
+        self.assertIsNone(self.broker.subscribe('c', last_event_id=second.id)[1])
+        # ids from before this broker existed can't be vouched for either
+        self.assertIsNone(self.broker.subscribe('new', last_event_id=first.id - 10)[1])
+
+    def test_live_events_already_replayed_are_skipped(self):
+        self.broker.publish(['c'], 'ping', {})
+        subscription, replay = self.broker.subscribe('c', last_event_id=self.broker.seq + 5)
+        self.broker.publish(['c'], 'ping', {})
+        self.assertEqual((replay, subscription.get(0)), ([], []))
+
+    def test_slow_subscriber_is_cut_off(self):
+        subscription, _ = self.broker.subscribe('c')
+        for n in range(3):
+            self.broker.publish(['c'], 'ping', {'n': n})
+        self.assertTrue(subscription.overflowed and subscription.closed)
+        self.assertEqual(subscription.get(0), [])
+        # publishers were never blocked and the buffer still has the events
+        self.assertEqual(len(self.broker.subscribe('c', last_event_id=self.broker.seq - 3)[1]), 3)
+
+    def test_async_wait(self):
+        subscription, _ = self.broker.subscribe('c')
+
+        async def wait():
+            waiting = asyncio.ensure_future(subscription.aget(5))
+            await asyncio.sleep(0)
+            threading.Thread(target=self.broker.publish, args=(['c'], 'ping', {})).start()
+            return await waiting
+
+        self.assertEqual(len(asyncio.run(wait())), 1)
+        self.assertEqual(asyncio.run(subscription.aget(0.01)), [])
+
+    @override_settings(EVENTS={'BROKER': 'social_media_api.events.CacheBroker', 'BUFFER_SIZE': 3})
+    def test_cache_broker(self):
+        cache.clear()
+        broker = events.get_broker()
+        subscription, _ = broker.subscribe('c')
+        # another process publishing through the shared cache
+        events.CacheBroker(events.events_settings()).publish(['c'], 'ping', {'n': 1})
+        self.assertEqual(broker.poll(), 1)
+        self.assertEqual(json.loads(subscription.get(0)[0].data), {'n': 1})
+        self.assertEqual(broker.poll(), 0)
+
+
+@override_settings(EVENTS={'HEARTBEAT': 0.01}, NOTIFICATIONS={'WORKERS': 0})
+class EventStreamTests(APITestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.reader.follow(self.author)
+        self.broker = events.get_broker()
+
+    def poll(self, **headers):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/events/', secure=True, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        # under WSGI the response ends instead of holding a worker
+        self.assertFalse(response.streaming)
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: '))
+        cursor = body.rsplit('id: ', 1)[1]
+        self.assertTrue(cursor.endswith('\n\n'))
+        return body, cursor.strip()
+
+    def test_requires_authentication(self):
+        response = self.client.get('/api/events/', secure=True, headers={'Accept': 'text/event-stream'})
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(response.content.startswith(b'event: error\n'))
+
+    def test_polls_timeline_and_notifications(self):
+        body, cursor = self.poll()
+        self.assertNotIn('event:', body)
+
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            post_id = self.client.post(reverse('post-list'), {'title': 't', 'content': 'c'}, secure=True).data['id']
+        body, cursor = self.poll(**{'Last-Event-ID': cursor})
+        self.assertIn(f'event: timeline\ndata: {{"post":{post_id},', body)
+
+        self.client.force_authenticate(self.author)
+        own = Post.objects.create(author=self.reader, title='mine', content='c')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{own.pk}/like/', secure=True)
+        body, cursor = self.poll(**{'Last-Event-ID': cursor})
+        self.assertNotIn('event: timeline', body)
+        self.assertIn('event: notification\n', body)
+        data = body.split('event: notification\ndata: ', 1)[1].split('\n', 1)[0]
+        self.assertEqual(json.loads(data)['summary'], 'author liked your post')
+        self.assertEqual(cursor, str(self.broker.seq))
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    def test_resume_with_last_event_id(self):
+        channel = events.user_channel(self.reader.pk)
+        self.broker.publish([channel], 'timeline', {'post': 1})
+        last_id = self.broker.seq
+        self.broker.publish([channel], 'timeline', {'post': 2})
+        body, _ = self.poll(**{'Last-Event-ID': str(last_id)})
+        self.assertTrue(body.endswith(
+            f'\n\nid: {last_id + 1}\nevent: timeline\ndata: {{"post":2}}\n\nid: {last_id + 1}\n\n'
+        ))
+
+        body, _ = self.poll(**{'Last-Event-ID': str(last_id - 1000)})
+        self.assertIn('\n\nevent: reset\ndata: {}\n\n', body)
+
+    @override_settings(EVENTS={'HEARTBEAT': 1})
+    async def test_async_stream_over_asgi(self):
+        broker = events.get_broker()
+        token = await Token.objects.acreate(user=self.reader)
+        response = await self.async_client.get(
+            '/api/events/', secure=True, headers={'Authorization': f'Token {token.key}'},
+        )
+        self.assertTrue(response.is_async)
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry: '))
+        broker.publish([events.user_channel(self.reader.pk)], 'timeline', {'post': 1})
+        self.assertIn(b'event: timeline', await anext(chunks))
+        # a client disconnect cancels the response while it waits for events
+        waiting = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(broker.subscriber_count(), 0)
+
+
+class TrendingRankingTests(SimpleTestCase):
+    def ranking(self):
+        return trending.Ranking('hour', 3600, 900, max_ranked=10, max_tracked=100, refresh=0)
+
+    def test_decay_and_window(self):
+        ranking = self.ranking()
+        now = 1_000_000.0
+        ranking.add(1, 1.0, now - 900, now)   # one half-life ago
+        ranking.add(2, 1.0, now, now)
+        ranking.add(3, 1.0, now - 4000, now)  # outside the window
+        self.assertEqual([(post_id, round(score, 6)) for post_id, score in ranking.top(10, now)],
+                         [(2, 1.0), (1, 0.5)])
+
+        ranking.add(1, 1.0, now, now)
+        ranking.add(1, -1.0, now - 900, now)  # the older like taken back
+        self.assertEqual({post_id: round(score, 6) for post_id, score in ranking.top(10, now)}, {1: 1.0, 2: 1.0})
+        self.assertEqual(len(ranking.top(1, now)), 1)
+
+    def test_epoch_moves_without_changing_scores(self):
+        ranking = self.ranking()
+        step = trending.EPOCH_HALF_LIVES * 900
+        now = step * 10 - 100
+        ranking.add(1, 2.0, now, now)
+        ranking.add(2, 1.0, now, now)
+        first_epoch = ranking.epoch
+        later = now + 600
+        scores = ranking.top(10, later)
+        self.assertGreater(ranking.epoch, first_epoch)
+        self.assertEqual([post_id for post_id, _ in scores], [1, 2])
+        self.assertAlmostEqual(scores[0][1], 2.0 * 2 ** (-600 / 900))
+
+
+@override_settings(TRENDING={'SYNC_INTERVAL': 0, 'REFRESH': 0})
+class TrendingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='pass')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass') for i in range(3)]
+        self.posts = [Post.objects.create(author=self.user, title=f'p{i}', content='c') for i in range(3)]
+        self.client.force_authenticate(self.user)
+        # a fresh ranking per test (the class-level override is only applied once)
+        trending.get_trending.cache_clear()
+
+    def like(self, user, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.like(user, post)
+
+    def get(self, window='day', **params):
+        response = self.client.get('/api/posts/trending/', {'window': window, **params}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_likes_and_comments_rank_posts(self):
+        self.like(self.fans[0], self.posts[0])
+        self.like(self.fans[1], self.posts[0])
+        self.like(self.fans[0], self.posts[1])
+        self.assertEqual(self.get(), [self.posts[0].id, self.posts[1].id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/comments/', {'post': self.posts[2].id, 'content': 'hi'}, secure=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get('hour'), [self.posts[2].id, self.posts[0].id, self.posts[1].id])
+        self.assertEqual(self.get(limit=1), [self.posts[2].id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.unlike(self.fans[0], self.posts[1])
+        self.assertEqual(self.get('week'), [self.posts[2].id, self.posts[0].id])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/posts/trending/?window=year', secure=True).status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/trending/?limit=x', secure=True).status_code, 400)
+
+    def test_scores_persist_and_rebuild(self):
+        self.like(self.fans[0], self.posts[1])
+        self.like(self.fans[1], self.posts[1])
+        self.like(self.fans[0], self.posts[2])
+        trending.get_trending().sync()
+        self.assertEqual(TrendingScore.objects.filter(window='hour').count(), 2)
+
+        # a fresh process loads the ranking from the table
+        trending.get_trending.cache_clear()
+        expected = [self.posts[1].id, self.posts[2].id]
+        self.assertEqual(self.get('hour'), expected)
+
+        TrendingScore.objects.all().delete()
+        trending.rebuild()
+        self.assertEqual(self.get('hour'), expected)
+
+    def test_failed_sync_keeps_changes(self):
+        self.like(self.fans[0], self.posts[0])
+        with mock.patch.object(trending.Ranking, 'write', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                trending.get_trending().sync()
+        # reads never write, and the next sync writes what the failed one didn't
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(trending.top('hour', 10)[0][0], self.posts[0].id)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+        self.like(self.fans[1], self.posts[1])
+        trending.get_trending().sync()
+        self.assertEqual(TrendingScore.objects.filter(window='hour').count(), 2)
+
+    def test_deleted_post_drops_out(self):
+        self.like(self.fans[0], self.posts[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts[0].delete()
+        self.assertEqual(self.get(), [])
@@ -0,0 +1,298 @@
+"""
+Materialized home timelines (fan-out-on-write).
+
+When a post is created its id is pushed into the timeline of every follower of
+the author, so reading a feed is a single range scan over the reader's own
+entries instead of a join over everyone they follow.
+
+Authors with more followers than ``TIMELINE['FANOUT_THRESHOLD']`` are not
+fanned out; their recent posts are pulled at read time and merged in
+(the hybrid push/pull model).
+
+Entries are ``(created_at, post_id, author_id)`` tuples, newest first. Pushed
+entries are also published as ``timeline`` events to the owners' event streams
+(social_media_api/events.py); pulled posts show up on the next feed read.
+
+Settings (all optional):
+
+    TIMELINE = {
+        'BACKEND': 'posts.timeline.DatabaseTimelineBackend',
+        'MAX_LENGTH': 800,          # entries kept per user
+        'FANOUT_THRESHOLD': 10000,  # followers above which we pull instead of push
+        'BATCH_SIZE': 1000,         # rows per bulk insert while fanning out
+    }
+"""
+import bisect
+import heapq
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Count, Q
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from accounts import graph
+from social_media_api import events
+from .models import Post, TimelineEntry
+
+DEFAULTS = {
+    'BACKEND': 'posts.timeline.DatabaseTimelineBackend',
+    'MAX_LENGTH': 800,
+    'FANOUT_THRESHOLD': 10000,
+    'BATCH_SIZE': 1000,
+}
+
+
+def timeline_settings():
+    return {**DEFAULTS, **getattr(settings, 'TIMELINE', {})}
+
+
+class BaseTimelineBackend:
+    def __init__(self, options):
+        self.max_length = options['MAX_LENGTH']
+        self.batch_size = options['BATCH_SIZE']
+
+    def push(self, owner_ids, entries):
+        """Add ``entries`` to the timeline of every user in ``owner_ids``, keeping ``max_length``."""
+        raise NotImplementedError
+
+    def read(self, owner_id, limit, before=None):
+        """Return up to ``limit`` entries, newest first, older than ``before``.
+
+        ``before`` is a ``(created_at, post_id)`` key or ``None``.
+        """
+        raise NotImplementedError
+
+    def remove_post(self, post_id):
+        raise NotImplementedError
+
+    def remove_author(self, owner_id, author_id):
+        raise NotImplementedError
+
+    def clear(self, owner_id):
+        raise NotImplementedError
+
+    def trim(self, owner_id):
+        """Drop entries beyond ``max_length`` for one user."""
+
+
+class DatabaseTimelineBackend(BaseTimelineBackend):
+    """Stores timelines in the ``TimelineEntry`` table (works on SQLite)."""
+
+    def push(self, owner_ids, entries):
+        rows = (
+            TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=created_at)
+            for owner_id in owner_ids
+            for created_at, post_id, author_id in entries
+        )
+        TimelineEntry.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+        self.trim_many(owner_ids)
+
+    def read(self, owner_id, limit, before=None):
+        qs = TimelineEntry.objects.filter(owner_id=owner_id)
+        if before is not None:
+            created_at, post_id = before
+            qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lt=post_id))
+        qs = qs.order_by('-created_at', '-post_id')
+        return list(qs.values_list('created_at', 'post_id', 'author_id')[:limit])
+
+    def remove_post(self, post_id):
+        TimelineEntry.objects.filter(post_id=post_id).delete()
+
+    def remove_author(self, owner_id, author_id):
+        TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+    def clear(self, owner_id):
+        TimelineEntry.objects.filter(owner_id=owner_id).delete()
+
+    def trim(self, owner_id):
+        cutoff = (
+            TimelineEntry.objects.filter(owner_id=owner_id)
+            .order_by('-created_at', '-post_id')
+            .values_list('created_at', 'post_id')[self.max_length:self.max_length + 1]
+        )
+        for created_at, post_id in cutoff:
+            TimelineEntry.objects.filter(owner_id=owner_id).filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lte=post_id)
+            ).delete()
+
+    def trim_many(self, owner_ids):
+        """``trim`` for the users in ``owner_ids`` whose timeline is over ``max_length``."""
+        owner_ids = list(owner_ids)
+        for start in range(0, len(owner_ids), self.batch_size):
+            # counting reads only the owner index; most timelines are under the limit
+            over = (
+                TimelineEntry.objects.filter(owner_id__in=owner_ids[start:start + self.batch_size])
+                .order_by()
+                .values('owner_id')
+                .annotate(n=Count('*'))
+                .filter(n__gt=self.max_length)
+                .values_list('owner_id', flat=True)
+            )
+            for owner_id in list(over):
+                self.trim(owner_id)
+
+
+class LocMemTimelineBackend(BaseTimelineBackend):
+    """Per-process sorted lists; useful for tests and single-worker deployments."""
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._timelines = {}
+        self._lock = threading.Lock()
+
+    def push(self, owner_ids, entries):
+        with self._lock:
+            for owner_id in owner_ids:
+                timeline = self._timelines.setdefault(owner_id, [])
+                for entry in entries:
+                    index = bisect.bisect_left(timeline, entry)
+                    if index < len(timeline) and timeline[index][1] == entry[1]:
+                        continue
+                    timeline.insert(index, entry)
+                # oldest entries sit at the front of the list
+                del timeline[:-self.max_length]
+
+    def read(self, owner_id, limit, before=None):
+        with self._lock:
+            timeline = list(self._timelines.get(owner_id, ()))
+        end = len(timeline)
+        if before is not None:
+            end = bisect.bisect_left(timeline, tuple(before))
+        return timeline[max(end - limit, 0):end][::-1]
+
+    def remove_post(self, post_id):
+        with self._lock:
+            for owner_id, timeline in self._timelines.items():
+                self._timelines[owner_id] = [e for e in timeline if e[1] != post_id]
+
+    def remove_author(self, owner_id, author_id):
+        with self._lock:
+            timeline = self._timelines.get(owner_id, [])
+            self._timelines[owner_id] = [e for e in timeline if e[2] != author_id]
+
+    def clear(self, owner_id):
+        with self._lock:
+            self._timelines.pop(owner_id, None)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    options = timeline_settings()
+    return import_string(options['BACKEND'])(options)
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    if setting == 'TIMELINE':
+        get_backend.cache_clear()
+
+
+def _entry(post):
+    return (post.created_at, post.pk, post.author_id)
+
+
+def is_high_fanout(author):
+    return author.followers_count > timeline_settings()['FANOUT_THRESHOLD']
+
+
+def high_fanout_following(user):
+    """Ids of followed authors whose posts are pulled at read time."""
+    threshold = timeline_settings()['FANOUT_THRESHOLD']
+    return list(user.following.filter(followers_count__gt=threshold).values_list('id', flat=True))
+
+
+def fan_out_post(post):
+    """Push a new post into its author's followers' timelines."""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """Like ``fan_out_post`` for many posts, reading each author's followers once."""
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+    batch_size = timeline_settings()['BATCH_SIZE']
+    for author_posts in by_author.values():
+        author = author_posts[0].author
+        if is_high_fanout(author):
+            continue
+        follower_ids = list(author.followers.values_list('id', flat=True).iterator(chunk_size=batch_size))
+        entries = [_entry(post) for post in author_posts]
+        get_backend().push(follower_ids, entries)
+        publish_entries(follower_ids, entries)
+
+
+def publish_entries(owner_ids, entries):
+    """Announce new timeline ``entries`` to their owners once the transaction commits."""
+    channels = [events.user_channel(owner_id) for owner_id in owner_ids]
+    if not channels:
+        return
+
+    def send():
+        for created_at, post_id, author_id in entries:
+            events.publish(channels, 'timeline', {'post': post_id, 'author': author_id, 'created_at': created_at})
+
+    transaction.on_commit(send)
+
+
+def remove_post(post):
+    get_backend().remove_post(post.pk)
+
+
+def recent_entries(author_ids, limit, before=None):
+    qs = Post.objects.filter(author_id__in=author_ids)
+    if before is not None:
+        created_at, post_id = before
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id))
+    return list(qs.order_by('-created_at', '-id').values_list('created_at', 'id', 'author_id')[:limit])
+
+
+def follow_author(user, author):
+    """Backfill ``author``'s recent posts after ``user`` starts following them."""
+    follow_authors(user, [author])
+
+
+def follow_authors(user, authors):
+    """``follow_author`` for several authors with one query and one push."""
+    author_ids = [author.pk for author in authors if not is_high_fanout(author)]
+    if not author_ids:
+        return
+    # only the newest MAX_LENGTH of them can stay in the timeline anyway
+    entries = recent_entries(author_ids, timeline_settings()['MAX_LENGTH'])
+    get_backend().push([user.pk], entries)
+
+
+def unfollow_author(user, author):
+    get_backend().remove_author(user.pk, author.pk)
+
+
+def read_timeline(user, limit, before=None):
+    """Return the newest ``limit`` timeline entries for ``user``."""
+    entries = get_backend().read(user.pk, limit, before)
+    pulled_ids = high_fanout_following(user)
+    if pulled_ids:
+        pulled = recent_entries(pulled_ids, limit, before)
+        seen = set()
+        merged = []
+        for entry in heapq.merge(entries, pulled, key=lambda e: (e[0], e[1]), reverse=True):
+            if entry[1] not in seen:
+                seen.add(entry[1])
+                merged.append(entry)
+        entries = merged[:limit]
+    return entries
+
+
+def rebuild_timeline(user):
+    """Recompute ``user``'s timeline from the follow graph and existing posts."""
+    options = timeline_settings()
+    backend = get_backend()
+    pulled_ids = set(high_fanout_following(user))
+    author_ids = [pk for pk in graph.following_of(user) if pk not in pulled_ids]
+    backend.clear(user.pk)
+    entries = recent_entries(author_ids, options['MAX_LENGTH']) if author_ids else []
+    backend.push([user.pk], entries)
+    return len(entries)
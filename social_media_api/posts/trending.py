@@ -0,0 +1,420 @@
+"""
+Trending posts: time-decayed engagement scores, kept up to date as likes and
+comments arrive.
+
+Each like or comment adds its weight to its post's score in every window
+(hour, day, week), and that contribution halves every ``HALF_LIFE`` of the
+window. Decay never reorders posts, because every score decays by the same
+factor. So scores are stored relative to an epoch, as
+``weight * 2 ** ((event time - epoch) / half-life)``, and only the epoch has
+to move. It moves in steps of 64 half-lives, which rescales all scores once
+and keeps them within float range. Removing a like or comment subtracts its
+contribution at its original time. A window only lists posts with an event
+inside it.
+
+Each process keeps, per window, the scores of the best ``MAX_TRACKED`` posts
+and a ranking of the best ``MAX_RANKED``. The ranking is rebuilt with a heap
+at most every ``REFRESH`` seconds. ``top()`` slices it, so a read costs
+O(k).
+
+Every ``SYNC_INTERVAL`` seconds a background thread per process adds the
+score changes it has recorded into ``TrendingScore`` rows and reloads the
+best rows. Every worker therefore ranks by everyone's events within about one
+interval, and rankings survive restarts. Posts that had no event for a whole
+window lose their row. Recording events and serving rankings only touch
+memory (the first read of a process loads the rows), so a failing sync never
+fails a request; its changes are kept for the next attempt.
+``manage.py rebuild_trending`` recomputes everything from the ``Like`` and
+``Comment`` tables, for example after bulk loads, which send no signals.
+
+Settings (all optional):
+
+    TRENDING = {
+        'WINDOWS': {'hour': 3600, 'day': 86400, 'week': 604800},   # name -> seconds
+        'HALF_LIFE': 0.25,                          # fraction of the window
+        'WEIGHTS': {'like': 1.0, 'comment': 3.0},
+        'MAX_RANKED': 100,      # longest ranking served per window
+        'MAX_TRACKED': 5000,    # posts with scores kept in memory per window
+        'REFRESH': 1.0,         # seconds between ranking rebuilds
+        'SYNC_INTERVAL': 10,    # seconds between writes to / reloads from the database;
+                                # 0 turns the background sync off (call sync() yourself)
+    }
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import Case, DateTimeField, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Like, Post, TrendingScore
+
+DEFAULTS = {
+    'WINDOWS': {'hour': 3600, 'day': 86400, 'week': 604800},
+    'HALF_LIFE': 0.25,
+    'WEIGHTS': {'like': 1.0, 'comment': 3.0},
+    'MAX_RANKED': 100,
+    'MAX_TRACKED': 5000,
+    'REFRESH': 1.0,
+    'SYNC_INTERVAL': 10,
+}
+
+LIKE = 'like'
+COMMENT = 'comment'
+
+EPOCH_HALF_LIVES = 64
+BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def trending_settings():
+    return {**DEFAULTS, **getattr(settings, 'TRENDING', {})}
+
+
+def _datetime(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+class Ranking:
+    """Scores and the current ranking of one window; callers hold ``Trending``'s lock."""
+
+    def __init__(self, name, length, half_life, max_ranked, max_tracked, refresh):
+        self.name = name
+        self.length = length
+        self.half_life = half_life
+        self.max_ranked = max_ranked
+        self.max_tracked = max_tracked
+        self.refresh = refresh
+        self.epoch = None
+        # post_id -> [score, last event time]
+        self.scores = {}
+        # changes not written to the database yet, same shape
+        self.pending = {}
+        # [(score, post_id)], best first
+        self.ranking = []
+        self.dirty = False
+        self.rebuilt_at = -math.inf
+
+    def decay(self, seconds):
+        return 2.0 ** (-seconds / self.half_life)
+
+    def _advance(self, now):
+        step = EPOCH_HALF_LIVES * self.half_life
+        epoch = int(now // step * step)
+        if self.epoch is None:
+            self.epoch = epoch
+        elif epoch > self.epoch:
+            factor = self.decay(epoch - self.epoch)
+            for entries in (self.scores, self.pending):
+                for entry in entries.values():
+                    entry[0] *= factor
+            self.ranking = [(score * factor, post_id) for score, post_id in self.ranking]
+            self.epoch = epoch
+        return self.epoch
+
+    def add(self, post_id, weight, at, now):
+        self._advance(now)
+        delta = weight * 2.0 ** ((at - self.epoch) / self.half_life)
+        # removals carry the removed event's time, which is no new activity
+        last = at if weight > 0 else 0.0
+        for entries in (self.scores, self.pending):
+            entry = entries.setdefault(post_id, [0.0, 0.0])
+            entry[0] += delta
+            entry[1] = max(entry[1], last)
+        self.dirty = True
+        if len(self.scores) > 2 * self.max_tracked:
+            kept = heapq.nlargest(self.max_tracked, self.scores.items(), key=lambda item: item[1][0])
+            self.scores = dict(kept)
+
+    def remove(self, post_id):
+        self.scores.pop(post_id, None)
+        self.pending.pop(post_id, None)
+        self.dirty = True
+
+    def top(self, k, now):
+        """Up to ``k`` ``(post_id, score)`` pairs, best first, with scores decayed to ``now``."""
+        self._advance(now)
+        if self.dirty and now - self.rebuilt_at >= self.refresh:
+            cutoff = now - self.length
+            self.ranking = heapq.nlargest(
+                self.max_ranked,
+                ((score, post_id) for post_id, (score, last) in self.scores.items() if score > 0 and last >= cutoff),
+            )
+            self.dirty = False
+            self.rebuilt_at = now
+        cutoff = now - self.length
+        factor = self.decay(now - self.epoch)
+        top = []
+        for score, post_id in self.ranking:
+            entry = self.scores.get(post_id)
+            # left the window (or the post was deleted) since the last rebuild
+            if entry is None or entry[1] < cutoff:
+                continue
+            top.append((post_id, score * factor))
+            if len(top) == k:
+                break
+        return top
+
+    def take_pending(self, now):
+        """The changes not written yet, and the epoch they are relative to."""
+        epoch = self._advance(now)
+        pending, self.pending = self.pending, {}
+        return epoch, pending
+
+    def restore_pending(self, epoch, pending):
+        """Puts back changes from ``take_pending`` whose write failed."""
+        factor = 2.0 ** ((epoch - self.epoch) / self.half_life)
+        for post_id, (delta, last) in pending.items():
+            entry = self.pending.setdefault(post_id, [0.0, 0.0])
+            entry[0] += delta * factor
+            entry[1] = max(entry[1], last)
+
+    def write(self, epoch, pending, now):
+        """Add changes from ``take_pending`` to the database; needs no lock."""
+        rows = TrendingScore.objects.filter(window=self.name)
+        with transaction.atomic():
+            # rows written before the epoch moved, by this or another process
+            for old in rows.exclude(epoch=epoch).values_list('epoch', flat=True).distinct():
+                rows.filter(epoch=old).update(score=F('score') * self.decay(epoch - old), epoch=epoch)
+
+            # posts deleted since their events were recorded are dropped
+            candidates = sorted(pending)
+            post_ids = []
+            for start in range(0, len(candidates), BATCH_SIZE):
+                batch = candidates[start:start + BATCH_SIZE]
+                post_ids.extend(sorted(Post.objects.filter(pk__in=batch).values_list('pk', flat=True)))
+            TrendingScore.objects.bulk_create(
+                [
+                    TrendingScore(post_id=post_id, window=self.name, score=0.0, epoch=epoch,
+                                  last_event_at=_datetime(pending[post_id][1]))
+                    for post_id in post_ids if pending[post_id][1]
+                ],
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            for start in range(0, len(post_ids), BATCH_SIZE):
+                batch = post_ids[start:start + BATCH_SIZE]
+                rows.filter(post_id__in=batch).update(
+                    score=F('score') + Case(
+                        *[When(post_id=post_id, then=Value(pending[post_id][0])) for post_id in batch],
+                        output_field=FloatField(),
+                    ),
+                    last_event_at=Greatest(F('last_event_at'), Case(
+                        *[When(post_id=post_id, then=Value(_datetime(pending[post_id][1]))) for post_id in batch],
+                        output_field=DateTimeField(),
+                    )),
+                )
+            rows.filter(last_event_at__lt=_datetime(now - self.length)).delete()
+
+    def read(self):
+        """The best database rows as ``(epoch, scores)``; needs no lock and writes nothing."""
+        rows = TrendingScore.objects.filter(window=self.name, score__gt=0)
+        epochs = sorted(rows.values_list('epoch', flat=True).distinct())
+        if not epochs:
+            return None, {}
+        # rows another process hasn't moved to the latest epoch yet are rescaled here
+        epoch = epochs[-1]
+        scores = {}
+        for old in epochs:
+            factor = self.decay(epoch - old)
+            best = rows.filter(epoch=old).order_by('-score')[:self.max_tracked]
+            for post_id, score, last_event_at in best.values_list('post_id', 'score', 'last_event_at'):
+                scores[post_id] = [score * factor, last_event_at.timestamp()]
+        if len(epochs) > 1:
+            scores = dict(heapq.nlargest(self.max_tracked, scores.items(), key=lambda item: item[1][0]))
+        return epoch, scores
+
+    def install(self, epoch, scores, now):
+        """Replaces the scores with ``read()``'s, plus the changes recorded since."""
+        current = self._advance(now)
+        factor = 1.0 if epoch is None else 2.0 ** ((epoch - current) / self.half_life)
+        self.scores = {post_id: [score * factor, last] for post_id, (score, last) in scores.items()}
+        for post_id, (delta, last) in self.pending.items():
+            entry = self.scores.setdefault(post_id, [0.0, 0.0])
+            entry[0] += delta
+            entry[1] = max(entry[1], last)
+        self.dirty = True
+        self.rebuilt_at = -math.inf
+
+
+class Trending:
+    def __init__(self, options):
+        self.weights = options['WEIGHTS']
+        self.sync_interval = options['SYNC_INTERVAL']
+        self.rankings = {
+            name: Ranking(name, length, length * options['HALF_LIFE'], options['MAX_RANKED'],
+                          options['MAX_TRACKED'], options['REFRESH'])
+            for name, length in options['WINDOWS'].items()
+        }
+        self.max_ranked = options['MAX_RANKED']
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._syncer = None
+        self._syncer_lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def record(self, post_id, kind, at=None, removed=False, now=None):
+        """Count a ``kind`` event on ``post_id`` that happened at ``at`` (seconds), or take it back."""
+        now = time.time() if now is None else now
+        at = now if at is None else at
+        weight = -self.weights[kind] if removed else self.weights[kind]
+        self._ensure_syncing()
+        with self._lock:
+            for ranking in self.rankings.values():
+                ranking.add(post_id, weight, at, now)
+
+    def remove_post(self, post_id):
+        with self._lock:
+            for ranking in self.rankings.values():
+                ranking.remove(post_id)
+
+    def top(self, window, k, now=None):
+        now = time.time() if now is None else now
+        if not self.loaded:
+            self.load(now)
+        self._ensure_syncing()
+        with self._lock:
+            return self.rankings[window].top(min(k, self.max_ranked), now)
+
+    def load(self, now=None):
+        """Replace the scores with the best database rows, keeping unwritten changes."""
+        now = time.time() if now is None else now
+        read = {name: ranking.read() for name, ranking in self.rankings.items()}
+        with self._lock:
+            for name, (epoch, scores) in read.items():
+                self.rankings[name].install(epoch, scores, now)
+            self.loaded = True
+
+    def sync(self, now=None):
+        """Write the recorded changes to the database, then ``load()``.
+
+        The lock is not held during queries, so events recorded meanwhile
+        wait for the next sync; if the write fails the changes are put back.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            taken = {name: ranking.take_pending(now) for name, ranking in self.rankings.items()}
+        try:
+            with transaction.atomic():
+                for name, (epoch, pending) in taken.items():
+                    self.rankings[name].write(epoch, pending, now)
+        except Exception:
+            with self._lock:
+                for name, (epoch, pending) in taken.items():
+                    self.rankings[name].restore_pending(epoch, pending)
+            raise
+        self.load(now)
+
+    def close(self):
+        """Stop the background sync; unwritten changes are dropped."""
+        self._closed.set()
+
+    def _ensure_syncing(self):
+        if not self.sync_interval or self._closed.is_set():
+            return
+        with self._syncer_lock:
+            if self._syncer is None or not self._syncer.is_alive():
+                self._syncer = threading.Thread(target=self._sync_forever, name='trending-sync', daemon=True)
+                self._syncer.start()
+
+    def _sync_forever(self):
+        while not self._closed.wait(self.sync_interval):
+            close_old_connections()
+            try:
+                self.sync()
+            except Exception:
+                logger.exception('Syncing trending scores failed')
+
+
+@lru_cache(maxsize=None)
+def get_trending():
+    return Trending(trending_settings())
+
+
+def _reset():
+    if get_trending.cache_info().currsize:
+        get_trending().close()
+    get_trending.cache_clear()
+
+
+@receiver(setting_changed)
+def _reset_trending(setting, **kwargs):
+    if setting == 'TRENDING':
+        _reset()
+
+
+def windows():
+    return list(trending_settings()['WINDOWS'])
+
+
+def top(window, k):
+    """The ``k`` best ``(post_id, score)`` pairs of ``window``."""
+    return get_trending().top(window, k)
+
+
+def _record_on_commit(post_id, kind, created_at, removed=False):
+    at = created_at.timestamp() if created_at else None
+    # robust: the write already committed, so a failure here must not fail the request
+    transaction.on_commit(lambda: get_trending().record(post_id, kind, at, removed), robust=True)
+
+
+def record_comments(comments):
+    """Count comments created without ``post_save`` (``bulk_create``)."""
+    for comment in comments:
+        _record_on_commit(comment.post_id, COMMENT, comment.created_at)
+
+
+@receiver(post_save, sender=Like, dispatch_uid='trending:like_saved')
+@receiver(post_save, sender=Comment, dispatch_uid='trending:comment_saved')
+def _engagement_saved(sender, instance, created, **kwargs):
+    if created:
+        _record_on_commit(instance.post_id, LIKE if sender is Like else COMMENT, instance.created_at)
+
+
+@receiver(post_delete, sender=Like, dispatch_uid='trending:like_deleted')
+@receiver(post_delete, sender=Comment, dispatch_uid='trending:comment_deleted')
+def _engagement_deleted(sender, instance, **kwargs):
+    _record_on_commit(instance.post_id, LIKE if sender is Like else COMMENT, instance.created_at, removed=True)
+
+
+@receiver(post_delete, sender=Post, dispatch_uid='trending:post_deleted')
+def _post_deleted(sender, instance, **kwargs):
+    # its rows go with it (on_delete=CASCADE)
+    post_id = instance.pk
+    transaction.on_commit(lambda: get_trending().remove_post(post_id), robust=True)
+
+
+def rebuild(now=None):
+    """Recompute every window from the ``Like`` and ``Comment`` tables; returns the rows written."""
+    now = time.time() if now is None else now
+    trending = Trending(trending_settings())
+    longest = max(ranking.length for ranking in trending.rankings.values())
+    since = _datetime(now - longest)
+    sources = [
+        (LIKE, Like.objects.filter(created_at__gte=since)),
+        (COMMENT, Comment.objects.filter(created_at__gte=since)),
+    ]
+    for kind, events in sources:
+        weight = trending.weights[kind]
+        for post_id, created_at in events.values_list('post_id', 'created_at').iterator(chunk_size=2000):
+            at = created_at.timestamp()
+            for ranking in trending.rankings.values():
+                if at >= now - ranking.length:
+                    ranking.add(post_id, weight, at, now)
+
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        trending.sync(now)
+    # this process reloads the new rows now, others at their next sync
+    _reset()
+    return TrendingScore.objects.count()
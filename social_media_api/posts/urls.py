@@ -1,15 +1,26 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, like_post, unlike_post, feed
+from .views import (PostViewSet, CommentViewSet, like_post, unlike_post, liked_posts, feed, search_posts, export_dataset,
+                    trending_posts)
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
 router.register(r'comments', CommentViewSet)
 
 urlpatterns = [
+    path('posts/liked/', liked_posts),
+    path('posts/trending/', trending_posts),
     path('posts/<int:pk>/like/', like_post),
     path('posts/<int:pk>/unlike/', unlike_post),
     path('feed/', feed),
+    path('search/', search_posts),
+    path('export/<slug:dataset>/', export_dataset),
+    # ASGI-native variants (posts/async_views.py)
+    path('async/feed/', async_views.feed),
+    path('async/posts/', async_views.post_list),
+    path('async/posts/<int:pk>/', async_views.post_detail),
+    path('async/posts/<int:pk>/like/', async_views.like_post),
 ]
 
 urlpatterns += router.urls
@@ -1,13 +1,60 @@
-from rest_framework import viewsets, permissions
+from datetime import datetime, time
+
+from rest_framework import viewsets, permissions, generics, status
 from .models import Post, Comment, Like
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .serializers import PostSerializer, CommentSerializer
-from rest_framework.decorators import api_view, permission_classes
+from .serializers import PostSerializer, CommentSerializer, SearchHitSerializer
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
+from rest_framework.parsers import JSONParser
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Post, Like
-from notifications.models import Notification
-from django.contrib.contenttypes.models import ContentType
+from notifications.pipeline import notify
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from social_media_api.counters import adjust_counters
+from social_media_api.renderers import CSVRenderer, NDJSONRenderer
+from social_media_api.response_cache import CachedResponseMixin
+from social_media_api.throttling import throttle_scope
+from social_media_api.writer import write
+from social_media_api.query_planner import PlannedQuerysetMixin, plan_queryset
+from social_media_api.pagination import (
+    CreatedAtKeysetPagination, OldestFirstKeysetPagination, SearchPagination, TimelinePagination,
+)
+from . import bulk, export, likes, search, timeline, trending
+
+User = get_user_model()
+
+MAX_LIKED_LOOKUP = 200
+TRENDING_PAGE_SIZE = 20
+
+def bulk_create_response(request, create):
+    """Runs ``create(author, items, context)`` on a JSON array or NDJSON body."""
+    max_bytes = bulk.bulk_settings()['MAX_BYTES']
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:  # Django reads such a body as empty
+        length = 0
+    # checked before a JSON array is read; NDJSON bodies are also cut off while streaming
+    if length > max_bytes:
+        return Response({'detail': f'Request bodies are limited to {max_bytes} bytes.'}, status=413)
+    items = request.data
+    if not isinstance(items, list) or not items:
+        return Response({'detail': 'Send a non-empty JSON array or NDJSON stream.'}, status=400)
+    max_items = bulk.bulk_settings()['MAX_ITEMS']
+    if len(items) > max_items:
+        return Response({'detail': f'At most {max_items} items per request.'}, status=400)
+
+    result = create(request.user, items, {'request': request})
+    if not result.errors:
+        code = status.HTTP_201_CREATED
+    elif result.ids:
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = status.HTTP_400_BAD_REQUEST
+    return Response({'created': len(result.ids), 'ids': result.ids, 'errors': result.errors}, status=code)
+
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -16,58 +63,203 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return obj.author == request.user
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(CachedResponseMixin, PlannedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = CreatedAtKeysetPagination
+    # User: author_username is embedded in every post
+    cache_dependencies = [Comment, Like, User]
+    # liked_by_me differs per user
+    cache_vary_on_user = True
+    # only the bulk action is rate limited
+    throttle_scope = None
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        adjust_counters(User, post.author_id, posts_count=1)
+        timeline.fan_out_post(post)
+
+    def perform_destroy(self, instance):
+        timeline.remove_post(instance)
+        instance.delete()
+        adjust_counters(User, instance.author_id, posts_count=-1)
 
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, bulk.BulkNDJSONParser],
+            throttle_scope='bulk')
+    def bulk_create(self, request):
+        return bulk_create_response(request, bulk.bulk_create_posts)
 
-class CommentViewSet(viewsets.ModelViewSet):
+
+class CommentViewSet(PlannedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = OldestFirstKeysetPagination
+    throttle_scope = None
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        adjust_counters(Post, comment.post_id, comments_count=1)
+        notify(comment.post.author, comment.author, 'commented on your post', comment.post)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        adjust_counters(Post, instance.post_id, comments_count=-1)
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, bulk.BulkNDJSONParser],
+            throttle_scope='bulk')
+    def bulk_create(self, request):
+        return bulk_create_response(request, bulk.bulk_create_comments)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def feed(request):
-    following_users = request.user.following.all()
-    posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
-    serializer = PostSerializer(posts, many=True)
-    return Response(serializer.data)
+    paginator = TimelinePagination()
+    entries = paginator.paginate_entries(
+        lambda limit, before: timeline.read_timeline(request.user, limit, before),
+        request,
+        Post,
+    )
+    post_ids = [post_id for _, post_id, _ in entries]
+    context = {'request': request}
+    posts = plan_queryset(Post.objects.all(), PostSerializer(many=True, context=context)).in_bulk(post_ids)
+    serializer = PostSerializer([posts[pk] for pk in post_ids if pk in posts], many=True, context=context)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def trending_posts(request):
+    """The posts with the most recent engagement: ``?window=hour|day|week`` (default day), ``?limit=``."""
+    window = request.query_params.get('window', 'day')
+    if window not in trending.windows():
+        return Response({'detail': f"Unknown window; choose from {', '.join(trending.windows())}."}, status=400)
+    try:
+        limit = int(request.query_params.get('limit', TRENDING_PAGE_SIZE))
+    except ValueError:
+        return Response({'detail': 'limit must be an integer.'}, status=400)
+    if limit < 1:
+        return Response({'detail': 'limit must be at least 1.'}, status=400)
+
+    ranked = trending.top(window, limit)
+    context = {'request': request}
+    posts = plan_queryset(Post.objects.all(), PostSerializer(many=True, context=context)).in_bulk(
+        [post_id for post_id, _ in ranked]
+    )
+    # a post deleted since the ranking was built is skipped
+    ranked = [(posts[post_id], score) for post_id, score in ranked if post_id in posts]
+    results = PostSerializer([post for post, _ in ranked], many=True, context=context).data
+    for data, (_, score) in zip(results, ranked):
+        data['trending_score'] = round(score, 4)
+    return Response({'window': window, 'results': results})
+
 
+def _search_timestamp(value):
+    parsed = parse_datetime(value) or parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    if not isinstance(parsed, datetime):
+        parsed = datetime.combine(parsed, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return search.timestamp(parsed)
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_posts(request):
+    """Ranked full-text search: ``?q=`` plus optional ``type``, ``author``, ``since``, ``until``."""
+    params = request.query_params
+    if not search.parse_query(params.get('q', '')):
+        return Response({'detail': 'Provide a search query with ?q=.'}, status=400)
+    filters = {}
+    try:
+        if params.get('type'):
+            if params['type'] not in search.KINDS:
+                raise ValueError(params['type'])
+            filters['kind'] = params['type']
+        if params.get('author'):
+            filters['author_id'] = int(params['author'])
+        for name in ('since', 'until'):
+            if params.get(name):
+                filters[name] = _search_timestamp(params[name])
+    except ValueError:
+        return Response({'detail': 'Invalid filter; use type=post|comment, a numeric author and ISO dates.'},
+                        status=400)
+
+    paginator = SearchPagination()
+    hits = paginator.paginate_hits(
+        lambda limit, after: search.search(params['q'], limit, after=after, **filters),
+        request,
+    )
+    return paginator.get_paginated_response(SearchHitSerializer(hits, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+def export_dataset(request, dataset):
+    """Streams a whole table as NDJSON (default) or CSV (``?format=csv``), optionally ``?since=``."""
+    datasets = export.datasets()
+    if dataset not in datasets:
+        return Response({'detail': f"Unknown dataset; choose from {', '.join(datasets)}."}, status=404)
+    spec = datasets[dataset]
+    since = None
+    if request.query_params.get('since'):
+        try:
+            since = export.parse_watermark(spec, request.query_params['since'])
+        except ValueError:
+            return Response({'detail': f'since must be a {spec.watermark} value.'}, status=400)
+
+    renderer = request.accepted_renderer
+    response = StreamingHttpResponse(
+        renderer.stream(export.rows(spec, since), spec.fields),
+        content_type=f'{renderer.media_type}; charset={renderer.charset}',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{renderer.format}"'
+    return response
+
+
+@throttle_scope('like')
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def like_post(request, pk):
     post = generics.get_object_or_404(Post, pk=pk)
 
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
+    # idempotent: repeating the request is a no-op that still reports success
+    if write(_like_and_notify, request.user, post):
+        return Response({'detail': 'Post liked', 'liked': True})
+    return Response({'detail': 'Already liked', 'liked': True})
 
-    if not created:
-        return Response({'detail': 'Already liked'}, status=400)
-
-    Notification.objects.create(
-        recipient=post.author,
-        actor=request.user,
-        verb='liked your post',
-        content_type=ContentType.objects.get_for_model(Post),
-        object_id=post.id
-    )
 
-    return Response({'detail': 'Post liked'})
+def _like_and_notify(user, post):
+    if not likes.like(user, post):
+        return False
+    notify(post.author, user, 'liked your post', post)
+    return True
 
+@throttle_scope('like')
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def unlike_post(request, pk):
     post = generics.get_object_or_404(Post, pk=pk)
-    Like.objects.filter(user=request.user, post=post).delete()
-    return Response({'detail': 'Post unliked'})
+    write(likes.unlike, request.user, post)
+    return Response({'detail': 'Post unliked', 'liked': False})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def liked_posts(request):
+    """``?ids=1,2,3`` -> which of those posts the current user has liked."""
+    try:
+        post_ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk]
+    except ValueError:
+        return Response({'detail': 'ids must be a comma-separated list of integers.'}, status=400)
+    if len(post_ids) > MAX_LIKED_LOOKUP:
+        return Response({'detail': f'At most {MAX_LIKED_LOOKUP} ids per request.'}, status=400)
+    liked = likes.liked_post_ids(request.user, post_ids)
+    return Response({'liked': sorted(liked)})
 
 
 
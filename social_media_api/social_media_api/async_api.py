@@ -0,0 +1,83 @@
+"""
+Async (ASGI-native) API views on top of DRF's request handling.
+
+DRF's ``APIView`` is synchronous; under ASGI Django runs it in a worker
+thread. ``async_api_view`` lets a plain ``async def`` view keep its body on
+the event loop, awaiting the async ORM, while authentication, the
+``IsAuthenticated`` check, throttle scopes, error responses and JSON
+rendering behave exactly as in the sync views::
+
+    @async_api_view(throttle_scope='like')
+    async def like_post(request, pk):
+        post = await aget_object_or_404(Post, pk=pk)
+        ...
+        return Response({'liked': True})
+
+The view receives the DRF ``Request`` and returns a DRF ``Response`` (or any
+Django response, such as a ``StreamingHttpResponse``, which is passed through).
+Authentication, permissions and throttles run in one ``sync_to_async`` hop
+(the token lookup is a query either way). The response is rendered with
+``JSONRenderer`` on the loop and handed to Django as a plain
+``HttpResponse``, so there is no second hop to render it.
+
+Anything in the view body that touches the ORM synchronously, such as a
+relation the queryset plan missed, raises ``SynchronousOnlyOperation``
+instead of silently blocking the loop.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class AsyncGate(APIView):
+    """The synchronous part of DRF's request cycle, run for an async view."""
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer]
+    throttle_scope = None
+
+
+def _http_response(view, request, response):
+    response = view.finalize_response(request, response)
+    if not isinstance(response, Response):
+        return response
+    response.render()
+    http_response = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        http_response[header] = value
+    return http_response
+
+
+def async_api_view(throttle_scope=None, renderer_classes=None):
+    """Wrap an ``async def view(request, ...)`` that returns a DRF ``Response``.
+
+    ``renderer_classes`` replaces the default JSON-only negotiation.
+    """
+    options = {'throttle_scope': throttle_scope}
+    if renderer_classes is not None:
+        options['renderer_classes'] = renderer_classes
+
+    def decorator(func):
+        # like APIView: session-authenticated requests are CSRF-checked by
+        # SessionAuthentication, token ones are not
+        @csrf_exempt
+        @functools.wraps(func)
+        async def view(request, *args, **kwargs):
+            gate = AsyncGate(**options)
+            gate.args, gate.kwargs = args, kwargs
+            request = gate.initialize_request(request, *args, **kwargs)
+            gate.request = request
+            gate.headers = gate.default_response_headers
+            try:
+                await sync_to_async(gate.initial)(request, *args, **kwargs)
+                response = await func(request, *args, **kwargs)
+            except Exception as exc:
+                response = gate.handle_exception(exc)
+            return _http_response(gate, request, response)
+        return view
+    return decorator
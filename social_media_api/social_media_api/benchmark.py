@@ -0,0 +1,388 @@
+"""
+Reproducible data generation and latency benchmarks.
+
+``generate()`` fills the database with a synthetic social graph: users whose
+follower counts follow a Zipf (power-law) or uniform distribution, posts,
+comments and likes, all from a seeded RNG so the same options always build the
+same data. Counters, timelines and the search index are rebuilt afterwards,
+since everything is written with ``bulk_create``.
+
+``run()`` replays request scenarios in-process through the test client,
+authenticating as random generated users with their tokens, and reports
+p50/p95/p99 latency, throughput and SQL queries per request. Requests are
+issued by ``concurrency`` client threads (one by default); throughput is
+completed requests per second of wall time. Concurrent clients need a
+database that other threads can see, i.e. not a test database.
+
+With ``interface='asgi'`` the clients are coroutines on one event loop sending
+through Django's ASGI request path instead, the way uvicorn serves it: each
+request gets its own thread for sync work (``ThreadSensitiveContext``). The
+``async_*`` scenarios hit the async views in posts/async_views.py. Query
+counts are not available in this mode, since queries run in those threads.
+
+The ``login`` and ``register`` scenarios are bound by password hashing;
+``hash_rate()`` measures the hasher alone, for comparing the two.
+
+``manage.py benchmark`` wraps both and writes a JSON report meant to be
+diffed across commits. New scenarios are added to ``SCENARIOS``.
+"""
+import asyncio
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from io import StringIO
+
+import django
+from asgiref.sync import ThreadSensitiveContext, async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncClient
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from posts.models import Comment, Like, Post
+
+USERNAME_PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+
+DATASET_DEFAULTS = {
+    'users': 500,
+    'avg_following': 30,
+    'distribution': 'zipf',
+    'zipf_exponent': 1.1,
+    'posts_per_user': 5,
+    'comments_per_post': 2,
+    'likes_per_post': 5,
+    'seed': 1,
+}
+
+BATCH_SIZE = 2000
+
+
+# data generation --------------------------------------------------------
+
+def _popularity(count, distribution, exponent):
+    """Relative chance of each user (by index) being followed or liked."""
+    if distribution == 'uniform':
+        return [1.0] * count
+    if distribution == 'zipf':
+        return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+    raise ValueError(f'Unknown distribution {distribution!r}')
+
+
+def _sample(rng, population, weights, k):
+    """Up to ``k`` distinct items drawn by weight."""
+    chosen = dict.fromkeys(rng.choices(population, weights=weights, k=k * 2))
+    return list(chosen)[:k]
+
+
+def generate(stdout=None, **options):
+    """Create a synthetic dataset; returns the options used."""
+    options = {**DATASET_DEFAULTS, **{k: v for k, v in options.items() if v is not None}}
+    stdout = stdout or StringIO()
+    rng = random.Random(options['seed'])
+    User = get_user_model()
+    Follow = User.followers.through
+
+    start = User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    users = User.objects.bulk_create(
+        [User(username=f'{USERNAME_PREFIX}{start + i}', password='!') for i in range(options['users'])],
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = [user.pk for user in users]
+    Token.objects.bulk_create(
+        [Token(user_id=user_id, key=f'{rng.getrandbits(160):040x}') for user_id in user_ids],
+        batch_size=BATCH_SIZE,
+    )
+    stdout.write(f'{len(user_ids)} users')
+
+    weights = _popularity(len(user_ids), options['distribution'], options['zipf_exponent'])
+    follows = []
+    for follower_id in user_ids:
+        k = min(len(user_ids) - 1, max(0, round(rng.expovariate(1 / options['avg_following'])))) \
+            if options['avg_following'] else 0
+        for followed_id in _sample(rng, user_ids, weights, k):
+            if followed_id != follower_id:
+                # a through row (from_customuser=A, to_customuser=B) means B follows A
+                follows.append(Follow(from_customuser_id=followed_id, to_customuser_id=follower_id))
+    Follow.objects.bulk_create(follows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    stdout.write(f'{len(follows)} follows')
+
+    posts = Post.objects.bulk_create(
+        [
+            Post(author_id=user_id, title=f'Post {n} by {user_id}', content=f'Generated content {rng.random()}')
+            for user_id in user_ids for n in range(options['posts_per_user'])
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    post_ids = [post.pk for post in posts]
+    stdout.write(f'{len(post_ids)} posts')
+
+    Comment.objects.bulk_create(
+        [
+            Comment(post_id=post_id, author_id=rng.choice(user_ids), content=f'Generated comment {rng.random()}')
+            for post_id in post_ids for _ in range(options['comments_per_post'])
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    likes = [
+        Like(post_id=post_id, user_id=user_id)
+        for post_id in post_ids
+        for user_id in _sample(rng, user_ids, weights, options['likes_per_post'])
+    ]
+    Like.objects.bulk_create(likes, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    stdout.write(f'{len(post_ids) * options["comments_per_post"]} comments, {len(likes)} likes')
+
+    # bulk_create skipped counters, fan-out, indexing and trending scores
+    for command in ('reconcile_counters', 'rebuild_timelines', 'reindex_search', 'rebuild_trending'):
+        call_command(command, stdout=StringIO())
+    stdout.write('counters, timelines, search index and trending scores rebuilt')
+    return options
+
+
+# scenarios --------------------------------------------------------------
+
+class Context:
+    """Ids of the generated rows, for scenarios to pick from."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        tokens = Token.objects.filter(user__username__startswith=USERNAME_PREFIX)
+        self.tokens = dict(tokens.values_list('user_id', 'key'))
+        self.usernames = dict(tokens.values_list('user_id', 'user__username'))
+        self.user_ids = sorted(self.tokens)
+        self.post_ids = list(
+            Post.objects.filter(author_id__in=self.user_ids).order_by('pk').values_list('pk', flat=True)
+        )
+        if not self.user_ids or not self.post_ids:
+            raise ValueError('No benchmark data; run with --generate first.')
+        self._passwords_set = False
+
+    def user(self):
+        return self.rng.choice(self.user_ids)
+
+    def post(self):
+        return self.rng.choice(self.post_ids)
+
+    def credentials(self):
+        if not self._passwords_set:
+            # hashed once with the current hasher and cost, so logins verify
+            # without rehashing; generated users are created without one
+            get_user_model().objects.filter(pk__in=self.user_ids).update(password=make_password(PASSWORD))
+            self._passwords_set = True
+        return {'username': self.usernames[self.user()], 'password': PASSWORD}
+
+    def new_user(self):
+        # unique across runs on the same database, unlike the seeded rng
+        return {'username': f'{USERNAME_PREFIX}r{uuid.uuid4().hex[:16]}', 'password': PASSWORD}
+
+
+# name -> function(context) returning (user_id, method, path[, data]);
+# requests with user_id None are sent unauthenticated
+SCENARIOS = {
+    'feed': lambda ctx: (ctx.user(), 'get', '/api/feed/'),
+    'post_list': lambda ctx: (ctx.user(), 'get', '/api/posts/'),
+    'post_detail': lambda ctx: (ctx.user(), 'get', f'/api/posts/{ctx.post()}/'),
+    'like': lambda ctx: (ctx.user(), 'post', f'/api/posts/{ctx.post()}/like/'),
+    'unlike': lambda ctx: (ctx.user(), 'post', f'/api/posts/{ctx.post()}/unlike/'),
+    'follow': lambda ctx: (ctx.user(), 'post', f'/api/accounts/follow/{ctx.user()}/'),
+    'unfollow': lambda ctx: (ctx.user(), 'post', f'/api/accounts/unfollow/{ctx.user()}/'),
+    'trending': lambda ctx: (ctx.user(), 'get', '/api/posts/trending/?window=day'),
+    'async_feed': lambda ctx: (ctx.user(), 'get', '/api/async/feed/'),
+    'async_post_list': lambda ctx: (ctx.user(), 'get', '/api/async/posts/'),
+    'async_post_detail': lambda ctx: (ctx.user(), 'get', f'/api/async/posts/{ctx.post()}/'),
+    'async_like': lambda ctx: (ctx.user(), 'post', f'/api/async/posts/{ctx.post()}/like/'),
+    'login': lambda ctx: (None, 'post', '/api/accounts/login/', ctx.credentials()),
+    'register': lambda ctx: (None, 'post', '/api/accounts/register/', ctx.new_user()),
+}
+HASHING_SCENARIOS = ('login', 'register')
+
+INTERFACES = ('wsgi', 'asgi')
+
+
+@contextmanager
+def count_queries():
+    counter = {'queries': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    # replicas included, so routed reads are counted too
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield counter
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _issue(context, plan, samples):
+    """Send ``plan``'s requests from one client; appends (ms, queries, status) to ``samples``."""
+    # record server errors as 500s instead of aborting the run
+    client = APIClient(raise_request_exception=False)
+    for user_id, method, path, *data in plan:
+        if user_id is None:
+            client.credentials()
+        else:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {context.tokens[user_id]}')
+        with count_queries() as counter:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, *data, secure=True)
+            elapsed = time.perf_counter() - started
+        samples.append((elapsed * 1000, counter['queries'], response.status_code))
+
+
+def _issue_in_thread(context, plan, samples):
+    try:
+        _issue(context, plan, samples)
+    finally:
+        connections.close_all()
+
+
+async def _issue_async(context, plan, samples, isolate):
+    """``_issue`` through the ASGI handler; ``isolate`` gives each request its own sync thread."""
+    client = AsyncClient(raise_request_exception=False)
+    for user_id, method, path, *data in plan:
+        headers = {} if user_id is None else {'Authorization': f'Token {context.tokens[user_id]}'}
+        started = time.perf_counter()
+        if isolate:
+            async with ThreadSensitiveContext():
+                response = await getattr(client, method)(path, *data, secure=True, headers=headers)
+                # the request's thread goes away with its context; don't leave its connection behind
+                await sync_to_async(connections.close_all)()
+        else:
+            response = await getattr(client, method)(path, *data, secure=True, headers=headers)
+        samples.append(((time.perf_counter() - started) * 1000, None, response.status_code))
+
+
+@async_to_sync
+async def _run_asgi(context, plan, samples, concurrency):
+    await asyncio.gather(*(
+        _issue_async(context, plan[i::concurrency], samples, concurrency > 1) for i in range(concurrency)
+    ))
+
+
+def run_scenario(name, context, requests=200, warmup=20, concurrency=1, interface='wsgi'):
+    build = SCENARIOS[name]
+    plan = [build(context) for _ in range(warmup)]
+    if interface == 'asgi':
+        _run_asgi(context, plan, [], concurrency)
+    else:
+        _issue(context, plan, [])
+    plan = [build(context) for _ in range(requests)]
+    samples = []
+    started = time.perf_counter()
+    if interface == 'asgi':
+        _run_asgi(context, plan, samples, concurrency)
+    elif concurrency == 1:
+        _issue(context, plan, samples)
+    else:
+        threads = [
+            threading.Thread(target=_issue_in_thread, args=(context, plan[i::concurrency], samples))
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall = time.perf_counter() - started
+
+    timings = sorted(ms for ms, _, _ in samples)
+    queries = [count for _, count, _ in samples if count is not None]
+    statuses = Counter(str(status) for _, _, status in samples)
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'interface': interface,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'throughput_rps': round(len(samples) / wall, 1),
+        'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def hash_rate(threads=1, duration=2.0):
+    """Passwords hashed per second by ``threads`` threads with the current hasher.
+
+    The hashers release the GIL while hashing, so this shows how hashing
+    scales with worker threads on this machine.
+    """
+    make_password(PASSWORD)  # load the hasher's library outside the timing
+    counts = []
+    deadline = time.perf_counter() + duration
+
+    def work():
+        count = 0
+        while time.perf_counter() < deadline:
+            make_password(PASSWORD)
+            count += 1
+        counts.append(count)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return round(sum(counts) / (time.perf_counter() - started), 1)
+
+
+def run(scenarios=None, requests=200, warmup=20, seed=1, concurrency=1, interface='wsgi'):
+    context = Context(seed)
+    return {
+        name: run_scenario(name, context, requests, warmup, concurrency, interface)
+        for name in scenarios or SCENARIOS
+    }
+
+
+# report -----------------------------------------------------------------
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def report(results, dataset=None, **params):
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'database_options': connection.settings_dict.get('OPTIONS') or {},
+            **params,
+        },
+        'dataset': dataset,
+        'scenarios': results,
+    }
+
+
+def write_report(data, path):
+    with open(path, 'w', encoding='utf-8') as out:
+        json.dump(data, out, indent=2, sort_keys=True)
+        out.write('\n')
@@ -0,0 +1,43 @@
+"""
+Helpers for denormalized counter columns.
+
+Counters are only ever changed with a single ``UPDATE ... SET n = n + d``
+so concurrent requests cannot lose increments, and are clamped at zero so a
+drifted counter never trips the ``PositiveIntegerField`` check constraint.
+``manage.py reconcile_counters`` recomputes them from the source tables.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import response_cache
+
+
+def adjust_counters(model, pk, **deltas):
+    """Atomically add ``deltas`` (``field=+1/-1``) to the row ``pk`` of ``model``."""
+    adjust_counters_many(model, [pk], **deltas)
+
+
+def adjust_counters_many(model, pks, **deltas):
+    """Like ``adjust_counters`` for several rows in one ``UPDATE``."""
+    pks = list(pks)
+    updates = {
+        field: Greatest(F(field) + Value(delta), Value(0))
+        for field, delta in deltas.items()
+        if delta
+    }
+    if updates and pks:
+        model._default_manager.filter(pk__in=pks).update(**updates)
+        # UPDATE sends no post_save, so invalidate cached payloads by hand
+        response_cache.bump(model, *pks)
+
+
+def count_subquery(model, fk, **filters):
+    """Correlated ``COUNT(*)`` of ``model`` rows whose ``fk`` points at the outer row."""
+    rows = (
+        model._default_manager.filter(**{fk: OuterRef('pk')}, **filters)
+        .order_by()
+        .values(fk)
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return Coalesce(Subquery(rows), Value(0))
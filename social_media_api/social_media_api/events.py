@@ -0,0 +1,355 @@
+"""
+Publish/subscribe of realtime events to connected users.
+
+Code that changes what a user sees publishes an event on that user's channel
+(``publish([user_channel(pk)], 'notification', data)``, usually from a
+``transaction.on_commit`` callback); the server-sent-events endpoint in
+social_media_api/sse.py subscribes to the channel and streams the events.
+
+Every event gets an id from one increasing sequence, seeded from the clock so
+ids keep increasing across restarts. Each channel keeps its last
+``BUFFER_SIZE`` events so a client reconnecting with ``Last-Event-ID`` gets
+what it missed; when the id is older than the buffer reaches back, the
+subscriber is told to reset (reload through the REST API) instead.
+
+Publishing never blocks on subscribers. Each subscriber has a queue of at
+most ``QUEUE_SIZE`` events; a subscriber that falls that far behind (a slow
+client whose socket stopped draining) is cut off with an overflow marker and
+resumes from the buffer when it reconnects.
+
+``LocalBroker`` delivers within one process. With several worker processes
+use ``CacheBroker``: events go through a shared Django cache (Redis,
+Memcached) that every process polls.
+
+Settings (all optional):
+
+    EVENTS = {
+        'BROKER': 'social_media_api.events.LocalBroker',   # or '...CacheBroker'
+        'BUFFER_SIZE': 100,     # events kept per channel for Last-Event-ID
+        'QUEUE_SIZE': 500,      # events a subscriber may fall behind before it is cut off
+        'MAX_CHANNELS': 10000,  # idle channels beyond this lose their buffer
+        'HEARTBEAT': 15,        # seconds between keep-alive comments
+        'RETRY_MS': 3000,       # reconnection delay suggested to clients; the polling interval under WSGI
+        'CACHE_ALIAS': 'default',  # CacheBroker
+        'POLL_INTERVAL': 0.25,     # CacheBroker: seconds between polls
+        'TTL': 300,                # CacheBroker: seconds an event stays in the cache
+    }
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BROKER': 'social_media_api.events.LocalBroker',
+    'BUFFER_SIZE': 100,
+    'QUEUE_SIZE': 500,
+    'MAX_CHANNELS': 10000,
+    'HEARTBEAT': 15,
+    'RETRY_MS': 3000,
+    'CACHE_ALIAS': 'default',
+    'POLL_INTERVAL': 0.25,
+    'TTL': 300,
+}
+
+# ``data`` is already JSON-encoded, once per publish
+Event = namedtuple('Event', 'id kind data')
+
+
+def events_settings():
+    return {**DEFAULTS, **getattr(settings, 'EVENTS', {})}
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def _clock_id():
+    return time.time_ns() // 1000
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Subscription:
+    """One subscriber's bounded queue of events on one channel."""
+
+    def __init__(self, channel, max_queue, after=None):
+        self.channel = channel
+        self.max_queue = max_queue
+        # events up to this id were replayed already
+        self.after = after
+        self.closed = False
+        self.overflowed = False
+        self._events = deque()
+        self._condition = threading.Condition()
+        self._waiters = []
+
+    def put(self, event):
+        """Queue ``event``; called by the broker and never blocks it."""
+        with self._condition:
+            if self.closed or (self.after is not None and event.id <= self.after):
+                return
+            if len(self._events) >= self.max_queue:
+                self._events.clear()
+                self.overflowed = True
+                self.closed = True
+            else:
+                self._events.append(event)
+            self._notify()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._notify()
+
+    def _notify(self):
+        self._condition.notify_all()
+        waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # the subscriber's event loop has shut down
+                pass
+
+    def _drain(self):
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+    def get(self, timeout):
+        """The queued events, waiting up to ``timeout`` seconds for one; ``[]`` on timeout."""
+        with self._condition:
+            if not self._events and not self.closed:
+                self._condition.wait(timeout)
+            return self._drain()
+
+    async def aget(self, timeout):
+        """``get`` for async code: waits on the event loop instead of a thread."""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self._events or self.closed:
+                return self._drain()
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._waiters = [(waiter_loop, waiter) for waiter_loop, waiter in self._waiters
+                                 if waiter is not future]
+        with self._condition:
+            return self._drain()
+
+
+class Channel:
+    def __init__(self, floor, buffer_size):
+        # every event of this channel with a larger id is still in the buffer
+        self.floor = floor
+        self.buffer = deque(maxlen=buffer_size)
+        self.subscribers = set()
+
+
+class LocalBroker:
+    """Delivers events to subscribers in this process."""
+
+    def __init__(self, options):
+        self.buffer_size = options['BUFFER_SIZE']
+        self.queue_size = options['QUEUE_SIZE']
+        self.max_channels = options['MAX_CHANNELS']
+        self.seq = self.floor = _clock_id()
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def publish(self, channels, kind, data):
+        """Send ``data`` (JSON-serializable) to every channel in ``channels``."""
+        payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+        with self._lock:
+            self.seq += 1
+            # under the lock, so every channel sees events in id order
+            self._dispatch(Event(self.seq, kind, payload), channels)
+
+    def subscribe(self, channel, last_event_id=None):
+        """Returns the ``Subscription`` and the events after ``last_event_id``.
+
+        The events are ``None`` when the buffer no longer reaches back to
+        ``last_event_id`` and the client has to reload its state.
+        """
+        with self._lock:
+            state = self._channel(channel)
+            replay = self._replay(state, last_event_id)
+            subscription = Subscription(channel, self.queue_size, last_event_id if replay is not None else None)
+            state.subscribers.add(subscription)
+        return subscription, replay
+
+    def replay(self, channel, last_event_id=None):
+        """The events after ``last_event_id`` as in ``subscribe``, without subscribing,
+        and the id of the latest event published so far."""
+        with self._lock:
+            return self._replay(self._channel(channel), last_event_id), self.seq
+
+    def _replay(self, state, last_event_id):
+        if last_event_id is None:
+            return []
+        if last_event_id < state.floor:
+            return None
+        return [event for event in state.buffer if event.id > last_event_id]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            state = self._channels.get(subscription.channel)
+            if state is not None:
+                state.subscribers.discard(subscription)
+        subscription.close()
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(state.subscribers) for state in self._channels.values())
+
+    def _dispatch(self, event, channels):
+        for name in channels:
+            state = self._channel(name)
+            if len(state.buffer) == state.buffer.maxlen:
+                state.floor = state.buffer[0].id
+            state.buffer.append(event)
+            for subscription in state.subscribers:
+                subscription.put(event)
+
+    def _channel(self, name):
+        state = self._channels.get(name)
+        if state is not None:
+            self._channels.move_to_end(name)
+            return state
+        if len(self._channels) >= self.max_channels:
+            self._evict()
+        state = self._channels[name] = Channel(self.floor, self.buffer_size)
+        return state
+
+    def _evict(self):
+        idle = [name for name, state in self._channels.items() if not state.subscribers]
+        for name in idle[:max(1, len(idle) // 10)]:
+            del self._channels[name]
+        # an evicted channel's events are gone; channels created from now on
+        # can only vouch for events after this point
+        self.floor = self.seq
+
+
+class CacheBroker(LocalBroker):
+    """Shares events across processes through a Django cache.
+
+    Publishing stores the event under the next id of a sequence kept in the
+    cache; a thread per process polls the sequence every ``POLL_INTERVAL``
+    and hands new events to the local subscribers and buffers, so delivery
+    takes up to one interval. The cache must be shared (Redis, Memcached)
+    and support atomic ``incr``.
+    """
+    seq_key = 'events:seq'
+    # an id that was taken but whose event is still missing after this long
+    # is skipped (the publisher died between incr() and set())
+    missing_grace = 2.0
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.cache = caches[options['CACHE_ALIAS']]
+        self.poll_interval = options['POLL_INTERVAL']
+        self.ttl = options['TTL']
+        self.cache.add(self.seq_key, _clock_id(), None)
+        self.seq = self.floor = self.cache.get(self.seq_key, self.seq)
+        self._missing_since = None
+        self._poller = None
+        self._poller_lock = threading.Lock()
+
+    def event_key(self, event_id):
+        return f'events:e:{event_id}'
+
+    def publish(self, channels, kind, data):
+        payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+        try:
+            event_id = self.cache.incr(self.seq_key)
+        except ValueError:
+            # the sequence was evicted; restart it from the clock
+            self.cache.add(self.seq_key, _clock_id(), None)
+            event_id = self.cache.incr(self.seq_key)
+        self.cache.set(self.event_key(event_id), (list(channels), kind, payload), self.ttl)
+
+    def subscribe(self, channel, last_event_id=None):
+        self._ensure_polling()
+        return super().subscribe(channel, last_event_id)
+
+    def replay(self, channel, last_event_id=None):
+        self._ensure_polling()
+        return super().replay(channel, last_event_id)
+
+    def _ensure_polling(self):
+        with self._poller_lock:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_forever, name='events-poller', daemon=True)
+                self._poller.start()
+
+    def _poll_forever(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Polling for events failed')
+
+    def poll(self):
+        """Deliver events published since the last poll; returns how many."""
+        latest = self.cache.get(self.seq_key)
+        if latest is None or latest <= self.seq:
+            return 0
+        first = max(self.seq + 1, latest - self.buffer_size + 1)
+        found = self.cache.get_many([self.event_key(event_id) for event_id in range(first, latest + 1)])
+        delivered = 0
+        with self._lock:
+            if first > self.seq + 1:
+                # too far behind to catch up; older events can't be replayed here
+                self.floor = first - 1
+            for event_id in range(first, latest + 1):
+                entry = found.get(self.event_key(event_id))
+                if entry is None:
+                    now = time.monotonic()
+                    self._missing_since = self._missing_since or now
+                    if now - self._missing_since < self.missing_grace:
+                        break
+                else:
+                    channels, kind, payload = entry
+                    self._dispatch(Event(event_id, kind, payload), channels)
+                    delivered += 1
+                self._missing_since = None
+                self.seq = event_id
+        return delivered
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    options = events_settings()
+    return import_string(options['BROKER'])(options)
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    if setting == 'EVENTS':
+        get_broker.cache_clear()
+
+
+def publish(channels, kind, data):
+    get_broker().publish(channels, kind, data)
@@ -0,0 +1,55 @@
+"""
+Sparse fieldsets for read requests.
+
+``?fields=id,title`` keeps only the named top-level fields and ``?expand=name``
+asks for the full form of a field a serializer renders compactly by default.
+Both only apply to the serializer at the root of a GET/HEAD response (or the
+child of a root ``many=True`` list); nested serializers and writes always use
+every field.
+
+Trimming happens in ``get_fields()``, so ``plan_queryset`` only joins and
+prefetches what is still rendered; model columns behind dropped fields are
+listed in ``pruned_fields`` and deferred by the planner.
+"""
+from rest_framework import serializers
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def _query_list(request, param):
+    value = request.query_params.get(param) if request is not None else None
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    @property
+    def is_list_item(self):
+        return isinstance(self.parent, serializers.ListSerializer)
+
+    def is_response_root(self):
+        parent = self.parent.parent if self.is_list_item else self.parent
+        request = self.context.get('request')
+        return parent is None and request is not None and request.method in SAFE_METHODS
+
+    def is_expanded(self, name):
+        if not self.is_response_root():
+            return False
+        return name in (_query_list(self.context['request'], self.expand_query_param) or ())
+
+    def get_fields(self):
+        fields = super().get_fields()
+        self.pruned_fields = []
+        if not self.is_response_root():
+            return fields
+        wanted = _query_list(self.context['request'], self.fields_query_param)
+        if wanted:
+            # unknown names are ignored rather than rejected
+            self.pruned_fields = [name for name in fields if name not in wanted]
+            for name in self.pruned_fields:
+                del fields[name]
+        return fields
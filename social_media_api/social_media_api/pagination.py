@@ -0,0 +1,214 @@
+"""
+Keyset (cursor) pagination.
+
+Each page is fetched with a ``WHERE (key) > (cursor) ORDER BY key LIMIT n``
+seek instead of an OFFSET, so page 1000 costs the same as page 1 as long as
+the ordering is backed by an index. The cursor is an opaque, url-safe token
+holding the key of the last (or first, when paging backwards) row.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Must be unique across rows; end with the primary key as a tiebreaker.
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # cursor encoding -----------------------------------------------------
+
+    def encode_cursor(self, values, reverse=False):
+        payload = {'v': [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def read_cursor(self, request):
+        """Return the raw ``(values, reverse)`` from the request, or ``None`` when absent."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw)
+            values = payload['v']
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(payload.get('r'))
+
+    def decode_cursor(self, request, model):
+        """Like ``read_cursor``, with values converted by the ordering fields of ``model``."""
+        cursor = self.read_cursor(request)
+        if cursor is None:
+            return None
+        values, reverse = cursor
+        try:
+            values = [
+                model._meta.get_field(self.field_name(field)).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    # querying ------------------------------------------------------------
+
+    @staticmethod
+    def field_name(field):
+        return field.lstrip('-')
+
+    def keyset_filter(self, values, reverse=False):
+        """Rows strictly after ``values`` in ordering (before, if ``reverse``)."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = self.field_name(field)
+            descending = field.startswith('-') != reverse
+            term = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for prev_field, prev_value in zip(self.ordering[:i], values[:i]):
+                term &= Q(**{self.field_name(prev_field): prev_value})
+            condition |= term
+        return condition
+
+    def row_key(self, row):
+        return [getattr(row, self.field_name(field)) for field in self.ordering]
+
+    def page_queryset(self, queryset, request):
+        """The seek for the requested page, one row longer to detect more pages."""
+        self.request = request
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = False
+        if cursor is not None:
+            values, reverse = cursor
+            queryset = queryset.filter(self.keyset_filter(values, reverse))
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        self._page = (size, cursor is not None, reverse)
+        return queryset.order_by(*ordering)[:size + 1]
+
+    def finish_page(self, rows):
+        """Trim the rows fetched from ``page_queryset`` to the page and set the link keys."""
+        size, has_cursor, reverse = self._page
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+
+        # In reverse mode "more" means more rows before this page.
+        self.has_next = (has_cursor and reverse) or (has_more and not reverse)
+        self.has_previous = (has_cursor and not reverse) or (has_more and reverse)
+        self.next_key = self.row_key(rows[-1]) if rows and self.has_next else None
+        self.previous_key = self.row_key(rows[0]) if rows and self.has_previous else None
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, fetching the page with the async ORM."""
+        return self.finish_page([row async for row in self.page_queryset(queryset, request)])
+
+    # links ---------------------------------------------------------------
+
+    def cursor_link(self, values, reverse=False):
+        if values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        return self.cursor_link(self.next_key)
+
+    def get_previous_link(self):
+        return self.cursor_link(self.previous_key, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """Newest first, keyed on ``(created_at, id)``."""
+    ordering = ('-created_at', '-id')
+
+
+class OldestFirstKeysetPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+
+
+class IdKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class TimelinePagination(CreatedAtKeysetPagination):
+    """Forward-only paging over ``(created_at, post_id, author_id)`` timeline entries."""
+
+    def paginate_entries(self, read, request, model):
+        """``read(limit, before)`` must return entries newest first."""
+        self.request = request
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, model)
+        entries = read(size + 1, tuple(cursor[0]) if cursor else None)
+        self.next_key = list(entries[size - 1][:2]) if len(entries) > size else None
+        self.previous_key = None
+        return entries[:size]
+
+
+class SearchPagination(KeysetPagination):
+    """Forward-only paging over search hits ordered by ``(rank, key)``."""
+    ordering = ('rank', 'key')
+    max_page_size = 100
+
+    def paginate_hits(self, read, request):
+        """``read(limit, after)`` must return hits best first."""
+        self.request = request
+        size = self.get_page_size(request)
+        cursor = self.read_cursor(request)
+        after = None
+        if cursor is not None:
+            try:
+                after = (float(cursor[0][0]), int(cursor[0][1]))
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        hits = read(size + 1, after)
+        self.next_key = [hits[size - 1].rank, hits[size - 1].key] if len(hits) > size else None
+        self.previous_key = None
+        return hits[:size]
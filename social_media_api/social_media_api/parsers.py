@@ -0,0 +1,61 @@
+"""
+Newline-delimited JSON (``application/x-ndjson``) request parsing.
+
+Importers can stream one JSON object per line instead of building one large
+array; the body is decoded a line at a time, and a malformed line is reported
+by its line number.
+
+Limits on the number of items and on the body size are enforced while reading,
+so an oversized body is rejected after ``max_bytes`` rather than read whole.
+"""
+import json
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body too large.'
+    default_code = 'request_too_large'
+
+
+class NDJSONParser(BaseParser):
+    media_type = 'application/x-ndjson'
+    # None: unlimited
+    max_items = None
+    max_bytes = None
+
+    def get_limits(self, parser_context):
+        """Returns ``(max_items, max_bytes)``; override to read them from settings."""
+        return self.max_items, self.max_bytes
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Returns a list with one item per non-blank line."""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_items, max_bytes = self.get_limits(parser_context)
+        remaining = max_bytes
+        items = []
+        number = 0
+        while True:
+            # one byte past the limit is enough to tell the body is too large
+            line = stream.readline() if remaining is None else stream.readline(remaining + 1)
+            if not line:
+                return items
+            number += 1
+            if remaining is not None:
+                remaining -= len(line)
+                if remaining < 0:
+                    raise RequestTooLarge(f'NDJSON bodies are limited to {max_bytes} bytes.')
+            line = line.strip()
+            if not line:
+                continue
+            if max_items is not None and len(items) >= max_items:
+                raise ParseError(f'At most {max_items} items per request.')
+            try:
+                items.append(json.loads(line.decode(encoding)))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number} - {exc}')
@@ -0,0 +1,157 @@
+"""
+Serializer-driven query planning.
+
+``plan_queryset(queryset, SerializerClass)`` walks the serializer's declared
+fields and adds the ``select_related`` / ``prefetch_related``
+calls needed to render it without a query per row:
+
+* dotted sources (``source='author.username'``) through foreign keys become
+  ``select_related('author')``; through to-many relations, a prefetch;
+* nested serializers are joined (single) or prefetched with a ``Prefetch``
+  whose queryset is planned recursively (``many=True``);
+* to-many ``PrimaryKeyRelatedField`` lists are prefetched.
+
+Relation sizes come from denormalized counter columns (see ``counters.py``),
+so there is nothing to count here.
+
+Columns behind fields a sparse fieldset dropped (``serializer.pruned_fields``,
+see ``fieldsets.py``) are deferred.
+
+Fields the planner cannot see through (``SerializerMethodField``, properties)
+can be covered with ``Meta.select_related`` / ``Meta.prefetch_related`` hints,
+or by giving the field a ``prefetch_lookups(prefix)`` method that returns
+``Prefetch`` objects.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class Plan:
+    def __init__(self):
+        self.select = set()
+        self.prefetch = {}
+
+    def add_prefetch(self, path, lookup=None):
+        # a planned Prefetch object wins over a bare path
+        if lookup is not None or path not in self.prefetch:
+            self.prefetch[path] = lookup or path
+
+
+def _relation_path(model, attrs):
+    """Split ``attrs`` into the longest joinable prefix and an optional to-many hop.
+
+    Returns ``(select_path, prefetch_path, model_at_end)``.
+    """
+    joined = []
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation:
+            break
+        if field.many_to_many or field.one_to_many:
+            return '__'.join(joined), '__'.join(joined + [attr]), field.related_model
+        joined.append(attr)
+        model = field.related_model
+    return '__'.join(joined), None, model
+
+
+def _deferrable(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return field.concrete and not field.is_relation and not field.primary_key
+
+
+def _join(prefix, path):
+    return f'{prefix}__{path}' if prefix and path else prefix or path
+
+
+def _plan_fields(serializer, model, plan, prefix=''):
+    meta = getattr(serializer, 'Meta', None)
+    for path in getattr(meta, 'select_related', ()):
+        plan.select.add(_join(prefix, path))
+    for path in getattr(meta, 'prefetch_related', ()):
+        plan.add_prefetch(_join(prefix, path))
+
+    for field in serializer.fields.values():
+        if hasattr(field, 'prefetch_lookups'):
+            for lookup in field.prefetch_lookups(prefix):
+                plan.add_prefetch(lookup.prefetch_to, lookup)
+            continue
+        if field.write_only or field.source == '*':
+            continue
+        attrs = field.source_attrs
+
+        if isinstance(field, serializers.ListSerializer):
+            select_path, many_path, related_model = _relation_path(model, attrs)
+            if many_path is None:
+                continue
+            child = field.child
+            if isinstance(child, serializers.ModelSerializer) and not select_path:
+                nested = plan_queryset(child.Meta.model._default_manager.all(), child)
+                plan.add_prefetch(_join(prefix, many_path), Prefetch(_join(prefix, many_path), queryset=nested))
+            else:
+                plan.add_prefetch(_join(prefix, many_path))
+            continue
+
+        if isinstance(field, serializers.ManyRelatedField):
+            _, many_path, _ = _relation_path(model, attrs)
+            if many_path:
+                plan.add_prefetch(_join(prefix, many_path))
+            continue
+
+        # Nested single object: join it and plan its own fields behind the join.
+        if isinstance(field, serializers.ModelSerializer):
+            select_path, many_path, related_model = _relation_path(model, attrs)
+            if select_path and many_path is None:
+                plan.select.add(_join(prefix, select_path))
+                _plan_fields(field, related_model, plan, _join(prefix, select_path))
+            continue
+
+        if len(attrs) > 1:
+            select_path, many_path, _ = _relation_path(model, attrs[:-1])
+            if select_path:
+                plan.select.add(_join(prefix, select_path))
+            if many_path:
+                plan.add_prefetch(_join(prefix, many_path))
+
+
+def plan_queryset(queryset, serializer):
+    """Return ``queryset`` with the joins and prefetches ``serializer`` needs.
+
+    ``serializer`` may be a serializer class or instance.
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    plan = Plan()
+    _plan_fields(serializer, queryset.model, plan)
+    if plan.select:
+        queryset = queryset.select_related(*sorted(plan.select))
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*plan.prefetch.values())
+    # ordering columns stay loaded; paginators read them from the rows
+    ordering = {name.lstrip('-') for name in [*queryset.query.order_by, *queryset.model._meta.ordering]}
+    deferred = [
+        name for name in getattr(serializer, 'pruned_fields', ())
+        if name not in ordering and _deferrable(queryset.model, name)
+    ]
+    if deferred:
+        queryset = queryset.defer(*deferred)
+    return queryset
+
+
+class PlannedQuerysetMixin:
+    """Generic view mixin that plans ``get_queryset()`` for the view's serializer."""
+
+    def get_queryset(self):
+        # plan for a serializer bound to this request, since fields may vary
+        # per request and between list and detail representations
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        return plan_queryset(super().get_queryset(), self.get_serializer(many=lookup not in self.kwargs))
@@ -0,0 +1,89 @@
+"""
+NDJSON, CSV and server-sent-event renderers that can also stream.
+
+``render()`` serves ordinary DRF responses (including error payloads) in these
+formats; ``stream(rows, fields)`` yields the encoded body incrementally for a
+``StreamingHttpResponse``, so a large export is never held in memory. Rows are
+dicts keyed by ``fields``; output is grouped into chunks of ``rows_per_chunk``
+rows to keep the number of writes down.
+"""
+import csv
+import io
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def _rows(data):
+    if data is None:
+        return []
+    return [data] if isinstance(data, dict) else list(data)
+
+
+class StreamingRenderer(BaseRenderer):
+    charset = 'utf-8'
+    rows_per_chunk = 500
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = _rows(data)
+        fields = list(rows[0]) if rows else []
+        return ''.join(self.stream(rows, fields)).encode(self.charset)
+
+    def stream(self, rows, fields):
+        raise NotImplementedError
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def stream(self, rows, fields):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        lines = []
+        for row in rows:
+            lines.append(encoder.encode({field: row[field] for field in fields}))
+            if len(lines) >= self.rows_per_chunk:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    @staticmethod
+    def cell(value):
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def stream(self, rows, fields):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        count = 0
+        for row in rows:
+            writer.writerow([self.cell(row[field]) for field in fields])
+            count += 1
+            if count % self.rows_per_chunk == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """``text/event-stream`` frames; ``render()`` sends an error payload as an ``error`` event."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    @staticmethod
+    def frame(kind, data, event_id=None):
+        """One event; ``data`` is a JSON string (a single line)."""
+        head = f'id: {event_id}\n' if event_id is not None else ''
+        return f'{head}event: {kind}\ndata: {data}\n\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        payload = JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode(data)
+        return self.frame('error', payload).encode(self.charset)
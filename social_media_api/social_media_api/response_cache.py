@@ -0,0 +1,148 @@
+"""
+Response caching with write-driven invalidation.
+
+Every registered model has a *version stamp* per table and per row, kept in
+the cache and replaced on ``post_save``/``post_delete`` (and by
+``adjust_counters``, whose ``UPDATE``s send no signals). A cached response
+is keyed by the URL plus the stamps it depends on, so a write makes the old
+entries unreachable instead of having to find and delete them.
+
+Stamps are replaced when the write commits (``transaction.on_commit``), not
+when it runs. A reader in between would otherwise cache the old rows under
+the new stamp, where they would stay until the next write.
+
+The ETag is derived from the same key, which means a matching
+``If-None-Match`` is answered with 304 before the ORM or the serializer run.
+
+Settings (optional):
+
+    RESPONSE_CACHE = {
+        'ALIAS': 'default',   # any CACHES alias; point it at Redis/Memcached to share across workers
+        'TIMEOUT': 300,
+    }
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# model -> callable(instance) returning [(parent_model, parent_pk), ...]
+_registry = {}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[cache_settings()['ALIAS']]
+
+
+def _version_key(model, pk=None):
+    label = model._meta.label_lower
+    return f'rc:v:{label}' if pk is None else f'rc:v:{label}:{pk}'
+
+
+def versions(keys):
+    """Current stamps for ``keys`` (``model`` or ``(model, pk)``), creating missing ones."""
+    cache = get_cache()
+    names = [_version_key(*key) if isinstance(key, tuple) else _version_key(key) for key in keys]
+    found = cache.get_many(names)
+    missing = {name: uuid.uuid4().hex for name in names if name not in found}
+    if missing:
+        # add() so a concurrent first reader doesn't overwrite a fresh bump
+        for name, stamp in missing.items():
+            if not cache.add(name, stamp, None):
+                stamp = cache.get(name, stamp)
+            found[name] = stamp
+    return [found[name] for name in names]
+
+
+def bump(model, *pks):
+    """Invalidate cached responses depending on ``model`` (and rows ``pks``) once the write commits."""
+    names = [_version_key(model)] + [_version_key(model, pk) for pk in pks]
+    transaction.on_commit(
+        lambda: get_cache().set_many({name: uuid.uuid4().hex for name in names}, None), robust=True,
+    )
+
+
+def _on_change(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    # logins only touch last_login, which no cached payload exposes
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump(sender, instance.pk)
+    parents = _registry.get(sender)
+    if parents:
+        for parent_model, parent_pk in parents(instance):
+            if parent_pk is not None:
+                bump(parent_model, parent_pk)
+
+
+def register(model, parents=None):
+    """Track writes to ``model``; ``parents(instance)`` names rows whose payloads embed it."""
+    _registry[model] = parents
+    uid = f'response_cache:{model._meta.label_lower}'
+    post_save.connect(_on_change, sender=model, dispatch_uid=uid)
+    post_delete.connect(_on_change, sender=model, dispatch_uid=uid)
+
+
+class CachedResponseMixin:
+    """Caches ``list()``/``retrieve()`` of a DRF generic view or viewset.
+
+    ``cache_dependencies`` lists the models a list response is built from;
+    a retrieve depends on the row's own stamp (embedded rows reach it via
+    ``register(..., parents=...)``). Set ``cache_vary_on_user`` when the
+    payload differs per user.
+    """
+    cache_dependencies = ()
+    cache_vary_on_user = False
+
+    def list(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        dependencies = list(dict.fromkeys([model, *self.cache_dependencies]))
+        return self.cached_response(request, dependencies, lambda: super(CachedResponseMixin, self).list(
+            request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_response(request, [(model, pk)], lambda: super(CachedResponseMixin, self).retrieve(
+            request, *args, **kwargs))
+
+    def cache_key(self, request, dependencies):
+        parts = [request.build_absolute_uri(), request.accepted_renderer.format or '']
+        if self.cache_vary_on_user:
+            parts.append(str(request.user.pk))
+        parts.extend(versions(dependencies))
+        return 'rc:r:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def cached_response(self, request, dependencies, build):
+        cache = get_cache()
+        key = self.cache_key(request, dependencies)
+        etag = f'W/"{key[5:]}"'
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(key)
+            if data is None:
+                response = build()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, cache_settings()['TIMEOUT'])
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache' if self.cache_vary_on_user else 'no-cache'
+        return response
@@ -10,11 +10,17 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The repository root, home of the labtools package the projects share
+sys.path.append(str(BASE_DIR.parent))
+
+from labtools.sqlite import TUNED_OPTIONS  # noqa: E402
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -40,11 +46,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',
     'accounts',
     'posts',
-    'django-filter',
+    'django_filters',
     'notifications',
-    'django.contrib.contenttypes',
+    # shared management commands (sync_replicas, check_query_plans), see labtools/
+    'labtools',
 ]
 
 # custom user model
@@ -54,13 +62,130 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 # DRF settings (enable TokenAuthentication)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-    'rest_framework.authentication.TokenAuthentication',
+    # TokenAuthentication with cached lookups, see accounts/authentication.py
+    'accounts.authentication.CachingTokenAuthentication',
     'rest_framework.authentication.SessionAuthentication',
-    'DjangoFilterBackend'
+],
+    'DEFAULT_FILTER_BACKENDS': [
+    'django_filters.rest_framework.DjangoFilterBackend',
 ],
     'DEFAULT_PERMISSION_CLASSES': [
     'rest_framework.permissions.IsAuthenticatedOrReadOnly',
 ],
+    # keyset paginators live in social_media_api/pagination.py; views pick
+    # the one matching their ordering
+    'DEFAULT_PAGINATION_CLASS': 'social_media_api.pagination.IdKeysetPagination',
+    'PAGE_SIZE': 50,
+    # sliding-window limits for views with a throttle_scope, see
+    # social_media_api/throttling.py; a scope without a rate is unlimited
+    'DEFAULT_THROTTLE_CLASSES': [
+        'social_media_api.throttling.ScopedUserThrottle',
+        'social_media_api.throttling.ScopedIPThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'like_user': '120/min',
+        'follow_user': '60/min',
+        'bulk_user': '30/min',
+        'login_ip': '20/min',
+        'register_ip': '10/hour',
+    },
+}
+
+# Where throttle counters live: 'memory' (per process) or 'cache' (shared
+# through CACHES[CACHE_ALIAS], e.g. Redis, for one limit across workers)
+THROTTLING = {
+    'STORE': 'memory',
+    'CACHE_ALIAS': 'default',
+}
+
+# Token lookup cache, expiry and rotation (see accounts/authentication.py);
+# STORE 'cache' shares entries, and evictions, across workers
+TOKEN_AUTH = {
+    'STORE': 'memory',
+    'TTL': 300,
+    'EXPIRY': None,
+    'ROTATE_AFTER': None,
+}
+
+# Realtime events for /api/events/ (see social_media_api/events.py); use the
+# CacheBroker with a shared cache when running several worker processes
+EVENTS = {
+    'BROKER': os.environ.get('DJANGO_EVENTS_BROKER', 'social_media_api.events.LocalBroker'),
+    'HEARTBEAT': 15,
+}
+
+
+# Request profiling: Server-Timing headers, sampled query logs and cProfile dumps
+PROFILING = {
+    'ENABLED': os.environ.get('DJANGO_PROFILING') == '1',
+    'LOG_SAMPLE_RATE': 0.01,
+    'SLOW_MS': 500,
+    'PROFILE_PATHS': [],
+}
+
+
+# Caches. Local memory is per process; for several workers point 'default'
+# at a shared backend, e.g. django.core.cache.backends.redis.RedisCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'social-media-api',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Cached API responses, see social_media_api/response_cache.py
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+
+# Home timelines (fan-out-on-write), see posts/timeline.py
+TIMELINE = {
+    'BACKEND': 'posts.timeline.DatabaseTimelineBackend',
+    'MAX_LENGTH': 800,
+    'FANOUT_THRESHOLD': 10000,
+}
+
+
+# Cached follow-graph adjacency lists, see accounts/graph.py
+FOLLOW_GRAPH = {
+    'CACHE_TIMEOUT': 600,
+    'MAX_CACHED': 50000,
+}
+
+
+# Seconds to cache which posts of a page the user liked, for ``liked_by_me``
+# (None queries the page's ids every time), see posts/likes.py
+LIKES_CACHE_TIMEOUT = None
+
+
+# Bulk import endpoints (/api/posts/bulk/, /api/comments/bulk/), see posts/bulk.py
+BULK_CREATE = {
+    'CHUNK_SIZE': 500,
+    'MAX_ITEMS': 10000,
+    'MAX_BYTES': 16 * 1024 * 1024,
+}
+
+
+# Full-text search over posts and comments, see posts/search.py.
+# The default backend needs SQLite with FTS5; use LocMemSearchBackend otherwise.
+SEARCH = {
+    'BACKEND': 'posts.search.SQLiteSearchBackend',
+    'BATCH_SIZE': 1000,
+    'TITLE_WEIGHT': 2.0,
+}
+
+
+# Notification delivery pipeline, see notifications/pipeline.py.
+# One worker avoids concurrent writers on SQLite.
+NOTIFICATIONS = {
+    'WORKERS': 1,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'OUTBOX': True,
+    'RETENTION_DAYS': 90,
 }
 
 
@@ -69,6 +194,11 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 MIDDLEWARE = [
+    # outermost, so its total covers every other middleware; inactive unless
+    # PROFILING['ENABLED'] (see labtools/profiling.py)
+    'labtools.profiling.ProfilingMiddleware',
+    # routes a safe request's reads to a replica until it writes
+    'labtools.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -102,13 +232,70 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# CONN_MAX_AGE keeps each worker's connection open between requests (0 closes
+# it after every request); health checks replace connections that went away.
+# SQLite has no server-side pool; on PostgreSQL add OPTIONS={'pool': True}
+# (psycopg 3 with psycopg_pool) and set CONN_MAX_AGE to 0.
+#
+# SQLite tuning, on unless DJANGO_SQLITE_TUNING=0 (see `manage.py
+# benchmark_sqlite`): the pragmas and BEGIN IMMEDIATE of labtools/sqlite.py,
+# and writes from request threads are funnelled through one writer thread that
+# commits them in batches (SQLITE_WRITER).
+_sqlite_tuning = os.environ.get('DJANGO_SQLITE_TUNING', '1') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DJANGO_DB_PATH') or BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': TUNED_OPTIONS if _sqlite_tuning else {},
     }
 }
 
+SQLITE_WRITER = {
+    'ENABLED': _sqlite_tuning,
+    'BATCH_SIZE': 64,
+}
+
+# Read replicas, e.g. DJANGO_DB_REPLICAS=replica1,replica2. Locally each one is
+# an SQLite file refreshed from the primary with `manage.py sync_replicas`.
+# Tests never create them: the aliases mirror the default test database.
+for _alias in filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')):
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': Path(DATABASES['default']['NAME']).with_suffix(f'.{_alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['labtools.db_router.ReplicaRouter']
+
+DATABASE_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'PIN_SECONDS': 5,
+}
+
+
+# Password hashing, see accounts/hashers.py. The first hasher hashes new
+# passwords; the others verify existing hashes, which are rehashed with the
+# first one at the user's next login.
+_PASSWORD_HASHERS = {
+    'pbkdf2_sha256': 'accounts.hashers.PBKDF2PasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'bcrypt_sha256': 'accounts.hashers.BCryptSHA256PasswordHasher',
+}
+_password_hasher = os.environ.get('DJANGO_PASSWORD_HASHER', 'pbkdf2_sha256')
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[_password_hasher],
+    *(path for name, path in _PASSWORD_HASHERS.items() if name != _password_hasher),
+    # the rest of Django's defaults, so existing hashes still verify (and get upgraded)
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# per-algorithm cost; Django's defaults where left out
+PASSWORD_HASHING = {}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,95 @@
+"""
+Server-sent events: ``GET /api/events/`` streams the authenticated user's
+channel (see social_media_api/events.py) as ``text/event-stream``.
+
+Event types:
+
+* ``timeline``: a post was added to the home timeline;
+  data is ``{"post": id, "author": id, "created_at": ...}``.
+* ``notification``: a notification was created or coalesced; data is the
+  ``NotificationSerializer`` payload.
+* ``reset``: events since ``Last-Event-ID`` are no longer available, so the
+  client should reload the feed and notifications.
+* ``overflow``: the client fell too far behind and the stream ends; the
+  client reconnects (``EventSource`` does this itself) and resumes from its
+  last event id.
+
+Clients resume with the ``Last-Event-ID`` header (sent by ``EventSource`` on
+reconnect) or ``?last_event_id=``. A comment line is sent every
+``HEARTBEAT`` seconds without events, so proxies don't close an idle
+connection and dead clients are noticed.
+
+Under ASGI the stream is an async generator and costs no thread while it
+waits. Under WSGI an open stream would hold a worker thread for as long as
+the client stays connected, so there the response ends right after the
+missed events with an ``id:`` line carrying the latest event id. The client
+reconnects after ``RETRY_MS`` and resumes from that id, which turns the
+stream into polling that only costs a worker for one short request.
+"""
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .async_api import async_api_view
+from .events import events_settings, get_broker, user_channel
+from .renderers import EventStreamRenderer
+
+HEARTBEAT = ': ping\n\n'
+
+
+def _last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _opening(replay, retry_ms):
+    text = f'retry: {retry_ms}\n\n'
+    if replay is None:
+        return text + EventStreamRenderer.frame('reset', '{}')
+    return text + _frames(replay)
+
+
+def _frames(events):
+    return ''.join(EventStreamRenderer.frame(event.kind, event.data, event.id) for event in events)
+
+
+def _next_chunk(subscription, events):
+    chunk = _frames(events)
+    if subscription.overflowed:
+        chunk += EventStreamRenderer.frame('overflow', '{}')
+    return chunk or HEARTBEAT
+
+
+def poll(channel, last_event_id, options):
+    """The missed events and a cursor to resume from, for clients served under WSGI."""
+    replay, latest = get_broker().replay(channel, last_event_id)
+    # an id-only event sets the client's Last-Event-ID for the reconnect
+    return _opening(replay, options['RETRY_MS']) + f'id: {latest}\n\n'
+
+
+async def astream(channel, last_event_id, options):
+    broker = get_broker()
+    subscription, replay = broker.subscribe(channel, last_event_id)
+    try:
+        yield _opening(replay, options['RETRY_MS'])
+        while not subscription.closed:
+            yield _next_chunk(subscription, await subscription.aget(options['HEARTBEAT']))
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@async_api_view(renderer_classes=[EventStreamRenderer])
+async def event_stream(request):
+    channel, last_event_id, options = user_channel(request.user.pk), _last_event_id(request), events_settings()
+    if isinstance(request._request, ASGIRequest):
+        response = StreamingHttpResponse(
+            astream(channel, last_event_id, options), content_type='text/event-stream; charset=utf-8',
+        )
+    else:
+        response = HttpResponse(poll(channel, last_event_id, options), content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # nginx would otherwise buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
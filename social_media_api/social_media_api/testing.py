@@ -0,0 +1,34 @@
+"""
+Base test cases for the project's test suites.
+
+Production settings redirect plain-HTTP requests to HTTPS
+(``SECURE_SSL_REDIRECT``), which would turn every test client request that
+doesn't pass ``secure=True`` into a 301. The API test cases here switch the
+redirect off, and the background threads that would write to the test
+database behind the tests' backs: the trending sync (tests call ``sync()``
+themselves) and the notification workers (events are delivered inline). Subclasses can still add their own ``override_settings``.
+
+Cache invalidation runs when a write commits, which never happens inside a
+``TestCase``, so every test starts with empty caches; a test that reads
+after writing wraps the write in ``captureOnCommitCallbacks(execute=True)``.
+"""
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework import test
+
+
+class EmptyCachesMixin:
+    def run(self, result=None):
+        for cache in caches.all():
+            cache.clear()
+        return super().run(result)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, TRENDING={'SYNC_INTERVAL': 0}, NOTIFICATIONS={'WORKERS': 0})
+class APITestCase(EmptyCachesMixin, test.APITestCase):
+    pass
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, TRENDING={'SYNC_INTERVAL': 0}, NOTIFICATIONS={'WORKERS': 0})
+class APITransactionTestCase(EmptyCachesMixin, test.APITransactionTestCase):
+    pass
@@ -0,0 +1,199 @@
+"""
+Sliding-window rate limits for expensive endpoints.
+
+A view opts in with a scope (``throttle_scope = 'login'`` on class-based views,
+``@throttle_scope('like')`` above ``@api_view`` on function views). Each
+throttle class looks up its own rate for that scope in
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``::
+
+    'like_user': '120/min',    # ScopedUserThrottle: per authenticated user
+    'login_ip': '20/min',      # ScopedIPThrottle: per client address
+
+A scope without a rate for a throttle is not limited by it, so views without a
+scope cost nothing.
+
+Limits use a sliding-window counter: the count in the current fixed window plus
+the previous window's count weighted by how much of it still overlaps the
+sliding window. That is two counters per client, O(1) per check, and close to
+an exact sliding log. Rejected requests are counted too, so a client that
+keeps hammering stays limited instead of getting through at the window edge.
+
+Counters live in process memory by default, so each worker enforces its own
+limit. Set ``THROTTLING['STORE']`` to ``'cache'`` to keep them in a shared cache
+(Redis/Memcached) and enforce one limit across workers:
+
+    THROTTLING = {
+        'STORE': 'memory',       # or 'cache'
+        'CACHE_ALIAS': 'default',
+        'MAX_KEYS': 100000,      # memory store: stale windows are swept beyond this
+    }
+"""
+import math
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    'STORE': 'memory',
+    'CACHE_ALIAS': 'default',
+    'MAX_KEYS': 100000,
+}
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def throttling_settings():
+    return {**DEFAULTS, **getattr(settings, 'THROTTLING', {})}
+
+
+def parse_rate(rate):
+    """``'120/min'`` -> ``(120, 60)``; ``None`` for no limit."""
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    return int(count), DURATIONS[period[0]]
+
+
+class MemoryStore:
+    """Per-process counters: ``key -> [window, count, previous count, expires]``."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, duration):
+        """Count a request in ``window``; returns ``(previous count, current count)``."""
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None or entry[0] < window - 1:
+                if entry is None and len(self._counters) >= self.max_keys:
+                    self._sweep()
+                entry = self._counters[key] = [window, 0, 0, 0]
+            elif entry[0] == window - 1:
+                entry[:] = [window, 0, entry[1], 0]
+            entry[1] += 1
+            # once the next window has passed too, both counts are irrelevant
+            entry[3] = (window + 2) * duration
+            return entry[2], entry[1]
+
+    def _sweep(self):
+        now = time.time()
+        for key in [key for key, entry in self._counters.items() if entry[3] <= now]:
+            del self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class CacheStore:
+    """Counters in a Django cache, shared by every process using it."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def hit(self, key, window, duration):
+        cache = caches[self.alias]
+        current = f'throttle:{key}:{window}'
+        # add() is a no-op if the counter exists; it lives until it stops being the previous window
+        cache.add(current, 0, timeout=2 * duration)
+        try:
+            count = cache.incr(current)
+        except ValueError:
+            # evicted between add() and incr()
+            cache.set(current, 1, timeout=2 * duration)
+            count = 1
+        return cache.get(f'throttle:{key}:{window - 1}', 0), count
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    options = throttling_settings()
+    if options['STORE'] == 'cache':
+        return CacheStore(options['CACHE_ALIAS'])
+    return MemoryStore(options['MAX_KEYS'])
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    if setting == 'THROTTLING':
+        get_store.cache_clear()
+
+
+def throttle_scope(scope):
+    """Set the throttle scope of an ``@api_view`` function view (apply above it)."""
+    def decorator(view):
+        view.cls.throttle_scope = scope
+        return view
+    return decorator
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    rate_suffix = None
+
+    def __init__(self):
+        self._wait = None
+
+    def get_ident_key(self, request):
+        """Who is being limited, or ``None`` to skip this request."""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{self.rate_suffix}'))
+        ident = self.get_ident_key(request) if rate else None
+        if ident is None:
+            return True
+
+        limit, duration = rate
+        now = time.time()
+        window, offset = divmod(now, duration)
+        window = int(window)
+        # the duration is part of the key so a rate change never mixes window sizes
+        key = f'{scope}_{self.rate_suffix}:{duration}:{ident}'
+        previous, current = get_store().hit(key, window, duration)
+
+        overlap = 1 - offset / duration
+        if previous * overlap + current <= limit:
+            return True
+        self._wait = self.retry_after(limit, duration, offset, previous, current)
+        return False
+
+    @staticmethod
+    def retry_after(limit, duration, offset, previous, current):
+        if current >= limit:
+            # only the next window can admit anything
+            return duration - offset
+        # the previous window's weight drops until previous * overlap + current < limit
+        overlap_needed = (limit - current) / previous
+        return max(0.0, (1 - overlap_needed) * duration - offset)
+
+    def wait(self):
+        return math.ceil(self._wait) if self._wait is not None else None
+
+
+class ScopedUserThrottle(SlidingWindowThrottle):
+    """Limits each authenticated user to the ``<scope>_user`` rate."""
+    rate_suffix = 'user'
+
+    def get_ident_key(self, request):
+        user = request.user
+        return user.pk if user and user.is_authenticated else None
+
+
+class ScopedIPThrottle(SlidingWindowThrottle):
+    """Limits each client address to the ``<scope>_ip`` rate (``NUM_PROXIES`` aware)."""
+    rate_suffix = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
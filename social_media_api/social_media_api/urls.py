@@ -17,8 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .sse import event_stream
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/','accounts/', include('accounts.urls')),
-    path('api/','posts/', include('posts.urls')),   # ✔ REQUIRED
+    path('api/accounts/', include('accounts.urls')),
+    path('api/notifications/', include('notifications.urls')),
+    path('api/events/', event_stream, name='event-stream'),
+    path('api/', include('posts.urls')),   # ✔ REQUIRED
 ]
\ No newline at end of file
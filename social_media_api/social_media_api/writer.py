@@ -0,0 +1,134 @@
+"""
+Serialized writes with group commit, for SQLite.
+
+SQLite allows one writer at a time. When many request threads write at once
+(a burst of likes or follows) they queue on the database lock, each sleeping
+in SQLite's busy handler and paying its own commit. ``write(fn, ...)`` hands
+the work to a single writer thread instead: it takes every job waiting in the
+queue (up to ``BATCH_SIZE``), runs each in its own savepoint inside one
+transaction and commits once, so a burst costs one lock acquisition and one
+sync instead of one per request. The calling thread blocks until its job's
+batch has committed and gets ``fn``'s return value (or exception) back.
+Cache invalidation in a job must go through ``transaction.on_commit``: it
+then runs after the whole batch commits, not when the job's savepoint ends.
+
+Jobs run on the writer's connection, so ``fn`` must not rely on the caller's
+open transaction; calls made inside an ``atomic`` block (and all calls when
+the writer is disabled or the database is not SQLite) simply run inline.
+Other processes still contend normally; ``busy_timeout`` and ``BEGIN
+IMMEDIATE`` (see ``DATABASES`` in settings) cover those.
+
+Settings (all optional):
+
+    SQLITE_WRITER = {
+        'ENABLED': False,
+        'BATCH_SIZE': 64,     # max jobs per commit
+    }
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BATCH_SIZE': 64,
+}
+
+
+def writer_settings():
+    return {**DEFAULTS, **getattr(settings, 'SQLITE_WRITER', {})}
+
+
+class Writer:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.batches = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        self._ensure_started()
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            self.write_batch(batch)
+
+    def write_batch(self, batch):
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for future, fn, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        # a failing job rolls back its savepoint, not the batch
+                        with transaction.atomic():
+                            outcomes.append((future, fn(*args, **kwargs), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            # the commit itself failed: nothing in the batch was written
+            logger.exception('SQLite writer batch failed')
+            for future, _, _, _ in batch:
+                if future.running():
+                    future.set_exception(exc)
+            return
+        self.batches += 1
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+
+@lru_cache(maxsize=None)
+def get_writer():
+    return Writer(writer_settings()['BATCH_SIZE'])
+
+
+@receiver(setting_changed)
+def _reset_writer(setting, **kwargs):
+    if setting == 'SQLITE_WRITER':
+        get_writer.cache_clear()
+
+
+def write(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the serialized writer and return its result."""
+    connection = connections[DEFAULT_DB_ALIAS]
+    if (
+        not writer_settings()['ENABLED']
+        or connection.vendor != 'sqlite'
+        or connection.in_atomic_block
+    ):
+        return fn(*args, **kwargs)
+    return get_writer().submit(fn, *args, **kwargs).result()